@@ -0,0 +1,111 @@
+"""Control de admisión para /api/login.
+
+Verificar una contraseña (scrypt/PBKDF2) cuesta decenas de milisegundos de CPU.
+Una ráfaga de logins (o un ataque de credential stuffing) ejecutada en los
+hilos de las peticiones ocupa todos los workers y deja sin CPU al menú y las
+reservas. Dos defensas:
+
+- Token buckets por IP y por cuenta: cada clave tiene `rafaga` fichas que se
+  reponen a `por_segundo`; sin fichas se contesta 429 enseguida.
+- VerificadorAcotado: las verificaciones corren en un pool de pocos hilos con
+  una cola acotada; si está lleno se contesta 503 sin encolar. hashlib suelta
+  el GIL mientras calcula, así que fuera de esos hilos el resto de la API
+  sigue atendiendo.
+
+El estado de los buckets vive en un backend intercambiable con dos métodos:
+
+    espera(clave, rafaga, por_segundo)           segundos hasta tener 1 ficha (0 si hay)
+    consumir(clave, rafaga, por_segundo, costo)  igual, y si hay las descuenta
+
+LimitadorMemoria es el de un proceso; con varios workers cada uno cuenta por
+su lado (el límite efectivo se multiplica por el número de workers). Un
+backend compartido (Redis, la BD) solo tiene que implementar esos dos métodos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TiempoAgotado
+
+
+class Saturado(Exception):
+    """El verificador no admite más trabajo ahora (cola llena o espera agotada)"""
+
+
+class LimitadorMemoria:
+    """Token buckets en memoria, como mucho `maximo` claves (LRU)"""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._buckets = OrderedDict()  # clave -> (fichas, actualizado)
+        self._lock = threading.Lock()
+
+    def _fichas(self, clave, rafaga, por_segundo, ahora):
+        fichas, actualizado = self._buckets.get(clave, (rafaga, ahora))
+        return min(rafaga, fichas + (ahora - actualizado) * por_segundo)
+
+    def espera(self, clave, rafaga, por_segundo):
+        with self._lock:
+            fichas = self._fichas(clave, rafaga, por_segundo, time.monotonic())
+        return 0.0 if fichas >= 1 else (1 - fichas) / por_segundo
+
+    def consumir(self, clave, rafaga, por_segundo, costo=1):
+        ahora = time.monotonic()
+        with self._lock:
+            fichas = self._fichas(clave, rafaga, por_segundo, ahora)
+            if fichas < costo:
+                return (costo - fichas) / por_segundo
+            self._buckets[clave] = (fichas - costo, ahora)
+            self._buckets.move_to_end(clave)
+            while len(self._buckets) > self.maximo:
+                self._buckets.popitem(last=False)  # la más vieja: ya estaría casi llena
+        return 0.0
+
+
+class Bucket:
+    """Un límite (rafaga fichas, `por_minuto` de reposición) sobre un backend"""
+
+    def __init__(self, limitador, prefijo, rafaga, por_minuto):
+        self.limitador = limitador
+        self.prefijo = prefijo
+        self.rafaga = rafaga
+        self.por_segundo = por_minuto / 60
+
+    def espera(self, clave):
+        return self.limitador.espera(f'{self.prefijo}:{clave}', self.rafaga, self.por_segundo)
+
+    def consumir(self, clave):
+        return self.limitador.consumir(f'{self.prefijo}:{clave}', self.rafaga, self.por_segundo)
+
+
+class VerificadorAcotado:
+    """Pool de `hilos` para trabajo de CPU con como mucho `cola` tareas esperando"""
+
+    def __init__(self, hilos, cola, espera_maxima):
+        self.hilos = hilos
+        self.limite = hilos + cola
+        self.espera_maxima = espera_maxima
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='verificador')
+        self._en_curso = 0
+        self._lock = threading.Lock()
+
+    def _terminado(self, _futuro):
+        with self._lock:
+            self._en_curso -= 1
+
+    def ejecutar(self, funcion, *args):
+        """Resultado de funcion(*args) calculado en el pool; Saturado si no hay
+        lugar o si tarda más de espera_maxima (la tarea termina igual)"""
+        with self._lock:
+            if self._en_curso >= self.limite:
+                raise Saturado('Cola de verificación llena')
+            self._en_curso += 1
+        futuro = self._pool.submit(funcion, *args)
+        futuro.add_done_callback(self._terminado)
+        try:
+            return futuro.result(timeout=self.espera_maxima)
+        except TiempoAgotado:
+            futuro.cancel()  # si aún no empezó, no se calcula
+            raise Saturado('La verificación tardó demasiado')
+
+    def ocupacion(self):
+        return {'en_curso': self._en_curso, 'limite': self.limite, 'hilos': self.hilos}
@@ -1,20 +1,64 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context, g, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS  # ✅ IMPORTAR CORS
-from datetime import datetime
+import click
+from observabilidad import configurar_logging, instrumentar
+from cambios import FeedCambios, INICIO_SSE, LATIDO_SSE, mensaje_sse
+from serializacion import ProveedorJSON, Serializador, Calculado, hora
+from busqueda import coincidencias, preparar_busqueda, trigramas_instalados
+from replica import MarcasEscritura, Replica, SesionEnrutada, dejar_de_leer, identidad, leer_de
+from asignacion import asignar, Reserva as ReservaAsignable, Mesa as MesaAsignable
+from particiones import archivar, asegurar, convertir, meses_particionados, meses_por_archivar, particionada
+from imagenes import (AlmacenImagenes, procesar as procesar_imagen, descriptor as descriptor_imagen, predeterminada,
+                      actualizar_referencias)
+from admision import Bucket, LimitadorMemoria, Saturado, VerificadorAcotado
+from idempotencia import AlmacenBD, AlmacenMemoria, NUEVA, GUARDADA, EN_CURSO
+from compresion import (TAMANO_MINIMO, comprimir, comprimir_stream, elegir_codificacion,
+                        es_comprimible, etag_debil)
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-from sqlalchemy import text
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import create_engine, text, tuple_, and_, or_, insert, update, func
+from sqlalchemy.pool import NullPool
+import base64
+import contextlib
+import csv
+import functools
+import hashlib
+import hmac
+import io
+import json
+import math
 import os
+import queue
+import tempfile
+import threading
+import time
 
 app = Flask(__name__)
+app.json = ProveedorJSON(app)
+logger = configurar_logging()
+
+# request.remote_addr es la IP del cliente según los proxies de confianza (el
+# balanceador de Render o de Elastic Beanstalk añade su entrada a
+# X-Forwarded-For): se toma la N-ésima desde la derecha, la que puso el
+# último proxy propio. Las entradas anteriores las controla el cliente.
+# Sin proxy delante, PROXIES_CONFIABLES=0
+PROXIES_CONFIABLES = int(os.getenv('PROXIES_CONFIABLES', 1))
+if PROXIES_CONFIABLES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXIES_CONFIABLES, x_proto=PROXIES_CONFIABLES)
+
+# Cabeceras de respuesta que el frontend puede leer (también las usa lectura_async.py)
+CABECERAS_EXPUESTAS = ["X-Next-Cursor", "ETag", "X-Menu-Version", "Idempotent-Replayed", "Retry-After"]
 
 # ✅ CONFIGURAR CORS - PERMITIR PETICIONES DESDE VERCEL
 CORS(app, resources={
     r"/api/*": {
         "origins": ["*"],  # En producción, cambia * por tu dominio de Vercel
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
+        "expose_headers": CABECERAS_EXPUESTAS,
         "supports_credentials": True
     }
 })
@@ -23,7 +67,52 @@ CORS(app, resources={
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+def opciones_pool():
+    """Opciones del pool de conexiones tomadas del entorno.
+    DB_POOL_MODO=pgbouncer usa NullPool: cada checkout abre una conexión y el
+    pooling lo hace PgBouncer (modo transaction), evitando pools por worker"""
+    url = app.config['SQLALCHEMY_DATABASE_URI'] or ''
+    if url.startswith('sqlite'):
+        return {}
+    if os.getenv('DB_POOL_MODO', 'queue') == 'pgbouncer':
+        return {'poolclass': NullPool}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'si')
+    }
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones_pool()
+
+# Clave para firmar los tokens de sesión (debe ser la misma en todos los workers)
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+if not app.config['SECRET_KEY']:
+    logger.warning("SECRET_KEY no configurada; usando clave de desarrollo (no usar en producción)")
+    app.config['SECRET_KEY'] = 'clave-de-desarrollo-insegura'
+
+db = SQLAlchemy(app, session_options={'class_': SesionEnrutada})
+instrumentar(app)
+
+# Réplica de lectura opcional para las rutas GET (ver replica.py y RÉPLICA DE LECTURA)
+URL_REPLICA = os.getenv('DATABASE_READ_URL')
+replica = None
+if URL_REPLICA:
+    replica = Replica(
+        create_engine(URL_REPLICA, **opciones_pool()),
+        MarcasEscritura(
+            os.getenv('REPLICA_MARCAS_DIR', os.path.join(tempfile.gettempdir(), 'restaurante_escrituras')),
+            ventana=float(os.getenv('REPLICA_VENTANA_SEGUNDOS', 10))
+        ),
+        retraso_maximo=float(os.getenv('REPLICA_RETRASO_MAXIMO', 5)),
+        intervalo=float(os.getenv('REPLICA_INTERVALO', 5))
+    )
+
+# Feed de cambios para /api/stream. LISTEN necesita una conexión directa: con
+# PgBouncer en modo transaction, DATABASE_LISTEN_URL apunta a Postgres sin pasar por él
+feed_cambios = FeedCambios(app.json.dumps)
+feed_cambios.instalar(db.session, os.getenv('DATABASE_LISTEN_URL') or app.config['SQLALCHEMY_DATABASE_URI'])
 
 # Modelos de la base de datos
 
@@ -54,6 +143,13 @@ class Reserva(db.Model):
     notas = db.Column(db.Text)
     creada_en = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Índices compuestos que respaldan la paginación por cursor y los filtros
+    __table_args__ = (
+        db.Index('ix_reservas_fecha_hora_id', 'fecha_hora', 'id'),
+        db.Index('ix_reservas_mesa_fecha_hora', 'mesa_id', 'fecha_hora', 'id'),
+        db.Index('ix_reservas_estado_fecha_hora', 'estado', 'fecha_hora', 'id'),
+    )
+
 class Categoria(db.Model):
     __tablename__ = 'categorias'
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +165,7 @@ class Plato(db.Model):
     categoria_id = db.Column(db.Integer, db.ForeignKey('categorias.id'), nullable=False)
     disponible = db.Column(db.Boolean, default=True)
     imagen_url = db.Column(db.String(200))
+    imagen_variantes = db.Column(db.JSON)  # srcset AVIF/WebP de la imagen subida (ver imagenes.py)
 
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
@@ -97,18 +194,1155 @@ class Asistencia(db.Model):
     hora_salida = db.Column(db.DateTime)
     notas = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('ix_asistencias_fecha_id', 'fecha', 'id'),
+        # Un solo registro por empleado y día; respalda el ON CONFLICT de registrar_entrada
+        db.Index('uq_asistencias_usuario_fecha', 'usuario_id', 'fecha', unique=True),
+    )
+
+class ResumenAsistencia(db.Model):
+    """Minutos trabajados por empleado y periodo, mantenidos al registrar la salida"""
+    __tablename__ = 'resumen_asistencias'
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    periodo = db.Column(db.String(10), nullable=False)  # 'dia', 'semana' o 'mes'
+    inicio = db.Column(db.Date, nullable=False)  # primer día del periodo
+    minutos = db.Column(db.Integer, nullable=False, default=0)
+    turnos = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'periodo', 'inicio', name='uq_resumen_usuario_periodo_inicio'),
+        db.Index('ix_resumen_periodo_inicio', 'periodo', 'inicio'),
+    )
+
+class ClaveIdempotencia(db.Model):
+    """Respuesta guardada de un POST con cabecera Idempotency-Key (ver idempotencia.py)"""
+    __tablename__ = 'claves_idempotencia'
+    clave = db.Column(db.String(255), primary_key=True)
+    huella = db.Column(db.String(64), nullable=False)  # sha256 de método, ruta, usuario y cuerpo
+    estado = db.Column(db.Integer)  # NULL mientras la petición original está en curso
+    cuerpo = db.Column(db.LargeBinary)
+    tipo = db.Column(db.String(100))
+    creada_en = db.Column(db.DateTime, nullable=False, index=True)
+
+# ===== SERIALIZADORES =====
+# Cada uno define la proyección del SELECT y la forma del JSON de un listado
+
+RESERVA_JSON = Serializador(
+    id=Reserva.id,
+    cliente={'id': Cliente.id, 'nombre': Cliente.nombre, 'email': Cliente.email},
+    mesa={'id': Mesa.id, 'numero': Mesa.numero},
+    fecha_hora=Reserva.fecha_hora,
+    num_personas=Reserva.num_personas,
+    estado=Reserva.estado,
+    notas=Reserva.notas
+)
+# Lo que ve quien no es admin: la ocupación para el calendario, sin datos del cliente
+RESERVA_PUBLICA_JSON = Serializador(
+    id=Reserva.id,
+    mesa={'id': Mesa.id, 'numero': Mesa.numero},
+    fecha_hora=Reserva.fecha_hora,
+    num_personas=Reserva.num_personas,
+    estado=Reserva.estado
+)
+MESA_JSON = Serializador(id=Mesa.id, numero=Mesa.numero, capacidad=Mesa.capacidad, disponible=Mesa.disponible)
+MESA_LIBRE_JSON = Serializador(id=Mesa.id, numero=Mesa.numero, capacidad=Mesa.capacidad)
+PLATO_JSON = Serializador(
+    id=Plato.id,
+    nombre=Plato.nombre,
+    descripcion=Plato.descripcion,
+    precio=Plato.precio,
+    categoria={'id': Categoria.id, 'nombre': Categoria.nombre},
+    disponible=Plato.disponible,
+    imagen_url=Plato.imagen_url,
+    imagen_variantes=Plato.imagen_variantes
+)
+CATEGORIA_JSON = Serializador(id=Categoria.id, nombre=Categoria.nombre)
+CLIENTE_JSON = Serializador(id=Cliente.id, nombre=Cliente.nombre, email=Cliente.email, telefono=Cliente.telefono)
+USUARIO_JSON = Serializador(
+    id=Usuario.id,
+    nombre=Usuario.nombre,
+    email=Usuario.email,
+    cargo=Usuario.cargo,
+    activo=Usuario.activo,
+    creado_en=Usuario.creado_en
+)
+ASISTENCIA_JSON = Serializador(
+    id=Asistencia.id,
+    fecha=Asistencia.fecha,
+    hora_entrada=hora(Asistencia.hora_entrada),
+    hora_salida=hora(Asistencia.hora_salida),
+    notas=Asistencia.notas
+)
+ASISTENCIA_EMPLEADO_JSON = Serializador(
+    id=Asistencia.id,
+    empleado={'id': Usuario.id, 'nombre': Usuario.nombre},
+    fecha=Asistencia.fecha,
+    hora_entrada=hora(Asistencia.hora_entrada),
+    hora_salida=hora(Asistencia.hora_salida),
+    notas=Asistencia.notas
+)
+RESUMEN_JSON = Serializador(
+    empleado={'id': ResumenAsistencia.usuario_id, 'nombre': Usuario.nombre},
+    periodo=ResumenAsistencia.periodo,
+    inicio=ResumenAsistencia.inicio,
+    minutos=ResumenAsistencia.minutos,
+    horas=Calculado(lambda minutos: round(minutos / 60, 2), ResumenAsistencia.minutos),
+    turnos=ResumenAsistencia.turnos
+)
+
+def serializador_pedido(serializador, args=None):
+    """El serializador reducido a los campos de ?fields= (p. ej. id,cliente.nombre,mesa),
+    o el completo si no se indica. Sus columnas son la proyección del SELECT"""
+    campos = (request.args if args is None else args).get('fields')
+    if campos is None:
+        return serializador
+    return serializador.subconjunto(campos.split(','))
+
+# ===== PAGINACIÓN POR CURSOR =====
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 500
+
+def leer_limite(args=None):
+    """Tamaño de página pedido en ?limit=, acotado a LIMITE_MAXIMO"""
+    valor = (request.args if args is None else args).get('limit')
+    if valor is None:
+        return LIMITE_POR_DEFECTO
+    # args.get(type=int) devolvería el valor por defecto con ?limit=diez
+    if not valor.isdigit() or int(valor) < 1:
+        raise ValueError('limit debe ser un entero positivo')
+    return min(int(valor), LIMITE_MAXIMO)
+
+def codificar_cursor(*valores):
+    """Cursor opaco con los valores de la clave de orden de la última fila"""
+    crudo = json.dumps(valores, default=lambda v: v.isoformat()).encode()
+    return base64.urlsafe_b64encode(crudo).decode()
+
+def decodificar_cursor(cursor, *tipos):
+    """Valores de la clave de orden convertidos con tipos (uno por columna).
+    ValueError si el cursor está mal formado o no es de este listado"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError
+        return [tipo(valor) for tipo, valor in zip(tipos, valores)]
+    except Exception:
+        raise ValueError('cursor inválido')
+
+def normalizar_fecha_hora(fecha):
+    """Pasa una fecha con zona horaria a UTC sin zona (como se guarda en la BD)"""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+def leer_fecha_hora(nombre, args=None):
+    """Lee un parámetro ISO 8601 y lo normaliza a UTC sin zona horaria"""
+    valor = (request.args if args is None else args).get(nombre)
+    if not valor:
+        return None
+    try:
+        return normalizar_fecha_hora(datetime.fromisoformat(valor))
+    except ValueError:
+        raise ValueError(f'{nombre} debe tener formato ISO 8601')
+
+def paginar(filas, limite, clave_cursor):
+    """Recorta una página consultada con limite + 1 filas; devuelve (filas, cursor o None)"""
+    if len(filas) > limite:
+        filas = filas[:limite]
+        return filas, codificar_cursor(*clave_cursor(filas[-1]))
+    return filas, None
+
+def respuesta_paginada(filas, limite, serializar, clave_cursor):
+    """Serializa una página (consultada con limite + 1 filas) y añade X-Next-Cursor"""
+    filas, cursor = paginar(filas, limite, clave_cursor)
+    respuesta = jsonify(list(map(serializar, filas)))
+    if cursor:
+        respuesta.headers['X-Next-Cursor'] = cursor
+    return respuesta
+
+# ===== BÚSQUEDA =====
+
+LIMITE_BUSQUEDA = 50
+
+@functools.cache
+def busqueda_con_trigramas():
+    """Si la BD tiene pg_trgm (ver busqueda.py). Se consulta una vez por proceso;
+    un error no se guarda y se vuelve a intentar en la siguiente búsqueda"""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    with db.engine.connect() as conexion:
+        return trigramas_instalados(conexion)
+
+def consulta_busqueda(modelo, serializador, dialecto, args=None, trigramas=True):
+    """SELECT de las filas de modelo que coinciden con ?q=, de la más a la menos
+    relevante, con los campos de serializador. None si q es demasiado corto.
+    trigramas es busqueda_con_trigramas() (se recibe para no consultarla en el
+    bucle de eventos de lectura_async)"""
+    args = request.args if args is None else args
+    limite = args.get('limit', 10, type=int)
+    if limite is None or limite < 1:
+        raise ValueError('limit debe ser un entero positivo')
+    encontradas = coincidencias(modelo.__tablename__, args.get('q', ''), min(limite, LIMITE_BUSQUEDA), dialecto,
+                                trigramas)
+    if encontradas is None:
+        return None
+    consulta = db.select(*serializador.columnas).select_from(modelo)
+    if modelo is Plato and Categoria in serializador.modelos:
+        consulta = consulta.join(Categoria, Plato.categoria_id == Categoria.id)
+    return consulta.join(encontradas, encontradas.c.id == modelo.id).order_by(
+        encontradas.c.empieza.desc(), encontradas.c.rango.desc(), modelo.id
+    )
+
+def respuesta_busqueda(modelo, serializador_base):
+    serializador = serializador_pedido(serializador_base)
+    consulta = consulta_busqueda(modelo, serializador, db.engine.dialect.name, trigramas=busqueda_con_trigramas())
+    if consulta is None:
+        return jsonify([])
+    return jsonify(serializador.lista(db.session.execute(consulta)))
+
+# ===== DISPONIBILIDAD DE MESAS =====
+
+# Cada reserva ocupa la mesa durante [fecha_hora, fecha_hora + DURACION_RESERVA)
+DURACION_RESERVA = timedelta(minutes=int(os.getenv('DURACION_RESERVA_MINUTOS', 120)))
+
+class ConflictoReserva(Exception):
+    """La mesa ya está ocupada (o fuera de servicio) en el horario pedido"""
+
+def se_cruza_con(inicio, excluir_id=None):
+    """Condición para reservas activas cuyo intervalo se cruza con el que empieza en inicio.
+    Con duración fija basta comparar la hora de inicio, así que usa el índice (mesa_id, fecha_hora)"""
+    condicion = and_(
+        Reserva.estado != 'cancelada',
+        Reserva.fecha_hora > inicio - DURACION_RESERVA,
+        Reserva.fecha_hora < inicio + DURACION_RESERVA
+    )
+    if excluir_id is not None:
+        condicion = and_(condicion, Reserva.id != excluir_id)
+    return condicion
+
+def mesas_disponibles(inicio, personas):
+    """Mesas libres con capacidad suficiente, en una sola consulta (mejor ajuste primero)"""
+    ocupada = db.select(Reserva.id).where(Reserva.mesa_id == Mesa.id, se_cruza_con(inicio)).exists()
+    return db.session.execute(
+        db.select(*MESA_LIBRE_JSON.columnas)
+        .where(Mesa.disponible.isnot(False), Mesa.capacidad >= personas, ~ocupada)
+        .order_by(Mesa.capacidad, Mesa.numero)
+    ).all()
+
+def verificar_mesa_libre(mesa_id, inicio, personas, excluir_id=None):
+    """Bloquea la fila de la mesa (SELECT ... FOR UPDATE) y comprueba que siga libre.
+    Las reservas concurrentes sobre la misma mesa esperan el bloqueo, así que el
+    chequeo y el INSERT posterior quedan atómicos dentro de la transacción"""
+    mesa = db.session.execute(
+        db.select(Mesa).where(Mesa.id == mesa_id).with_for_update()
+    ).scalar_one_or_none()
+    if mesa is None:
+        raise ValueError('La mesa no existe')
+    if mesa.disponible is False:
+        raise ConflictoReserva('La mesa no está disponible')
+    if personas > mesa.capacidad:
+        raise ValueError(f'La mesa {mesa.numero} admite máximo {mesa.capacidad} personas')
+    conflicto = db.session.execute(
+        db.select(Reserva.id).where(Reserva.mesa_id == mesa_id, se_cruza_con(inicio, excluir_id)).limit(1)
+    ).first()
+    if conflicto:
+        raise ConflictoReserva('La mesa ya está reservada en ese horario')
+
+# ===== ASIGNACIÓN DE MESAS =====
+
+def asignar_mesas(fecha, aplicar=True):
+    """Reasigna las mesas de las reservas pendientes del día (UTC) para sentar
+    el máximo de comensales (ver asignacion.py). Las demás reservas activas que
+    se cruzan con el día ocupan su mesa tal cual, y las que quedan sin mesa
+    conservan la que tenían. Con aplicar, guarda los cambios en un solo UPDATE
+    por lotes; si no, solo los calcula"""
+    inicio_dia = datetime(fecha.year, fecha.month, fecha.day)
+    fin_dia = inicio_dia + timedelta(days=1)
+    del_dia = and_(Reserva.estado == 'pendiente', Reserva.fecha_hora >= inicio_dia, Reserva.fecha_hora < fin_dia)
+
+    # Bloquear las mesas, como verificar_mesa_libre: las reservas nuevas esperan
+    # a que termine la asignación
+    mesas = db.session.execute(
+        db.select(Mesa.id, Mesa.capacidad).where(Mesa.disponible.isnot(False))
+        .order_by(Mesa.id).with_for_update()
+    ).all()
+    pendientes = db.session.execute(
+        db.select(Reserva.id, Reserva.fecha_hora, Reserva.num_personas, Reserva.mesa_id)
+        .where(del_dia).order_by(Reserva.fecha_hora, Reserva.id)
+    ).all()
+    ocupadas = db.session.execute(
+        db.select(Reserva.mesa_id, Reserva.fecha_hora).where(
+            Reserva.estado != 'cancelada',
+            Reserva.fecha_hora > inicio_dia - DURACION_RESERVA,
+            Reserva.fecha_hora < fin_dia + DURACION_RESERVA,
+            ~del_dia
+        )
+    ).all()
+
+    asignadas, sin_mesa = asignar(
+        [ReservaAsignable(*fila) for fila in pendientes],
+        [MesaAsignable(*fila) for fila in mesas],
+        ocupadas, DURACION_RESERVA
+    )
+    actuales = {fila.id: fila for fila in pendientes}
+    cambios = [{'id': r, 'mesa_id': m} for r, m in asignadas.items() if actuales[r].mesa_id != m]
+    if aplicar and cambios:
+        db.session.execute(update(Reserva), cambios)  # UPDATE por clave primaria en un executemany
+        publicar_cambio('reserva', 'actualizada', [c['id'] for c in cambios])
+    if aplicar:
+        db.session.commit()
+    else:
+        db.session.rollback()  # libera los bloqueos
+
+    return {
+        'fecha': fecha.isoformat(),
+        'aplicado': aplicar,
+        'reservas': len(pendientes),
+        'comensales': sum(f.num_personas for f in pendientes),
+        'comensales_sentados': sum(actuales[r].num_personas for r in asignadas),
+        'cambios': [{'reserva_id': c['id'], 'mesa_anterior': actuales[c['id']].mesa_id, 'mesa_id': c['mesa_id']}
+                    for c in cambios],
+        'sin_mesa': sin_mesa
+    }
+
+# ===== CACHÉ DEL MENÚ =====
+
+class CacheMenu:
+    """Snapshot en memoria de /api/platos y /api/categorias ya serializado a bytes.
+
+    La versión del menú vive en un archivo compartido por todos los workers de
+    gunicorn: las escrituras la cambian y cada lectura solo relee ese archivo,
+    así que en estado estable servir el menú no hace ninguna consulta a la BD.
+    El TTL cubre el caso de varias instancias que no comparten disco."""
+
+    MAXIMO_VARIANTES = 32  # combinaciones de ?fields= guardadas por snapshot
+
+    def __init__(self, ruta_version, ttl):
+        self.ruta_version = ruta_version
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def version_compartida(self):
+        try:
+            with open(self.ruta_version) as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def invalidar(self):
+        """Publica una versión nueva; llamar después del commit que cambió el menú"""
+        temporal = f'{self.ruta_version}.{os.getpid()}.{threading.get_ident()}'
+        with open(temporal, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(temporal, self.ruta_version)  # reemplazo atómico
+        with self._lock:
+            self._snapshot = None
+
+    def _vigente(self, snapshot, version):
+        return (snapshot is not None and snapshot['version'] == version
+                and time.monotonic() - snapshot['creado'] < self.ttl)
+
+    def vigente(self):
+        """Snapshot actual si sigue vigente, sin tocar la BD; None si hay que reconstruirlo"""
+        snapshot = self._snapshot
+        return snapshot if self._vigente(snapshot, self.version_compartida()) else None
+
+    def actual(self):
+        """Snapshot vigente; si cambió la versión lo reconstruye consultando la BD"""
+        version = self.version_compartida()
+        snapshot = self._snapshot
+        if not self._vigente(snapshot, version):
+            with self._lock:
+                snapshot = self._snapshot
+                if not self._vigente(snapshot, version):
+                    # La versión se lee antes de consultar: si cambia mientras
+                    # tanto, la siguiente petición vuelve a construir el snapshot
+                    snapshot = self.guardar(version, {
+                        'platos': consultar_platos(), 'categorias': consultar_categorias()
+                    })
+        return snapshot
+
+    def obtener(self, clave, variante=None, construir=None):
+        """Devuelve (bytes, etag, version) de 'platos' o 'categorias'. Con variante
+        (las columnas de un ?fields=) devuelve esa variante; construir() la consulta
+        la primera vez"""
+        snapshot = self.actual()
+        if variante is None:
+            return snapshot[clave]
+        return self.variante(snapshot, (clave, variante)) or \
+            self.guardar_variante(snapshot, (clave, variante), construir())
+
+    def _serializar(self, datos, version):
+        cuerpo = app.json.a_bytes(datos)
+        return cuerpo, hashlib.sha256(cuerpo).hexdigest()[:32], version
+
+    def guardar(self, version, datos):
+        """Serializa {clave: lista} y lo deja como snapshot de esa versión"""
+        snapshot = {'version': version, 'creado': time.monotonic(), 'variantes': {}}
+        for clave, valor in datos.items():
+            snapshot[clave] = self._serializar(valor, version)
+        self._snapshot = snapshot
+        return snapshot
+
+    def variante(self, snapshot, clave):
+        return snapshot['variantes'].get(clave)
+
+    def guardar_variante(self, snapshot, clave, datos):
+        """Las variantes viven dentro de su snapshot, así que se invalidan con él"""
+        serializada = self._serializar(datos, snapshot['version'])
+        if len(snapshot['variantes']) < self.MAXIMO_VARIANTES:
+            snapshot['variantes'][clave] = serializada
+        return serializada
+
+menu_cache = CacheMenu(
+    os.getenv('MENU_VERSION_FILE', os.path.join(tempfile.gettempdir(), 'restaurante_menu_version')),
+    ttl=int(os.getenv('MENU_CACHE_TTL', 300))
+)
+
+def respuesta_menu(serializado):
+    """Respuesta con ETag fuerte para un (bytes, etag, version) de menu_cache;
+    contesta 304 si el cliente ya tiene esta versión"""
+    cuerpo, etag, version = serializado
+    respuesta = app.response_class(cuerpo, mimetype='application/json')
+    respuesta.set_etag(etag)
+    respuesta.headers['X-Menu-Version'] = str(version)
+    respuesta.cache_control.no_cache = True  # el navegador siempre revalida con If-None-Match
+    return respuesta.make_conditional(request)
+
+# ===== EXPORTACIÓN EN STREAMING =====
+
+FILAS_POR_LOTE = 1000
+
+def _valor_exportable(valor):
+    return valor.isoformat() if isinstance(valor, (datetime, date)) else valor
+
+def respuesta_exportacion(consulta, columnas, nombre):
+    """Envía el resultado de la consulta como NDJSON o CSV a medida que se lee.
+    yield_per abre un cursor del lado del servidor (psycopg2), así que la memoria
+    del worker depende del tamaño del lote y no del rango de fechas"""
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in ('ndjson', 'csv'):
+        raise ValueError('formato debe ser ndjson o csv')
+    
+    def generar():
+        filas = db.session.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE))
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        if formato == 'csv':
+            escritor.writerow(columnas)
+        for lote in filas.partitions():
+            for fila in lote:
+                if formato == 'csv':
+                    escritor.writerow([_valor_exportable(v) for v in fila])
+                else:
+                    buffer.write(app.json.dumps(dict(zip(columnas, fila))))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    extension = 'csv' if formato == 'csv' else 'ndjson'
+    return app.response_class(
+        stream_with_context(generar()),
+        mimetype='text/csv' if formato == 'csv' else 'application/x-ndjson',
+        headers={
+            'Content-Disposition': f'attachment; filename={nombre}.{extension}',
+            'X-Accel-Buffering': 'no'  # que el proxy no acumule la respuesta
+        }
+    )
+
+# ===== COMPRESIÓN =====
+
+@app.after_request
+def comprimir_respuesta(respuesta):
+    """gzip o brotli según Accept-Encoding para JSON, NDJSON y CSV. Las respuestas
+    en streaming se comprimen por fragmentos, sin acumularlas"""
+    if (respuesta.status_code in (204, 304) or respuesta.direct_passthrough
+            or 'Content-Encoding' in respuesta.headers or not es_comprimible(respuesta.mimetype)):
+        return respuesta
+    respuesta.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion(request.headers.get('Accept-Encoding'))
+    if codificacion is None:
+        return respuesta
+    
+    if respuesta.is_streamed:
+        respuesta.response = comprimir_stream(respuesta.response, codificacion)
+    else:
+        cuerpo = respuesta.get_data()
+        if len(cuerpo) < TAMANO_MINIMO:
+            return respuesta
+        respuesta.set_data(comprimir(cuerpo, codificacion))
+    respuesta.headers['Content-Encoding'] = codificacion
+    if 'ETag' in respuesta.headers:
+        respuesta.headers['ETag'] = etag_debil(respuesta.headers['ETag'])
+    return respuesta
+
+# ===== IMPORTACIÓN MASIVA =====
+
+LIMITE_IMPORTACION = 5000
+
+# campo: (tipo, requerido, valor por defecto)
+ESQUEMA_CATEGORIA = {
+    'nombre': (str, True, None),
+}
+ESQUEMA_MESA = {
+    'numero': (int, True, None),
+    'capacidad': (int, True, None),
+    'disponible': (bool, False, True),
+}
+ESQUEMA_PLATO = {
+    'nombre': (str, True, None),
+    'descripcion': (str, False, ''),
+    'precio': (float, True, None),
+    'categoria_id': (int, True, None),
+    'disponible': (bool, False, True),
+    'imagen_url': (str, False, ''),
+}
+
+def leer_lote():
+    """Filas a importar: arreglo JSON, archivo CSV en 'archivo' o cuerpo text/csv"""
+    if 'archivo' in request.files:
+        texto = request.files['archivo'].read().decode('utf-8-sig')
+        filas = list(csv.DictReader(io.StringIO(texto)))
+    elif request.mimetype == 'text/csv':
+        filas = list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+    else:
+        filas = request.get_json(silent=True)
+        if not isinstance(filas, list):
+            raise ValueError('Se esperaba un arreglo JSON o un archivo CSV')
+    if not filas:
+        raise ValueError('No hay filas para importar')
+    if len(filas) > LIMITE_IMPORTACION:
+        raise ValueError(f'Máximo {LIMITE_IMPORTACION} filas por importación')
+    return filas
+
+def _convertir(valor, tipo):
+    if tipo is bool and isinstance(valor, str):
+        if valor.strip().lower() in ('1', 'true', 'si', 'sí', 'yes'):
+            return True
+        if valor.strip().lower() in ('0', 'false', 'no'):
+            return False
+        raise ValueError
+    if tipo is int and isinstance(valor, float) and not valor.is_integer():
+        raise ValueError
+    return tipo(valor)
+
+def validar_lote(filas, esquema):
+    """Valida todas las filas antes de tocar la BD. Devuelve (valores, errores por fila)"""
+    valores, errores = [], []
+    for numero, fila in enumerate(filas, start=1):
+        if not isinstance(fila, dict):
+            errores.append({'fila': numero, 'errores': ['La fila debe ser un objeto']})
+            continue
+        limpia, problemas = {}, []
+        for campo, (tipo, requerido, defecto) in esquema.items():
+            valor = fila.get(campo)
+            if valor is None or valor == '':
+                if requerido:
+                    problemas.append(f'{campo} es obligatorio')
+                else:
+                    limpia[campo] = defecto
+                continue
+            try:
+                limpia[campo] = _convertir(valor, tipo)
+            except (TypeError, ValueError):
+                problemas.append(f'{campo} no es un {tipo.__name__} válido')
+        if problemas:
+            errores.append({'fila': numero, 'errores': problemas})
+        valores.append(limpia)
+    return valores, errores
+
+def marcar_duplicados(valores, errores, columna, campo):
+    """Agrega error a las filas cuyo valor único se repite en el lote o ya existe en la BD"""
+    existentes = set(db.session.execute(
+        db.select(columna).where(columna.in_({v[campo] for v in valores if campo in v}))
+    ).scalars())
+    vistos = set()
+    for numero, v in enumerate(valores, start=1):
+        if campo not in v:
+            continue
+        if v[campo] in existentes or v[campo] in vistos:
+            errores.append({'fila': numero, 'errores': [f'{campo} {v[campo]} ya existe']})
+        vistos.add(v[campo])
+
+def importar_lote(modelo, esquema, validar_extra=None, entidad=None):
+    """Valida el lote completo y lo inserta en una sola transacción con un
+    INSERT multi-fila (insertmanyvalues). Si alguna fila falla no se inserta nada.
+    Con entidad, publica las filas nuevas en el feed de cambios"""
+    valores, errores = validar_lote(leer_lote(), esquema)
+    if validar_extra:
+        validar_extra(valores, errores)
+    if errores:
+        errores.sort(key=lambda e: e['fila'])
+        return jsonify({'error': 'Hay filas con errores; no se importó nada', 'errores': errores}), 400
+    
+    ids = db.session.execute(insert(modelo).returning(modelo.id), valores).scalars().all()
+    if entidad:
+        publicar_cambio(entidad, 'creada', ids)
+    db.session.commit()
+    return jsonify({'mensaje': f'{len(ids)} registros importados', 'ids': ids}), 201
+
+# ===== IMÁGENES =====
+# Las fotos de los platos se suben con multipart/form-data (campo 'imagen') y se
+# guardan como derivados AVIF/WebP con el hash en el nombre (ver imagenes.py).
+# Las URLs guardadas son absolutas: el frontend vive en otro dominio (Vercel).
+# IMAGENES_URL es el CDN o bucket que sirve una copia de IMAGENES_DIR; sin ella
+# se usa el origen de la API que recibe la subida (y la ruta /imagenes)
+
+IMAGENES_DIR = os.getenv('IMAGENES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imagenes_subidas'))
+IMAGENES_MAXIMO_BYTES = int(os.getenv('IMAGENES_MAXIMO_BYTES', 10 * 1024 * 1024))
+CACHE_INMUTABLE = 365 * 24 * 3600  # un año: el nombre cambia si cambia el contenido
+
+IMAGENES_URL = os.getenv('IMAGENES_URL')
+
+def almacen_imagenes():
+    """Almacén con la URL base absoluta: IMAGENES_URL o, dentro de una
+    petición, el origen por el que llegó (ProxyFix corrige el esquema)"""
+    return AlmacenImagenes(IMAGENES_DIR, IMAGENES_URL or request.host_url + 'imagenes')
+
+def datos_plato():
+    """Campos del plato desde JSON o, si se sube una imagen, desde el formulario
+    (convertidos con los tipos de ESQUEMA_PLATO)"""
+    if not request.form and not request.files:
+        return request.json
+    data = {}
+    for campo, valor in request.form.items():
+        tipo = ESQUEMA_PLATO[campo][0] if campo in ESQUEMA_PLATO else str
+        try:
+            data[campo] = _convertir(valor, tipo)
+        except ValueError:
+            raise ValueError(f'{campo}: se esperaba {tipo.__name__}')
+    return data
+
+def imagen_subida(nombre):
+    """(imagen_url, variantes) a partir del archivo 'imagen' de la petición"""
+    datos = request.files['imagen'].read(IMAGENES_MAXIMO_BYTES + 1)
+    if len(datos) > IMAGENES_MAXIMO_BYTES:
+        raise ValueError(f'La imagen supera {IMAGENES_MAXIMO_BYTES // (1024 * 1024)} MB')
+    return almacen_imagenes().procesar(datos, nombre)
+
+@app.route('/imagenes/<path:archivo>')
+def servir_imagen(archivo):
+    respuesta = send_from_directory(IMAGENES_DIR, archivo, max_age=CACHE_INMUTABLE)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.immutable = True
+    return respuesta
+
+# ===== AUTENTICACIÓN POR TOKEN =====
+
+DURACION_TOKEN = int(os.getenv('TOKEN_DURACION_SEGUNDOS', 900))             # 15 minutos
+DURACION_REFRESH = int(os.getenv('REFRESH_TOKEN_DURACION_SEGUNDOS', 43200))  # 12 horas
+
+# Administrador sin fila en la tabla usuarios (id 0)
+ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@restaurante.com')
+ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
+
+firmador_acceso = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='token-acceso')
+firmador_refresh = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='token-refresh')
+firmador_ticket = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='ticket-stream')
+
+def emitir_tokens(usuario):
+    """Token de acceso corto + token de refresco, ambos firmados (sin estado en el servidor)"""
+    datos = {'id': usuario['id'], 'rol': usuario['rol'], 'cargo': usuario.get('cargo')}
+    return {
+        'token': firmador_acceso.dumps(datos),
+        'refresh_token': firmador_refresh.dumps(datos),
+        'expira_en': DURACION_TOKEN
+    }
+
+class ErrorAutenticacion(Exception):
+    """Token ausente, inválido o sin el rol necesario; estado es 401 o 403"""
+    def __init__(self, mensaje, estado):
+        super().__init__(mensaje)
+        self.estado = estado
+
+def usuario_del_token(cabecera, roles=()):
+    """Datos del usuario de una cabecera 'Bearer <token>'. Solo verifica la firma
+    HMAC: no consulta la BD ni calcula hashes de contraseña"""
+    if not cabecera.startswith('Bearer '):
+        raise ErrorAutenticacion('Se requiere autenticación', 401)
+    try:
+        usuario = firmador_acceso.loads(cabecera[7:], max_age=DURACION_TOKEN)
+    except (BadSignature, SignatureExpired):
+        raise ErrorAutenticacion('Token inválido o expirado', 401)
+    if roles and usuario['rol'] not in roles:
+        raise ErrorAutenticacion('No tienes permisos para esta acción', 403)
+    return usuario
+
+def usuario_opcional(cabecera):
+    """Usuario del token si la cabecera trae uno válido; None si no (rutas públicas
+    que muestran más datos al admin)"""
+    try:
+        return usuario_del_token(cabecera)
+    except ErrorAutenticacion:
+        return None
+
+def requiere_token(*roles):
+    """Exige 'Authorization: Bearer <token>' válido y, si se indican, uno de los roles"""
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            try:
+                g.usuario = usuario_del_token(request.headers.get('Authorization', ''), roles)
+            except ErrorAutenticacion as e:
+                return jsonify({'error': str(e)}), e.estado
+            return vista(*args, **kwargs)
+        return envoltura
+    return decorador
+
+def puede_acceder_a(usuario_id, usuario=None):
+    """El admin puede operar sobre cualquier empleado; un empleado solo sobre sí mismo"""
+    usuario = g.usuario if usuario is None else usuario
+    return usuario['rol'] == 'admin' or usuario['id'] == usuario_id
+
+# ===== CONTROL DE ADMISIÓN DEL LOGIN =====
+
+# Fichas por IP (gasta todo intento) y por cuenta (gastan solo los fallidos:
+# quien sabe su contraseña entra aunque otros estén probando con su email
+# desde muchas IP, hasta que la cuenta se queda sin fichas)
+LOGIN_IP_RAFAGA = int(os.getenv('LOGIN_IP_RAFAGA', 20))
+LOGIN_IP_POR_MINUTO = int(os.getenv('LOGIN_IP_POR_MINUTO', 10))
+LOGIN_CUENTA_RAFAGA = int(os.getenv('LOGIN_CUENTA_RAFAGA', 5))
+LOGIN_CUENTA_POR_MINUTO = int(os.getenv('LOGIN_CUENTA_POR_MINUTO', 1))
+LOGIN_MAXIMO_CLAVES = int(os.getenv('LOGIN_MAXIMO_CLAVES', 100000))  # buckets en memoria
+# Verificaciones de contraseña simultáneas por worker y cuántas pueden esperar
+LOGIN_HILOS = int(os.getenv('LOGIN_HILOS', 2))
+LOGIN_COLA = int(os.getenv('LOGIN_COLA', 8))
+LOGIN_ESPERA_MAXIMA = int(os.getenv('LOGIN_ESPERA_MAXIMA_SEGUNDOS', 5))
+
+limitador_login = LimitadorMemoria(LOGIN_MAXIMO_CLAVES)
+limite_ip = Bucket(limitador_login, 'ip', LOGIN_IP_RAFAGA, LOGIN_IP_POR_MINUTO)
+limite_cuenta = Bucket(limitador_login, 'cuenta', LOGIN_CUENTA_RAFAGA, LOGIN_CUENTA_POR_MINUTO)
+verificador_login = VerificadorAcotado(LOGIN_HILOS, LOGIN_COLA, LOGIN_ESPERA_MAXIMA)
+
+@functools.cache
+def hash_ficticio():
+    """Hash contra el que se verifican los emails que no existen: la respuesta
+    tarda lo mismo y no delata qué cuentas hay. Se calcula en el primer login
+    así (scrypt) y no al importar: el arranque de los workers y los comandos
+    flask no lo pagan"""
+    return generate_password_hash(os.urandom(16).hex())
+
+def verificar_password(password_hash, password):
+    """check_password_hash, contra hash_ficticio() si no hay usuario (None)"""
+    return check_password_hash(password_hash or hash_ficticio(), password)
+
+def demasiados_intentos(espera):
+    respuesta = jsonify({'error': f'Demasiados intentos de inicio de sesión, intenta de nuevo en {math.ceil(espera)} s'})
+    respuesta.headers['Retry-After'] = str(math.ceil(espera))
+    return respuesta, 429
+
+def servidor_ocupado():
+    respuesta = jsonify({'error': 'El servidor está ocupado, intenta de nuevo en unos segundos'})
+    respuesta.headers['Retry-After'] = '1'
+    return respuesta, 503
+
+# ===== IDEMPOTENCIA =====
+
+# IDEMPOTENCIA_ALMACEN=bd comparte las claves entre workers e instancias;
+# memoria las guarda por proceso (desarrollo o un solo worker)
+IDEMPOTENCIA_ALMACEN = os.getenv('IDEMPOTENCIA_ALMACEN', 'bd')
+IDEMPOTENCIA_TTL = int(os.getenv('IDEMPOTENCIA_TTL_SEGUNDOS', 86400))  # 24 horas
+IDEMPOTENCIA_EN_CURSO = 60     # segundos tras los que se libera una clave sin respuesta
+IDEMPOTENCIA_MAXIMO = int(os.getenv('IDEMPOTENCIA_MAXIMO', 10000))  # claves del almacén en memoria
+LARGO_CLAVE = 255
+
+@functools.cache
+def almacen_idempotencia():
+    """Se crea en la primera petición: db.engine necesita el contexto de la app"""
+    if IDEMPOTENCIA_ALMACEN == 'memoria':
+        return AlmacenMemoria(IDEMPOTENCIA_MAXIMO, IDEMPOTENCIA_TTL, IDEMPOTENCIA_EN_CURSO)
+    return AlmacenBD(db.engine, ClaveIdempotencia, IDEMPOTENCIA_TTL, IDEMPOTENCIA_EN_CURSO)
+
+def huella_peticion():
+    """Identifica la petición: la misma clave con otra ruta, usuario o cuerpo es un error del cliente"""
+    usuario = g.get('usuario') or {}
+    resumen = hashlib.sha256(f"{request.method} {request.path} {usuario.get('id')}\n".encode())
+    resumen.update(request.get_data(cache=True))
+    return resumen.hexdigest()
+
+def idempotente(vista):
+    """Con cabecera Idempotency-Key, una repetición de la petición recibe la
+    respuesta guardada de la primera sin volver a ejecutar la ruta. Va después
+    de requiere_token: la huella incluye al usuario. Las respuestas 5xx no se
+    guardan (el reintento vuelve a ejecutarse)"""
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave = request.headers.get('Idempotency-Key')
+        if not clave:
+            return vista(*args, **kwargs)
+        if len(clave) > LARGO_CLAVE:
+            return jsonify({'error': f'Idempotency-Key admite hasta {LARGO_CLAVE} caracteres'}), 400
+        
+        almacen = almacen_idempotencia()
+        huella = huella_peticion()
+        resultado, guardada = almacen.reclamar(clave, huella)
+        if resultado == GUARDADA:
+            estado, cuerpo, tipo = guardada
+            respuesta = app.response_class(cuerpo, status=estado, mimetype=tipo)
+            respuesta.headers['Idempotent-Replayed'] = 'true'
+            return respuesta
+        if resultado == EN_CURSO:
+            respuesta = jsonify({'error': 'Una petición con esta Idempotency-Key todavía está en curso'})
+            respuesta.headers['Retry-After'] = '1'
+            return respuesta, 409
+        if resultado != NUEVA:
+            return jsonify({'error': 'Idempotency-Key ya usada con otra petición'}), 422
+        
+        try:
+            respuesta = app.make_response(vista(*args, **kwargs))
+        except Exception:
+            almacen.liberar(clave, huella)
+            raise
+        if respuesta.status_code >= 500 or respuesta.is_streamed:
+            almacen.liberar(clave, huella)
+        else:
+            almacen.completar(clave, huella, (respuesta.status_code, respuesta.get_data(), respuesta.mimetype))
+        return respuesta
+    return envoltura
+
+# ===== RÉPLICA DE LECTURA =====
+
+PREFIJOS_REPLICA = ('obtener_', 'buscar_', 'exportar_')
+# El menú se sirve desde menu_cache: reconstruirlo desde una réplica atrasada
+# guardaría el menú viejo con la versión nueva hasta que venza el TTL
+RUTAS_SOLO_PRIMARIA = {'obtener_platos', 'obtener_categorias'}
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+def cliente_actual():
+    return identidad(request.headers.get('Authorization'), request.remote_addr)
+
+@app.before_request
+def enrutar_lectura():
+    """Las rutas de lectura consultan la réplica si está al día y el cliente no escribió hace poco"""
+    endpoint = request.endpoint or ''
+    if (replica is not None and request.method == 'GET' and endpoint.startswith(PREFIJOS_REPLICA)
+            and endpoint not in RUTAS_SOLO_PRIMARIA and replica.usar(cliente_actual())):
+        leer_de(db.session, replica)
+
+@app.after_request
+def marcar_escritura(respuesta):
+    """Tras una escritura correcta, las lecturas de ese cliente van a la primaria durante la ventana"""
+    if replica is not None and request.method not in METODOS_LECTURA and respuesta.status_code < 400:
+        replica.marcas.marcar(cliente_actual())
+    return respuesta
+
+@app.teardown_request
+def soltar_replica(error=None):
+    """Si la petición reutiliza un contexto de aplicación ya abierto (CLI, tests) la sesión
+    sobrevive a la petición: la marca de réplica no debe pasar a la siguiente"""
+    if replica is not None:
+        dejar_de_leer(db.session)
+
+# ===== FEED DE CAMBIOS (SSE) =====
+
+ENTIDADES_FEED = ('reserva', 'mesa', 'asistencia')
+LATIDO_STREAM = 15      # segundos sin eventos antes de enviar un ping
+COLA_STREAM = 1000      # eventos pendientes por cliente; si se llena se cierra su stream
+CABECERAS_STREAM = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+CAMPOS_PUBLICOS_FEED = ('entidad', 'accion', 'id', 'ts')
+# EventSource no envía cabeceras: el ticket va en la URL y por eso vive poco
+DURACION_TICKET_STREAM = int(os.getenv('TICKET_STREAM_DURACION_SEGUNDOS', 30))
+# Conexiones SSE por proceso en la ruta Flask (sin asgi.py cada una ocupa un hilo)
+STREAMS_WSGI_MAXIMO = int(os.getenv('STREAMS_WSGI_MAXIMO', 2))
+
+# Por entidad: serializador del evento (la forma de su listado) y consulta de las filas por id
+CONSULTAS_FEED = {
+    'reserva': (RESERVA_JSON, lambda ids: db.select(*RESERVA_JSON.columnas)
+                .join(Cliente, Reserva.cliente_id == Cliente.id)
+                .join(Mesa, Reserva.mesa_id == Mesa.id)
+                .where(Reserva.id.in_(ids))),
+    'mesa': (MESA_JSON, lambda ids: db.select(*MESA_JSON.columnas).where(Mesa.id.in_(ids))),
+    'asistencia': (ASISTENCIA_EMPLEADO_JSON, lambda ids: db.select(*ASISTENCIA_EMPLEADO_JSON.columnas)
+                   .join(Usuario, Asistencia.usuario_id == Usuario.id)
+                   .where(Asistencia.id.in_(ids))),
+}
+
+def publicar_cambio(entidad, accion, ids):
+    """Publica en el feed el cambio de las filas ids ('creada', 'actualizada' o
+    'eliminada'). Se llama antes del commit: si hay rollback no se publica nada"""
+    ts = datetime.now(timezone.utc).isoformat()
+    if accion == 'eliminada':
+        eventos = [{'entidad': entidad, 'accion': accion, 'id': i, 'ts': ts} for i in ids]
+    else:
+        serializador, consulta = CONSULTAS_FEED[entidad]
+        eventos = [{'entidad': entidad, 'accion': accion, 'id': fila.id, 'ts': ts,
+                    'datos': serializador.serializar(fila)}
+                   for fila in db.session.execute(consulta(ids))]
+    feed_cambios.publicar(db.session, eventos)
+
+def usuario_del_ticket(ticket):
+    """Datos del usuario de un ticket de POST /api/stream/ticket"""
+    try:
+        return firmador_ticket.loads(ticket, max_age=DURACION_TICKET_STREAM)
+    except (BadSignature, SignatureExpired):
+        raise ErrorAutenticacion('Ticket de stream inválido o expirado', 401)
+
+def aviso_publico(evento):
+    """El evento sin la fila: qué cambió y cuándo, para el canal anónimo"""
+    return app.json.dumps({campo: evento[campo] for campo in CAMPOS_PUBLICOS_FEED if campo in evento})
+
+def filtro_stream(args):
+    """Función que convierte cada evento en el mensaje SSE de un cliente de
+    /api/stream, o None si no le toca, según ?entidades= (por defecto reserva,mesa).
+    Sin ?ticket= el canal es público y solo lleva entidad, acción, id y ts: quien
+    quiera la fila la pide a la API con sus credenciales. Con ticket el admin
+    recibe las filas completas y un empleado solo sus propias asistencias"""
+    entidades = set((args.get('entidades') or 'reserva,mesa').split(','))
+    if not entidades <= set(ENTIDADES_FEED):
+        raise ValueError(f"entidades admite: {', '.join(ENTIDADES_FEED)}")
+    usuario = None
+    if args.get('ticket'):
+        usuario = usuario_del_ticket(args['ticket'])
+    elif 'asistencia' in entidades:
+        raise ErrorAutenticacion('Las asistencias requieren ?ticket=', 401)
+    
+    def mensaje(evento, carga):
+        if evento['entidad'] is None:  # resincronizar
+            return mensaje_sse(evento, carga)
+        if evento['entidad'] not in entidades:
+            return None
+        if usuario is None:
+            return mensaje_sse(evento, aviso_publico(evento))
+        if usuario['rol'] == 'admin':
+            return mensaje_sse(evento, carga)
+        if evento['entidad'] == 'asistencia':
+            propia = evento.get('datos', {}).get('empleado', {}).get('id') == usuario['id']
+            return mensaje_sse(evento, carga) if propia else None
+        return mensaje_sse(evento, aviso_publico(evento))
+    return mensaje
+
+# ===== RESUMEN DE ASISTENCIA =====
+
+PERIODOS_RESUMEN = ('dia', 'semana', 'mes')
+
+def inicio_periodo(fecha, periodo):
+    """Primer día del periodo que contiene a fecha (semanas de lunes a domingo)"""
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if periodo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+def insert_con_conflicto(modelo):
+    """INSERT con soporte de ON CONFLICT según el motor (Postgres o SQLite)"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    else:
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    return insert_dialecto(modelo)
+
+def sumar_a_resumen(usuario_id, fecha, minutos, turnos=1):
+    """Suma un turno a los resúmenes de día, semana y mes con un único upsert.
+    Se ejecuta dentro de la transacción que registra la salida"""
+    sentencia = insert_con_conflicto(ResumenAsistencia)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=['usuario_id', 'periodo', 'inicio'],
+        set_={
+            'minutos': ResumenAsistencia.minutos + sentencia.excluded.minutos,
+            'turnos': ResumenAsistencia.turnos + sentencia.excluded.turnos
+        }
+    )
+    db.session.execute(sentencia, [{
+        'usuario_id': usuario_id,
+        'periodo': periodo,
+        'inicio': inicio_periodo(fecha, periodo),
+        'minutos': minutos,
+        'turnos': turnos
+    } for periodo in PERIODOS_RESUMEN])
+
+def minutos_trabajados(hora_entrada, hora_salida):
+    return int((hora_salida - hora_entrada).total_seconds() // 60)
+
+def reconstruir_resumen(desde=None):
+    """Recalcula los resúmenes desde asistencias (todos, o los periodos que empiezan
+    a partir de desde). Lee las asistencias en streaming y escribe en lote"""
+    limites = {p: inicio_periodo(desde, p) if desde else None for p in PERIODOS_RESUMEN}
+    
+    borrar = db.delete(ResumenAsistencia)
+    if desde:
+        borrar = borrar.where(or_(*[
+            and_(ResumenAsistencia.periodo == p, ResumenAsistencia.inicio >= limite)
+            for p, limite in limites.items()
+        ]))
+    db.session.execute(borrar)
+    
+    consulta = db.select(
+        Asistencia.usuario_id, Asistencia.fecha, Asistencia.hora_entrada, Asistencia.hora_salida
+    ).where(Asistencia.hora_entrada.isnot(None), Asistencia.hora_salida.isnot(None))
+    if desde:
+        consulta = consulta.where(Asistencia.fecha >= min(limites.values()))
+    
+    acumulado = {}
+    for usuario_id, fecha, entrada, salida in db.session.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE)):
+        for periodo in PERIODOS_RESUMEN:
+            inicio = inicio_periodo(fecha, periodo)
+            if limites[periodo] and inicio < limites[periodo]:
+                continue
+            fila = acumulado.setdefault((usuario_id, periodo, inicio), [0, 0])
+            fila[0] += minutos_trabajados(entrada, salida)
+            fila[1] += 1
+    
+    if acumulado:
+        db.session.execute(insert(ResumenAsistencia), [{
+            'usuario_id': usuario_id, 'periodo': periodo, 'inicio': inicio,
+            'minutos': minutos, 'turnos': turnos
+        } for (usuario_id, periodo, inicio), (minutos, turnos) in acumulado.items()])
+    db.session.commit()
+    return len(acumulado)
+
+# ===== PARTICIONES =====
+
+# En Postgres reservas y asistencias se parten por mes (ver particiones.py)
+TABLAS_PARTICIONADAS = ((Reserva.__table__, 'fecha_hora'), (Asistencia.__table__, 'fecha'))
+PARTICIONES_MESES_ADELANTE = int(os.getenv('PARTICIONES_MESES_ADELANTE', 3))
+# Espera máxima por el bloqueo de la tabla al convertirla: si hay consultas
+# largas en curso se aborta en vez de encolar detrás a todas las demás
+PARTICIONES_ESPERA_BLOQUEO = os.getenv('PARTICIONES_ESPERA_BLOQUEO', '5s')
+
+def asegurar_particiones():
+    """Crea las particiones de los próximos meses y las de los meses que hayan
+    caído en la partición por defecto. La llaman inicializar-db y el cron de
+    mantener-particiones; los workers no"""
+    with app.app_context(), db.engine.begin() as conexion:
+        for tabla, columna in TABLAS_PARTICIONADAS:
+            creados = asegurar(conexion, tabla.name, columna, PARTICIONES_MESES_ADELANTE, datetime.utcnow().date())
+            if creados:
+                logger.info("Particiones creadas", extra={'datos': {
+                    'tabla': tabla.name, 'meses': [mes.isoformat() for mes in creados]
+                }})
+
+def archivar_particiones(conservar_meses, directorio=None, simular=False):
+    """Archiva los meses anteriores a los últimos `conservar_meses` (más el
+    actual), una transacción por mes. Devuelve [(tabla, mes, destino)]"""
+    hoy = datetime.utcnow().date()
+    asegurar_particiones()  # las filas viejas de la partición por defecto pasan a su mes
+    archivados = []
+    for tabla, _ in TABLAS_PARTICIONADAS:
+        with db.engine.connect() as conexion:
+            viejos = meses_por_archivar(meses_particionados(conexion, tabla.name), hoy, conservar_meses)
+        for mes in viejos:
+            if simular:
+                archivados.append((tabla.name, mes, None))
+                continue
+            with db.engine.begin() as conexion:
+                destino = archivar(conexion, tabla.name, mes, directorio)
+            logger.info("Partición archivada", extra={'datos': {
+                'tabla': tabla.name, 'mes': mes.isoformat(), 'destino': destino
+            }})
+            archivados.append((tabla.name, mes, destino))
+    return archivados
+
+def particionar_tablas(simular=False):
+    """Convierte a particionadas las tablas de TABLAS_PARTICIONADAS que aún no lo
+    están, una transacción por tabla. Devuelve [(tabla, filas copiadas)]"""
+    convertidas = []
+    for tabla, columna in TABLAS_PARTICIONADAS:
+        with db.engine.begin() as conexion:
+            if particionada(conexion, tabla.name):
+                continue
+            filas = conexion.execute(db.select(func.count()).select_from(tabla)).scalar()
+            if simular:
+                convertidas.append((tabla.name, filas))
+                continue
+            conexion.execute(text('SELECT set_config(\'lock_timeout\', :espera, true)'),
+                             {'espera': PARTICIONES_ESPERA_BLOQUEO})
+            inicio = time.perf_counter()
+            convertir(conexion, tabla, columna, PARTICIONES_MESES_ADELANTE, datetime.utcnow().date())
+        logger.info("Tabla particionada por mes", extra={'datos': {
+            'tabla': tabla.name, 'filas': filas, 'segundos': round(time.perf_counter() - inicio, 1)
+        }})
+        convertidas.append((tabla.name, filas))
+    return convertidas
+
 # Rutas de la API
 
 # ===== HEALTH CHECK =====
 
+class MonitorBaseDatos:
+    """Comprueba la BD en un hilo de fondo y guarda el resultado junto con las
+    métricas del pool. Los probes del balanceador leen ese estado sin esperar a la BD"""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self.estado = {'status': 'starting', 'database': 'unknown'}
+
+    def iniciar(self):
+        """Arranca el hilo una vez por proceso (después del fork de gunicorn)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(target=self._ciclo, name='monitor-bd', daemon=True)
+                self._hilo.start()
+
+    def _ciclo(self):
+        while True:
+            self.refrescar()
+            time.sleep(self.intervalo)
+
+    def refrescar(self):
+        inicio = time.perf_counter()
+        try:
+            with app.app_context():
+                with db.engine.connect() as conexion:
+                    conexion.execute(text('SELECT 1'))
+                estado = {'status': 'ok', 'database': 'connected'}
+        except Exception as e:
+            estado = {'status': 'error', 'database': 'unreachable', 'detail': str(e)}
+        estado['latencia_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        estado['verificado_en'] = time.time()
+        with app.app_context():
+            estado['pool'] = metricas_pool()
+        self.estado = estado
+
+    def vigente(self):
+        """Último estado, marcado como obsoleto si el hilo dejó de refrescarlo"""
+        estado = dict(self.estado)
+        if 'verificado_en' in estado:
+            estado['antiguedad_s'] = round(time.time() - estado.pop('verificado_en'), 1)
+            if estado['antiguedad_s'] > 3 * self.intervalo:
+                estado['status'] = 'stale'
+        return estado
+
+def metricas_pool():
+    pool = db.engine.pool
+    metricas = {'tipo': type(pool).__name__}
+    for nombre in ('size', 'checkedout', 'checkedin', 'overflow'):
+        if hasattr(pool, nombre):
+            metricas[nombre] = getattr(pool, nombre)()
+    return metricas
+
+monitor_bd = MonitorBaseDatos(intervalo=float(os.getenv('DB_ESTADO_INTERVALO', 5)))
+
 @app.route('/health')
 def health_check():
-    try:
-        # Intentar una consulta simple
-        db.session.execute(text('SELECT 1'))
-        return jsonify({"status": "ok", "database": "connected"}), 200
-    except Exception as e:
-        return jsonify({"status": "error", "detail": str(e)}), 500
+    """Liveness: estado cacheado de la BD, nunca consulta en el probe"""
+    monitor_bd.iniciar()
+    estado = monitor_bd.vigente()
+    if estado['status'] == 'error':
+        return jsonify({"status": "error", "detail": estado.get('detail')}), 500
+    return jsonify({"status": "ok", "database": estado['database']}), 200
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness: estado de la BD y del pool refrescado en segundo plano"""
+    monitor_bd.iniciar()
+    estado = monitor_bd.vigente()
+    if estado['status'] != 'ok':
+        return jsonify(estado), 503
+    estado['pool'] = metricas_pool()  # contadores del pool en este instante (sin I/O)
+    if replica is not None:  # informativo: sin réplica se lee de la primaria
+        estado['replica'] = replica.vigente()
+    estado['login'] = verificador_login.ocupacion()
+    return jsonify(estado), 200
 
 @app.route('/')
 def index():
@@ -123,25 +1357,146 @@ def index():
         }
     }), 200
 
+# ===== STREAM DE CAMBIOS =====
+
+streams_wsgi = threading.BoundedSemaphore(STREAMS_WSGI_MAXIMO)
+
+@app.route('/api/stream/ticket', methods=['POST'])
+@requiere_token()
+def ticket_stream():
+    """Ticket firmado de DURACION_TICKET_STREAM segundos para abrir /api/stream
+    con ?ticket=. Solo sirve para conectar (y reconectar) el stream, así que lo
+    que quede en los logs de acceso no da acceso a la API"""
+    return jsonify({'ticket': firmador_ticket.dumps(g.usuario), 'expira_en': DURACION_TICKET_STREAM})
+
+@app.route('/api/stream', methods=['GET'])
+def stream_cambios():
+    """Server-Sent Events con los cambios de reservas, mesas y asistencias.
+    ?entidades=reserva,mesa,asistencia y ?ticket= (ver filtro_stream).
+    En producción lo atiende lectura_async en el bucle de eventos. Esta ruta
+    solo corre con `gunicorn app:app`, donde cada conexión ocupa un hilo (con
+    workers sync, un worker entero) mientras dure: por eso admite como mucho
+    STREAMS_WSGI_MAXIMO por proceso y al resto contesta 503; las páginas
+    siguen funcionando recargando tras cada escritura"""
+    try:
+        preparar = filtro_stream(request.args)
+    except ErrorAutenticacion as e:
+        return jsonify({'error': str(e)}), e.estado
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not streams_wsgi.acquire(blocking=False):
+        return servidor_ocupado()
+    
+    cola = queue.Queue(COLA_STREAM)
+    desbordada = threading.Event()
+    
+    def entregar(evento, carga):
+        mensaje = preparar(evento, carga)
+        if mensaje:
+            try:
+                cola.put_nowait(mensaje)
+            except queue.Full:
+                desbordada.set()  # cliente lento: al reconectar recibe 'listo' y recarga
+    
+    def generar():
+        clave = feed_cambios.suscribir(entregar)
+        try:
+            yield INICIO_SSE
+            while not desbordada.is_set():
+                try:
+                    yield cola.get(timeout=LATIDO_STREAM)
+                except queue.Empty:
+                    yield LATIDO_SSE
+        finally:
+            feed_cambios.desuscribir(clave)
+    
+    respuesta = app.response_class(generar(), mimetype='text/event-stream', headers=CABECERAS_STREAM)
+    respuesta.call_on_close(streams_wsgi.release)  # también si se corta antes del primer mensaje
+    return respuesta
+
 # ===== RESERVAS =====
 
+def filtrar_reservas(consulta, args=None):
+    """Aplica los filtros desde, hasta, estado y mesa_id de la query string"""
+    args = request.args if args is None else args
+    desde = leer_fecha_hora('desde', args)
+    hasta = leer_fecha_hora('hasta', args)
+    if desde:
+        consulta = consulta.where(Reserva.fecha_hora >= desde)
+    if hasta:
+        consulta = consulta.where(Reserva.fecha_hora < hasta)
+    if args.get('estado'):
+        consulta = consulta.where(Reserva.estado == args['estado'])
+    if args.get('mesa_id'):
+        consulta = consulta.where(Reserva.mesa_id == args.get('mesa_id', type=int))
+    return consulta
+
+def consulta_reservas(args, limite, serializador=RESERVA_JSON):
+    """Página de reservas (limite + 1 filas) según filtros y cursor de args"""
+    # Una sola consulta con solo las columnas que usa el JSON (sin N+1) y los
+    # JOIN de las tablas que aparecen en él; la clave del cursor se lee siempre
+    consulta = db.select(
+        *serializador.columnas_con(fecha_hora=Reserva.fecha_hora, id=Reserva.id)
+    ).select_from(Reserva)
+    if Cliente in serializador.modelos:
+        consulta = consulta.join(Cliente, Reserva.cliente_id == Cliente.id)
+    if Mesa in serializador.modelos:
+        consulta = consulta.join(Mesa, Reserva.mesa_id == Mesa.id)
+    consulta = filtrar_reservas(consulta, args)
+    if args.get('cursor'):
+        fecha_cursor, id_cursor = decodificar_cursor(args['cursor'], datetime.fromisoformat, int)
+        consulta = consulta.where(tuple_(Reserva.fecha_hora, Reserva.id) < (fecha_cursor, id_cursor))
+    return consulta.order_by(Reserva.fecha_hora.desc(), Reserva.id.desc()).limit(limite + 1)
+
+def serializador_reservas(usuario, args=None):
+    """Listado completo para el admin; para los demás, sin datos del cliente"""
+    es_admin = usuario is not None and usuario['rol'] == 'admin'
+    return serializador_pedido(RESERVA_JSON if es_admin else RESERVA_PUBLICA_JSON, args)
+
+def clave_cursor_reserva(fila):
+    return fila.fecha_hora, fila.id
+
 @app.route('/api/reservas', methods=['GET'])
 def obtener_reservas():
+    """Lista paginada por cursor (fecha_hora, id) descendente.
+    Filtros: desde, hasta, estado, mesa_id, limit, cursor, fields.
+    Pública para el calendario de reservas; el cliente y las notas solo con token de admin"""
     try:
-        reservas = Reserva.query.all()
-        return jsonify([{
-            'id': r.id,
-            'cliente': {'id': r.cliente.id, 'nombre': r.cliente.nombre, 'email': r.cliente.email},
-            'mesa': {'id': r.mesa.id, 'numero': r.mesa.numero},
-            'fecha_hora': r.fecha_hora.isoformat(),
-            'num_personas': r.num_personas,
-            'estado': r.estado,
-            'notas': r.notas
-        } for r in reservas]), 200
+        limite = leer_limite()
+        serializador = serializador_reservas(usuario_opcional(request.headers.get('Authorization', '')))
+        filas = db.session.execute(consulta_reservas(request.args, limite, serializador)).all()
+        return respuesta_paginada(filas, limite, serializador.serializar, clave_cursor_reserva), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/reservas/export', methods=['GET'])
+@requiere_token('admin')
+def exportar_reservas():
+    """Exporta reservas en streaming (?formato=ndjson|csv, mismos filtros que el listado)"""
+    try:
+        consulta = filtrar_reservas(
+            db.select(
+                Reserva.id, Reserva.fecha_hora, Reserva.num_personas, Reserva.estado, Reserva.notas,
+                Reserva.creada_en, Cliente.id, Cliente.nombre, Cliente.email, Cliente.telefono,
+                Mesa.id, Mesa.numero
+            )
+            .join(Cliente, Reserva.cliente_id == Cliente.id)
+            .join(Mesa, Reserva.mesa_id == Mesa.id)
+        ).order_by(Reserva.fecha_hora, Reserva.id)
+        return respuesta_exportacion(consulta, [
+            'id', 'fecha_hora', 'num_personas', 'estado', 'notas', 'creada_en',
+            'cliente_id', 'cliente_nombre', 'cliente_email', 'cliente_telefono',
+            'mesa_id', 'mesa_numero'
+        ], 'reservas')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/reservas/<int:id>', methods=['GET'])
+@requiere_token('admin')
 def obtener_reserva(id):
     reserva = Reserva.query.get_or_404(id)
     return jsonify({
@@ -155,6 +1510,7 @@ def obtener_reserva(id):
     })
 
 @app.route('/api/reservas', methods=['POST'])
+@idempotente
 def crear_reserva():
     try:
         data = request.json
@@ -170,24 +1526,34 @@ def crear_reserva():
             db.session.add(cliente)
             db.session.flush()
         
+        # Rechazar la reserva si la mesa ya está ocupada en ese horario
+        fecha_hora = normalizar_fecha_hora(datetime.fromisoformat(data['fecha_hora']))
+        verificar_mesa_libre(data['mesa_id'], fecha_hora, data['num_personas'])
+        
         # Crear reserva
         nueva_reserva = Reserva(
             cliente_id=cliente.id,
             mesa_id=data['mesa_id'],
-            fecha_hora=datetime.fromisoformat(data['fecha_hora']),
+            fecha_hora=fecha_hora,
             num_personas=data['num_personas'],
             notas=data.get('notas', '')
         )
         
         db.session.add(nueva_reserva)
+        db.session.flush()
+        publicar_cambio('reserva', 'creada', [nueva_reserva.id])
         db.session.commit()
         
         return jsonify({'mensaje': 'Reserva creada exitosamente', 'id': nueva_reserva.id}), 201
+    except ConflictoReserva as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/reservas/<int:id>', methods=['PUT'])
+@requiere_token('admin')
 def actualizar_reserva(id):
     try:
         reserva = Reserva.query.get_or_404(id)
@@ -196,7 +1562,7 @@ def actualizar_reserva(id):
         if 'mesa_id' in data:
             reserva.mesa_id = data['mesa_id']
         if 'fecha_hora' in data:
-            reserva.fecha_hora = datetime.fromisoformat(data['fecha_hora'])
+            reserva.fecha_hora = normalizar_fecha_hora(datetime.fromisoformat(data['fecha_hora']))
         if 'num_personas' in data:
             reserva.num_personas = data['num_personas']
         if 'estado' in data:
@@ -204,42 +1570,93 @@ def actualizar_reserva(id):
         if 'notas' in data:
             reserva.notas = data['notas']
         
+        # Si cambia mesa, horario o tamaño del grupo, volver a validar disponibilidad
+        if reserva.estado != 'cancelada' and {'mesa_id', 'fecha_hora', 'num_personas'} & data.keys():
+            with db.session.no_autoflush:
+                verificar_mesa_libre(reserva.mesa_id, reserva.fecha_hora, reserva.num_personas, excluir_id=reserva.id)
+        
+        publicar_cambio('reserva', 'actualizada', [reserva.id])
         db.session.commit()
         return jsonify({'mensaje': 'Reserva actualizada exitosamente'}), 200
+    except ConflictoReserva as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/reservas/<int:id>', methods=['DELETE'])
+@requiere_token('admin')
 def eliminar_reserva(id):
     try:
         reserva = Reserva.query.get_or_404(id)
         db.session.delete(reserva)
+        publicar_cambio('reserva', 'eliminada', [id])
         db.session.commit()
         return jsonify({'mensaje': 'Reserva eliminada exitosamente'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/reservas/asignar-mesas', methods=['POST'])
+@requiere_token('admin')
+def asignar_mesas_reservas():
+    """Reasigna las mesas de las reservas pendientes de una fecha.
+    Body: {"fecha": "YYYY-MM-DD", "aplicar": true}; con aplicar=false solo simula"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            fecha = date.fromisoformat(data['fecha'])
+        except (TypeError, ValueError):
+            raise ValueError('fecha debe tener el formato YYYY-MM-DD')
+        aplicar = data.get('aplicar', True)
+        if not isinstance(aplicar, bool):
+            raise ValueError('aplicar debe ser true o false')
+        return jsonify(asignar_mesas(fecha, aplicar)), 200
+    except KeyError:
+        return jsonify({'error': 'Falta la fecha (YYYY-MM-DD)'}), 400
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # ===== MESAS =====
 
+def consulta_mesas(serializador=MESA_JSON):
+    return db.select(*serializador.columnas)
+
 @app.route('/api/mesas', methods=['GET'])
 def obtener_mesas():
     try:
-        mesas = Mesa.query.all()
-        resultado = [{
-            'id': m.id,
-            'numero': m.numero,
-            'capacidad': m.capacidad,
-            'disponible': m.disponible
-        } for m in mesas]
-        print(f"✅ Enviando {len(resultado)} mesas")  # Log para debug
+        serializador = serializador_pedido(MESA_JSON)
+        resultado = serializador.lista(db.session.execute(consulta_mesas(serializador)))
+        logger.debug("Enviando mesas", extra={'datos': {'total': len(resultado)}})
         return jsonify(resultado), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"❌ Error obteniendo mesas: {str(e)}")  # Log para debug
+        logger.exception("Error obteniendo mesas")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/mesas/disponibilidad', methods=['GET'])
+def obtener_disponibilidad():
+    """Mesas libres para ?fecha_hora=<ISO 8601>&personas=<n>"""
+    try:
+        inicio = leer_fecha_hora('fecha_hora')
+        personas = request.args.get('personas', type=int)
+        if inicio is None or not personas or personas < 1:
+            return jsonify({'error': 'Se requieren fecha_hora y personas'}), 400
+        
+        return jsonify(MESA_LIBRE_JSON.lista(mesas_disponibles(inicio, personas))), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/mesas', methods=['POST'])
+@requiere_token('admin')
 def crear_mesa():
     try:
         data = request.json
@@ -248,13 +1665,30 @@ def crear_mesa():
             capacidad=data['capacidad']
         )
         db.session.add(nueva_mesa)
+        db.session.flush()
+        publicar_cambio('mesa', 'creada', [nueva_mesa.id])
         db.session.commit()
         return jsonify({'mensaje': 'Mesa creada exitosamente', 'id': nueva_mesa.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/mesas/bulk', methods=['POST'])
+@requiere_token('admin')
+def importar_mesas():
+    """Importa mesas desde un arreglo JSON o CSV (numero, capacidad, disponible)"""
+    try:
+        return importar_lote(Mesa, ESQUEMA_MESA, lambda valores, errores:
+                             marcar_duplicados(valores, errores, Mesa.numero, 'numero'), entidad='mesa')
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/mesas/<int:id>', methods=['PUT'])
+@requiere_token('admin')
 def actualizar_mesa(id):
     try:
         mesa = Mesa.query.get_or_404(id)
@@ -267,6 +1701,7 @@ def actualizar_mesa(id):
         if 'disponible' in data:
             mesa.disponible = data['disponible']
         
+        publicar_cambio('mesa', 'actualizada', [mesa.id])
         db.session.commit()
         return jsonify({'mensaje': 'Mesa actualizada exitosamente'}), 200
     except Exception as e:
@@ -275,19 +1710,39 @@ def actualizar_mesa(id):
 
 # ===== PLATOS =====
 
+def consulta_platos(serializador=PLATO_JSON):
+    consulta = db.select(*serializador.columnas).select_from(Plato)
+    if Categoria in serializador.modelos:
+        consulta = consulta.join(Categoria, Plato.categoria_id == Categoria.id)
+    return consulta
+
+def consultar_platos():
+    return PLATO_JSON.lista(db.session.execute(consulta_platos()))
+
 @app.route('/api/platos', methods=['GET'])
 def obtener_platos():
+    """Menú desde la caché; ?fields= (p. ej. id,nombre,precio) lo reduce a esos campos"""
+    try:
+        serializador = serializador_pedido(PLATO_JSON)
+        if serializador is PLATO_JSON:
+            return respuesta_menu(menu_cache.obtener('platos'))
+        # Variante con su propia proyección, guardada junto al snapshot del menú
+        return respuesta_menu(menu_cache.obtener(
+            'platos', serializador.etiquetas,
+            lambda: serializador.lista(db.session.execute(consulta_platos(serializador)))
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/platos/buscar', methods=['GET'])
+def buscar_platos():
+    """Typeahead del menú: ?q= (nombre o descripción, sin importar tildes), limit, fields"""
     try:
-        platos = Plato.query.all()
-        return jsonify([{
-            'id': p.id,
-            'nombre': p.nombre,
-            'descripcion': p.descripcion,
-            'precio': p.precio,
-            'categoria': {'id': p.categoria.id, 'nombre': p.categoria.nombre},
-            'disponible': p.disponible,
-            'imagen_url': p.imagen_url
-        } for p in platos]), 200
+        return respuesta_busqueda(Plato, PLATO_JSON), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -301,13 +1756,15 @@ def obtener_plato(id):
         'precio': plato.precio,
         'categoria': {'id': plato.categoria.id, 'nombre': plato.categoria.nombre},
         'disponible': plato.disponible,
-        'imagen_url': plato.imagen_url
+        'imagen_url': plato.imagen_url,
+        'imagen_variantes': plato.imagen_variantes
     })
 
 @app.route('/api/platos', methods=['POST'])
+@requiere_token('admin')
 def crear_plato():
     try:
-        data = request.json
+        data = datos_plato()
         nuevo_plato = Plato(
             nombre=data['nombre'],
             descripcion=data.get('descripcion', ''),
@@ -315,18 +1772,46 @@ def crear_plato():
             categoria_id=data['categoria_id'],
             imagen_url=data.get('imagen_url', '')
         )
+        if 'imagen' in request.files:
+            nuevo_plato.imagen_url, nuevo_plato.imagen_variantes = imagen_subida(data['nombre'])
         db.session.add(nuevo_plato)
         db.session.commit()
+        menu_cache.invalidar()
         return jsonify({'mensaje': 'Plato creado exitosamente', 'id': nuevo_plato.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/platos/bulk', methods=['POST'])
+@requiere_token('admin')
+def importar_platos():
+    """Importa platos desde un arreglo JSON o CSV"""
+    def validar_categorias(valores, errores):
+        existentes = set(db.session.execute(
+            db.select(Categoria.id).where(Categoria.id.in_({v['categoria_id'] for v in valores if 'categoria_id' in v}))
+        ).scalars())
+        for numero, v in enumerate(valores, start=1):
+            if 'categoria_id' in v and v['categoria_id'] not in existentes:
+                errores.append({'fila': numero, 'errores': [f"categoria_id {v['categoria_id']} no existe"]})
+    
+    try:
+        respuesta = importar_lote(Plato, ESQUEMA_PLATO, validar_categorias)
+        if respuesta[1] == 201:
+            menu_cache.invalidar()
+        return respuesta
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/platos/<int:id>', methods=['PUT'])
+@requiere_token('admin')
 def actualizar_plato(id):
     try:
         plato = Plato.query.get_or_404(id)
-        data = request.json
+        data = datos_plato()
         
         if 'nombre' in data:
             plato.nombre = data['nombre']
@@ -340,19 +1825,25 @@ def actualizar_plato(id):
             plato.disponible = data['disponible']
         if 'imagen_url' in data:
             plato.imagen_url = data['imagen_url']
+            plato.imagen_variantes = None  # los derivados eran de la imagen anterior
+        if 'imagen' in request.files:
+            plato.imagen_url, plato.imagen_variantes = imagen_subida(plato.nombre)
         
         db.session.commit()
+        menu_cache.invalidar()
         return jsonify({'mensaje': 'Plato actualizado exitosamente'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/platos/<int:id>', methods=['DELETE'])
+@requiere_token('admin')
 def eliminar_plato(id):
     try:
         plato = Plato.query.get_or_404(id)
         db.session.delete(plato)
         db.session.commit()
+        menu_cache.invalidar()
         return jsonify({'mensaje': 'Plato eliminado exitosamente'}), 200
     except Exception as e:
         db.session.rollback()
@@ -360,41 +1851,80 @@ def eliminar_plato(id):
 
 # ===== CATEGORÍAS =====
 
+def consulta_categorias():
+    return db.select(*CATEGORIA_JSON.columnas)
+
+def consultar_categorias():
+    return CATEGORIA_JSON.lista(db.session.execute(consulta_categorias()))
+
 @app.route('/api/categorias', methods=['GET'])
 def obtener_categorias():
     try:
-        categorias = Categoria.query.all()
-        return jsonify([{
-            'id': c.id,
-            'nombre': c.nombre
-        } for c in categorias]), 200
+        return respuesta_menu(menu_cache.obtener('categorias'))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/categorias', methods=['POST'])
+@requiere_token('admin')
 def crear_categoria():
     try:
         data = request.json
         nueva_categoria = Categoria(nombre=data['nombre'])
         db.session.add(nueva_categoria)
         db.session.commit()
+        menu_cache.invalidar()
         return jsonify({'mensaje': 'Categoría creada exitosamente', 'id': nueva_categoria.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/categorias/bulk', methods=['POST'])
+@requiere_token('admin')
+def importar_categorias():
+    """Importa categorías desde un arreglo JSON o CSV (nombre)"""
+    try:
+        respuesta = importar_lote(Categoria, ESQUEMA_CATEGORIA, lambda valores, errores:
+                                  marcar_duplicados(valores, errores, Categoria.nombre, 'nombre'))
+        if respuesta[1] == 201:
+            menu_cache.invalidar()
+        return respuesta
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # ===== CLIENTES =====
 
+@app.route('/api/clientes/buscar', methods=['GET'])
+@requiere_token()
+def buscar_clientes():
+    """Typeahead de clientes: ?q= (nombre sin importar tildes, prefijo de email o
+    de teléfono), limit, fields"""
+    try:
+        return respuesta_busqueda(Cliente, CLIENTE_JSON), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/clientes', methods=['GET'])
+@requiere_token()
 def obtener_clientes():
+    """Lista paginada por cursor sobre id. Parámetros: limit, cursor, fields"""
     try:
-        clientes = Cliente.query.all()
-        return jsonify([{
-            'id': c.id,
-            'nombre': c.nombre,
-            'email': c.email,
-            'telefono': c.telefono
-        } for c in clientes]), 200
+        limite = leer_limite()
+        serializador = serializador_pedido(CLIENTE_JSON)
+        consulta = db.select(*serializador.columnas_con(id=Cliente.id))
+        if request.args.get('cursor'):
+            (id_cursor,) = decodificar_cursor(request.args['cursor'], int)
+            consulta = consulta.where(Cliente.id > id_cursor)
+        
+        filas = db.session.execute(consulta.order_by(Cliente.id).limit(limite + 1)).all()
+        return respuesta_paginada(filas, limite, serializador.serializar, lambda f: (f.id,)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -402,63 +1932,95 @@ def obtener_clientes():
 
 @app.route('/api/login', methods=['POST'])
 def login():
-    """Login para admin y empleados"""
+    """Login para admin y empleados; devuelve tokens firmados"""
     try:
         data = request.json
-        email = data.get('email')
-        password = data.get('password')
-        
-        # Verificar admin hardcodeado
-        if email == 'admin@restaurante.com' and password == 'admin123':
-            return jsonify({
-                'mensaje': 'Login exitoso',
-                'usuario': {
-                    'id': 0,
-                    'nombre': 'Administrador',
-                    'email': 'admin@restaurante.com',
-                    'rol': 'admin'
-                }
-            }), 200
+        email = data.get('email') or ''
+        password = data.get('password') or ''
+        cuenta = email.strip().lower()
+        
+        espera = limite_ip.consumir(request.remote_addr or '')  # IP según ProxyFix, no la que declare el cliente
+        if not espera:
+            espera = limite_cuenta.espera(cuenta)
+        if espera:
+            return demasiados_intentos(espera)
+        
+        # Administrador configurado por entorno
+        if hmac.compare_digest(email, ADMIN_EMAIL) and hmac.compare_digest(password, ADMIN_PASSWORD):
+            usuario = {
+                'id': 0,
+                'nombre': 'Administrador',
+                'email': ADMIN_EMAIL,
+                'rol': 'admin'
+            }
+            return jsonify({'mensaje': 'Login exitoso', 'usuario': usuario, **emitir_tokens(usuario)}), 200
         
         # Buscar empleado en la BD
         usuario = Usuario.query.filter_by(email=email, activo=True).first()
+        db.session.close()  # no retener la conexión mientras se verifica
         
-        if not usuario or not usuario.check_password(password):
+        # El hash se calcula en el pool acotado, fuera del hilo de la petición
+        try:
+            valida = verificador_login.ejecutar(
+                verificar_password, usuario.password_hash if usuario else None, password)
+        except Saturado:
+            return servidor_ocupado()
+        if not usuario or not valida:
+            limite_cuenta.consumir(cuenta)
             return jsonify({'error': 'Email o contraseña incorrectos'}), 401
         
-        return jsonify({
-            'mensaje': 'Login exitoso',
-            'usuario': {
-                'id': usuario.id,
-                'nombre': usuario.nombre,
-                'email': usuario.email,
-                'rol': usuario.rol,
-                'cargo': usuario.cargo
-            }
-        }), 200
+        datos_usuario = {
+            'id': usuario.id,
+            'nombre': usuario.nombre,
+            'email': usuario.email,
+            'rol': usuario.rol,
+            'cargo': usuario.cargo
+        }
+        return jsonify({'mensaje': 'Login exitoso', 'usuario': datos_usuario, **emitir_tokens(datos_usuario)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/token/refresh', methods=['POST'])
+def refrescar_token():
+    """Cambia un refresh_token vigente por tokens nuevos sin volver a verificar la contraseña"""
+    try:
+        data = request.json or {}
+        try:
+            datos = firmador_refresh.loads(data.get('refresh_token', ''), max_age=DURACION_REFRESH)
+        except (BadSignature, SignatureExpired):
+            return jsonify({'error': 'Sesión expirada, inicia sesión de nuevo'}), 401
         
+        # Un empleado desactivado no puede seguir renovando su sesión
+        if datos['rol'] != 'admin':
+            activo = db.session.execute(
+                db.select(Usuario.activo).where(Usuario.id == datos['id'])
+            ).scalar_one_or_none()
+            if not activo:
+                return jsonify({'error': 'Usuario inactivo'}), 401
+        
+        return jsonify(emitir_tokens(datos)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ===== RUTAS DE EMPLEADOS (Solo Admin) =====
 
 @app.route('/api/empleados', methods=['GET'])
+@requiere_token('admin')
 def obtener_empleados():
     """Obtener todos los empleados"""
     try:
-        empleados = Usuario.query.filter_by(rol='empleado').all()
-        return jsonify([{
-            'id': e.id,
-            'nombre': e.nombre,
-            'email': e.email,
-            'cargo': e.cargo,
-            'activo': e.activo,
-            'creado_en': e.creado_en.isoformat()
-        } for e in empleados]), 200
+        serializador = serializador_pedido(USUARIO_JSON)
+        empleados = db.session.execute(db.select(*serializador.columnas).where(Usuario.rol == 'empleado'))
+        return jsonify(serializador.lista(empleados)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/empleados', methods=['POST'])
+@requiere_token('admin')
+@idempotente
 def crear_empleado():
     """Crear nuevo empleado (solo admin)"""
     try:
@@ -489,6 +2051,7 @@ def crear_empleado():
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/empleados/<int:id>', methods=['PUT'])
+@requiere_token('admin')
 def actualizar_empleado(id):
     """Actualizar empleado"""
     try:
@@ -514,6 +2077,7 @@ def actualizar_empleado(id):
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/empleados/<int:id>', methods=['DELETE'])
+@requiere_token('admin')
 def eliminar_empleado(id):
     """Eliminar empleado (desactivar)"""
     try:
@@ -528,39 +2092,41 @@ def eliminar_empleado(id):
 # ===== RUTAS DE ASISTENCIA =====
 
 @app.route('/api/asistencia/entrada', methods=['POST'])
+@requiere_token()
+@idempotente
 def registrar_entrada():
     """Registrar entrada de empleado"""
     try:
         data = request.json
-        usuario_id = data['usuario_id']
+        usuario_id = data.get('usuario_id', g.usuario['id'])
+        if not puede_acceder_a(usuario_id):
+            return jsonify({'error': 'No puedes registrar asistencia de otro empleado'}), 403
         
-        # Verificar si ya registró entrada hoy
-        hoy = datetime.utcnow().date()
-        asistencia_hoy = Asistencia.query.filter_by(
+        # Una sola sentencia: inserta la asistencia de hoy o, si ya existe sin
+        # entrada, la completa. Si ya tenía entrada no devuelve filas.
+        ahora = datetime.utcnow()
+        sentencia = insert_con_conflicto(Asistencia).values(
             usuario_id=usuario_id,
-            fecha=hoy
-        ).first()
-        
-        if asistencia_hoy and asistencia_hoy.hora_entrada:
+            fecha=ahora.date(),
+            hora_entrada=ahora
+        )
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=['usuario_id', 'fecha'],
+            set_={'hora_entrada': sentencia.excluded.hora_entrada},
+            where=Asistencia.hora_entrada.is_(None)
+        ).returning(Asistencia.id, Asistencia.hora_entrada)
+        asistencia = db.session.execute(sentencia).first()
+        if asistencia is None:
+            db.session.rollback()
             return jsonify({'error': 'Ya registraste tu entrada hoy'}), 400
         
-        if asistencia_hoy:
-            # Actualizar entrada existente
-            asistencia_hoy.hora_entrada = datetime.utcnow()
-        else:
-            # Crear nueva asistencia
-            asistencia_hoy = Asistencia(
-                usuario_id=usuario_id,
-                fecha=hoy,
-                hora_entrada=datetime.utcnow()
-            )
-            db.session.add(asistencia_hoy)
-        
+        publicar_cambio('asistencia', 'creada', [asistencia.id])
         db.session.commit()
+        hora_entrada = asistencia.hora_entrada
         
         return jsonify({
             'mensaje': 'Entrada registrada exitosamente',
-            'hora': asistencia_hoy.hora_entrada.strftime('%H:%M:%S')
+            'hora': hora_entrada.strftime('%H:%M:%S')
         }), 201
         
     except Exception as e:
@@ -568,26 +2134,48 @@ def registrar_entrada():
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/asistencia/salida', methods=['POST'])
+@requiere_token()
+@idempotente
 def registrar_salida():
     """Registrar salida de empleado"""
     try:
         data = request.json
-        usuario_id = data['usuario_id']
+        usuario_id = data.get('usuario_id', g.usuario['id'])
+        if not puede_acceder_a(usuario_id):
+            return jsonify({'error': 'No puedes registrar asistencia de otro empleado'}), 403
         
-        # Buscar asistencia de hoy
-        hoy = datetime.utcnow().date()
-        asistencia_hoy = Asistencia.query.filter_by(
-            usuario_id=usuario_id,
-            fecha=hoy
+        # UPDATE condicional: solo cierra el turno si hay entrada y aún no hay salida
+        ahora = datetime.utcnow()
+        asistencia_hoy = db.session.execute(
+            update(Asistencia)
+            .where(
+                Asistencia.usuario_id == usuario_id,
+                Asistencia.fecha == ahora.date(),
+                Asistencia.hora_entrada.isnot(None),
+                Asistencia.hora_salida.is_(None)
+            )
+            .values(hora_salida=ahora)
+            .returning(Asistencia.id, Asistencia.fecha, Asistencia.hora_entrada, Asistencia.hora_salida)
+            .execution_options(synchronize_session=False)
         ).first()
         
-        if not asistencia_hoy or not asistencia_hoy.hora_entrada:
-            return jsonify({'error': 'Debes registrar tu entrada primero'}), 400
-        
-        if asistencia_hoy.hora_salida:
+        if asistencia_hoy is None:
+            # Solo en el caso de error se consulta el motivo
+            db.session.rollback()
+            existente = db.session.execute(
+                db.select(Asistencia.hora_entrada).where(
+                    Asistencia.usuario_id == usuario_id, Asistencia.fecha == ahora.date()
+                )
+            ).first()
+            if existente is None or existente.hora_entrada is None:
+                return jsonify({'error': 'Debes registrar tu entrada primero'}), 400
             return jsonify({'error': 'Ya registraste tu salida hoy'}), 400
         
-        asistencia_hoy.hora_salida = datetime.utcnow()
+        sumar_a_resumen(
+            usuario_id, asistencia_hoy.fecha,
+            minutos_trabajados(asistencia_hoy.hora_entrada, asistencia_hoy.hora_salida)
+        )
+        publicar_cambio('asistencia', 'actualizada', [asistencia_hoy.id])
         db.session.commit()
         
         return jsonify({
@@ -599,49 +2187,133 @@ def registrar_salida():
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+def consulta_mis_registros(usuario_id, serializador=ASISTENCIA_JSON):
+    """Asistencias del empleado en los últimos 7 días"""
+    desde = datetime.utcnow().date() - timedelta(days=7)
+    return (
+        db.select(*serializador.columnas)
+        .where(Asistencia.usuario_id == usuario_id, Asistencia.fecha >= desde)
+        .order_by(Asistencia.fecha.desc())
+    )
+
 @app.route('/api/asistencia/mis-registros/<int:usuario_id>', methods=['GET'])
+@requiere_token()
 def obtener_mis_registros(usuario_id):
     """Obtener registros de asistencia del empleado"""
     try:
-        # Obtener últimos 7 días
-        desde = datetime.utcnow().date() - timedelta(days=7)
-        
-        asistencias = Asistencia.query.filter(
-            Asistencia.usuario_id == usuario_id,
-            Asistencia.fecha >= desde
-        ).order_by(Asistencia.fecha.desc()).all()
+        if not puede_acceder_a(usuario_id):
+            return jsonify({'error': 'No tienes permisos para esta acción'}), 403
         
-        return jsonify([{
-            'id': a.id,
-            'fecha': a.fecha.isoformat(),
-            'hora_entrada': a.hora_entrada.strftime('%H:%M:%S') if a.hora_entrada else None,
-            'hora_salida': a.hora_salida.strftime('%H:%M:%S') if a.hora_salida else None,
-            'notas': a.notas
-        } for a in asistencias]), 200
+        serializador = serializador_pedido(ASISTENCIA_JSON)
+        asistencias = db.session.execute(consulta_mis_registros(usuario_id, serializador))
+        return jsonify(serializador.lista(asistencias)), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def filtrar_asistencias(consulta, desde_por_defecto=None):
+    """Aplica los filtros desde, hasta y usuario_id de la query string"""
+    desde = leer_fecha_hora('desde')
+    hasta = leer_fecha_hora('hasta')
+    desde = desde.date() if desde else desde_por_defecto
+    if desde:
+        consulta = consulta.where(Asistencia.fecha >= desde)
+    if hasta:
+        consulta = consulta.where(Asistencia.fecha < hasta.date())
+    if request.args.get('usuario_id'):
+        consulta = consulta.where(Asistencia.usuario_id == request.args.get('usuario_id', type=int))
+    return consulta
+
 @app.route('/api/asistencia/todas', methods=['GET'])
+@requiere_token('admin')
 def obtener_todas_asistencias():
-    """Obtener todas las asistencias (solo admin)"""
+    """Obtener todas las asistencias (solo admin), paginadas por cursor (fecha, id).
+    Filtros: desde, hasta (por defecto últimos 30 días), usuario_id, limit, cursor, fields"""
     try:
-        # Obtener últimos 30 días
-        desde = datetime.utcnow().date() - timedelta(days=30)
+        limite = leer_limite()
+        serializador = serializador_pedido(ASISTENCIA_EMPLEADO_JSON)
+        consulta = db.select(
+            *serializador.columnas_con(fecha=Asistencia.fecha, id=Asistencia.id)
+        ).select_from(Asistencia)
+        if Usuario in serializador.modelos:
+            consulta = consulta.join(Usuario, Asistencia.usuario_id == Usuario.id)
+        # Sin rango explícito: últimos 30 días
+        consulta = filtrar_asistencias(
+            consulta, desde_por_defecto=datetime.utcnow().date() - timedelta(days=30)
+        )
+        if request.args.get('cursor'):
+            fecha_cursor, id_cursor = decodificar_cursor(request.args['cursor'], date.fromisoformat, int)
+            consulta = consulta.where(tuple_(Asistencia.fecha, Asistencia.id) < (fecha_cursor, id_cursor))
         
-        asistencias = Asistencia.query.filter(
-            Asistencia.fecha >= desde
-        ).order_by(Asistencia.fecha.desc()).all()
+        filas = db.session.execute(
+            consulta.order_by(Asistencia.fecha.desc(), Asistencia.id.desc()).limit(limite + 1)
+        ).all()
         
-        return jsonify([{
-            'id': a.id,
-            'empleado': {'id': a.usuario.id, 'nombre': a.usuario.nombre},
-            'fecha': a.fecha.isoformat(),
-            'hora_entrada': a.hora_entrada.strftime('%H:%M:%S') if a.hora_entrada else None,
-            'hora_salida': a.hora_salida.strftime('%H:%M:%S') if a.hora_salida else None,
-            'notas': a.notas
-        } for a in asistencias]), 200
+        return respuesta_paginada(filas, limite, serializador.serializar,
+                                  lambda f: (f.fecha, f.id)), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/asistencia/resumen', methods=['GET'])
+@requiere_token()
+def obtener_resumen_asistencia():
+    """Horas trabajadas por empleado agrupadas por ?periodo=dia|semana|mes.
+    Filtros: desde, hasta, usuario_id (un empleado solo ve su propio resumen).
+    Lee solo la tabla de resúmenes, así que no depende del volumen de asistencias"""
+    try:
+        periodo = request.args.get('periodo', 'semana')
+        if periodo not in PERIODOS_RESUMEN:
+            return jsonify({'error': 'periodo debe ser dia, semana o mes'}), 400
+        
+        consulta = (
+            db.select(*RESUMEN_JSON.columnas)
+            .join(Usuario, ResumenAsistencia.usuario_id == Usuario.id)
+            .where(ResumenAsistencia.periodo == periodo)
+        )
+        desde = leer_fecha_hora('desde')
+        hasta = leer_fecha_hora('hasta')
+        if desde:
+            consulta = consulta.where(ResumenAsistencia.inicio >= inicio_periodo(desde.date(), periodo))
+        if hasta:
+            consulta = consulta.where(ResumenAsistencia.inicio < hasta.date())
+        
+        usuario_id = request.args.get('usuario_id', type=int)
+        if g.usuario['rol'] != 'admin':
+            usuario_id = g.usuario['id']
+        if usuario_id is not None:
+            consulta = consulta.where(ResumenAsistencia.usuario_id == usuario_id)
+        
+        filas = db.session.execute(
+            consulta.order_by(ResumenAsistencia.inicio.desc(), Usuario.nombre)
+        ).all()
+        return jsonify(RESUMEN_JSON.lista(filas)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/asistencia/export', methods=['GET'])
+@requiere_token('admin')
+def exportar_asistencias():
+    """Exporta asistencias en streaming (?formato=ndjson|csv&desde&hasta&usuario_id)"""
+    try:
+        consulta = filtrar_asistencias(
+            db.select(
+                Asistencia.id, Usuario.id, Usuario.nombre, Usuario.cargo, Asistencia.fecha,
+                Asistencia.hora_entrada, Asistencia.hora_salida, Asistencia.notas
+            ).join(Usuario, Asistencia.usuario_id == Usuario.id)
+        ).order_by(Asistencia.fecha, Asistencia.id)
+        return respuesta_exportacion(consulta, [
+            'id', 'usuario_id', 'empleado_nombre', 'empleado_cargo', 'fecha',
+            'hora_entrada', 'hora_salida', 'notas'
+        ], 'asistencias')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -649,7 +2321,7 @@ def obtener_todas_asistencias():
 def init_db():
     """Inicializa la base de datos"""
     db.create_all()
-    print("Base de datos inicializada")
+    logger.info("Base de datos inicializada")
 
 @app.cli.command()
 def seed_db():
@@ -685,30 +2357,148 @@ def seed_db():
     ]
     db.session.add_all(mesas)
     db.session.commit()
-    print("Datos de ejemplo cargados")
+    logger.info("Datos de ejemplo cargados")
+
+@app.cli.command('generate-data')
+@click.option('--semilla', type=int, default=42, show_default=True, help='Misma semilla, mismos datos')
+@click.option('--clientes', type=int, default=100_000, show_default=True)
+@click.option('--reservas', type=int, default=1_000_000, show_default=True)
+@click.option('--empleados', type=int, default=30, show_default=True)
+@click.option('--dias-asistencia', type=int, default=365, show_default=True, help='Días de asistencia por empleado')
+@click.option('--platos', type=int, default=120, show_default=True)
+@click.option('--mesas', type=int, default=40, show_default=True, help='Mesas del restaurante')
+@click.option('--dias-historia', type=int, default=365, show_default=True,
+              help='Días pasados con reservas; se amplían si las reservas no caben en las mesas')
+@click.option('--dias-futuro', type=int, default=60, show_default=True, help='Días futuros con reservas')
+@click.option('--lote', type=int, default=10_000, show_default=True, help='Filas por COPY/insert')
+@click.option('--fecha-base', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Fecha tomada como hoy (YYYY-MM-DD); fíjala para resultados idénticos entre días')
+def generate_data(fecha_base, **opciones):
+    """Genera datos sintéticos masivos (deterministas a partir de --semilla)"""
+    from generador_datos import generar_datos
+    inicio = time.perf_counter()
+    totales = generar_datos(fecha_base=fecha_base.date() if fecha_base else None, informar=click.echo, **opciones)
+    logger.info("Datos sintéticos generados", extra={'datos': {
+        **totales, 'segundos': round(time.perf_counter() - inicio, 1)
+    }})
 
-# Inicialización automática para Render
 # ============================================
-# INICIALIZACIÓN AUTOMÁTICA DE LA BASE DE DATOS
+# INICIALIZACIÓN DE LA BASE DE DATOS (una vez por despliegue)
 # ============================================
 
+# Clave arbitraria pero fija para pg_advisory_lock
+CLAVE_BLOQUEO_INICIALIZACION = 7_203_114
+
+@contextlib.contextmanager
+def bloqueo_inicializacion():
+    """Serializa la inicialización entre procesos: advisory lock en Postgres,
+    archivo bloqueado con fcntl en local (SQLite)"""
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect() as conexion:
+            conexion.execute(text('SELECT pg_advisory_lock(:clave)'), {'clave': CLAVE_BLOQUEO_INICIALIZACION})
+            try:
+                yield
+            finally:
+                conexion.execute(text('SELECT pg_advisory_unlock(:clave)'), {'clave': CLAVE_BLOQUEO_INICIALIZACION})
+        return
+    
+    try:
+        import fcntl
+    except ImportError:  # Windows: sin bloqueo entre procesos
+        yield
+        return
+    with open(os.path.join(tempfile.gettempdir(), 'restaurante_inicializacion.lock'), 'w') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+def fusionar_asistencias_duplicadas():
+    """Deja una sola asistencia por (usuario_id, fecha): conserva la de menor id con
+    la primera entrada y la última salida del grupo, y borra las demás"""
+    grupos = db.session.execute(
+        db.select(Asistencia.usuario_id, Asistencia.fecha)
+        .group_by(Asistencia.usuario_id, Asistencia.fecha)
+        .having(func.count() > 1)
+    ).all()
+    for usuario_id, fecha in grupos:
+        filas = Asistencia.query.filter_by(usuario_id=usuario_id, fecha=fecha).order_by(Asistencia.id).all()
+        conservada = filas[0]
+        entradas = [f.hora_entrada for f in filas if f.hora_entrada]
+        salidas = [f.hora_salida for f in filas if f.hora_salida]
+        conservada.hora_entrada = min(entradas) if entradas else None
+        conservada.hora_salida = max(salidas) if salidas else None
+        for duplicada in filas[1:]:
+            db.session.delete(duplicada)
+    db.session.commit()
+    return len(grupos)
+
+def agregar_columnas_nuevas():
+    """ALTER TABLE ... ADD COLUMN para las columnas de los modelos que faltan en
+    tablas existentes. Solo columnas que aceptan NULL (las que se agregan después)"""
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateColumn
+    inspector = inspect(db.engine)
+    agregadas = []
+    with db.engine.begin() as conexion:
+        for tabla in db.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            existentes = {c['name'] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name not in existentes and columna.nullable:
+                    definicion = CreateColumn(columna).compile(dialect=db.engine.dialect)
+                    conexion.exec_driver_sql(f'ALTER TABLE {tabla.name} ADD COLUMN {definicion}')
+                    agregadas.append(f'{tabla.name}.{columna.name}')
+    return agregadas
+
 def inicializar_base_datos():
     """Inicializa las tablas y datos de prueba"""
-    with app.app_context():
+    with app.app_context(), bloqueo_inicializacion():
         try:
-            print("=" * 50)
-            print("🔄 INICIANDO CONFIGURACIÓN DE BASE DE DATOS")
-            print("=" * 50)
+            logger.info("Iniciando configuración de base de datos")
             
             # PASO 1: Crear todas las tablas
             db.create_all()
-            print("✅ Tablas creadas/verificadas")
-            
+            logger.info("Tablas creadas/verificadas")
+
+            # Antes de crear el índice único (usuario_id, fecha) fusionar duplicados viejos
+            fusionadas = fusionar_asistencias_duplicadas()
+            if fusionadas:
+                logger.warning("Asistencias duplicadas fusionadas", extra={'datos': {'grupos': fusionadas}})
+
+            # create_all tampoco agrega columnas nuevas a tablas que ya existían
+            agregadas = agregar_columnas_nuevas()
+            if agregadas:
+                logger.info("Columnas agregadas", extra={'datos': {'columnas': agregadas}})
+
+            # Particiones de los próximos meses (solo Postgres y en las tablas ya
+            # convertidas: la conversión bloquea la tabla y va aparte, con
+            # flask particionar-tablas en una ventana de mantenimiento)
+            if db.engine.dialect.name == 'postgresql':
+                with db.engine.connect() as conexion:
+                    pendientes = [tabla.name for tabla, _ in TABLAS_PARTICIONADAS
+                                  if not particionada(conexion, tabla.name)]
+                if pendientes:
+                    logger.info("Tablas sin particionar", extra={'datos': {'tablas': pendientes}})
+                asegurar_particiones()
+
+            # create_all no agrega índices nuevos a tablas que ya existían
+            for tabla in db.metadata.sorted_tables:
+                for indice in tabla.indexes:
+                    indice.create(bind=db.engine, checkfirst=True)
+            logger.info("Índices creados/verificados")
+
+            with db.engine.begin() as conexion:
+                trigramas = preparar_busqueda(conexion)
+            logger.info("Índices de búsqueda creados/verificados", extra={'datos': {'pg_trgm': trigramas}})
+
             # PASO 2: Verificar qué tablas existen
             from sqlalchemy import inspect
             inspector = inspect(db.engine)
             tablas = inspector.get_table_names()
-            print(f"📋 Tablas en la base de datos: {tablas}")
+            logger.info("Tablas en la base de datos", extra={'datos': {'tablas': tablas}})
             
             # PASO 3: Verificar si hay datos
             try:
@@ -716,13 +2506,13 @@ def inicializar_base_datos():
                 empleados_count = Usuario.query.count()
                 categorias_count = Categoria.query.count()
                 
-                print(f"📊 Mesas: {mesas_count}")
-                print(f"📊 Empleados: {empleados_count}")
-                print(f"📊 Categorías: {categorias_count}")
+                logger.info("Datos existentes", extra={'datos': {
+                    'mesas': mesas_count, 'empleados': empleados_count, 'categorias': categorias_count
+                }})
                 
                 # PASO 4: Crear datos de ejemplo si no existen
                 if mesas_count == 0:
-                    print("⚠️ No hay mesas. Creando mesas de ejemplo...")
+                    logger.info("No hay mesas. Creando mesas de ejemplo")
                     mesas = [
                         Mesa(numero=1, capacidad=2),
                         Mesa(numero=2, capacidad=4),
@@ -732,10 +2522,10 @@ def inicializar_base_datos():
                     ]
                     db.session.add_all(mesas)
                     db.session.commit()
-                    print("✅ Mesas creadas")
+                    logger.info("Mesas creadas")
                 
                 if categorias_count == 0:
-                    print("⚠️ No hay categorías. Creando categorías...")
+                    logger.info("No hay categorías. Creando categorías")
                     categorias = [
                         Categoria(nombre='Entradas'),
                         Categoria(nombre='Platos Principales'),
@@ -744,7 +2534,7 @@ def inicializar_base_datos():
                     ]
                     db.session.add_all(categorias)
                     db.session.commit()
-                    print("✅ Categorías creadas")
+                    logger.info("Categorías creadas")
                     
                     # Crear platos después de categorías
                     platos = [
@@ -757,10 +2547,11 @@ def inicializar_base_datos():
                     ]
                     db.session.add_all(platos)
                     db.session.commit()
-                    print("✅ Platos creados")
+                    menu_cache.invalidar()
+                    logger.info("Platos creados")
                 
                 if empleados_count == 0:
-                    print("⚠️ No hay empleados. Creando empleados de prueba...")
+                    logger.info("No hay empleados. Creando empleados de prueba")
                     empleados = [
                         {
                             'nombre': 'Carlos Pérez',
@@ -793,32 +2584,166 @@ def inicializar_base_datos():
                         db.session.add(empleado)
                     
                     db.session.commit()
-                    print("✅ Empleados de prueba creados")
+                    logger.info("Empleados de prueba creados")
                     
                     # Mostrar empleados creados
                     empleados_db = Usuario.query.all()
                     for emp in empleados_db:
-                        print(f"   👤 {emp.nombre} - {emp.email} - {emp.cargo}")
+                        logger.info("Empleado de prueba", extra={'datos': {
+                            'nombre': emp.nombre, 'email': emp.email, 'cargo': emp.cargo
+                        }})
                 
             except Exception as e:
-                print(f"⚠️ Error al verificar/crear datos: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error al verificar/crear datos")
             
-            print("=" * 50)
-            print("✅ CONFIGURACIÓN COMPLETADA")
-            print("=" * 50)
+            logger.info("Configuración de base de datos completada")
+            return True
             
         except Exception as e:
-            print(f"❌ ERROR CRÍTICO en inicialización: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.critical("Error crítico en inicialización", exc_info=True)
+            return False
 
-# ============================================
-# EJECUTAR INICIALIZACIÓN AL IMPORTAR EL MÓDULO
-# ============================================
-# Esto se ejecuta SIEMPRE, incluso cuando Gunicorn importa app.py
-inicializar_base_datos()
+@app.cli.command('inicializar-db')
+def inicializar_db_comando():
+    """Crea tablas, índices y datos iniciales (ejecutar una vez por despliegue)"""
+    if not inicializar_base_datos():
+        raise SystemExit(1)  # que falle el despliegue
+
+@app.cli.command('reconstruir-resumen')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Recalcular solo los periodos que empiezan a partir de esta fecha')
+def reconstruir_resumen_comando(desde):
+    """Recalcula la tabla resumen_asistencias a partir de asistencias (backfill)"""
+    total = reconstruir_resumen(desde.date() if desde else None)
+    logger.info("Resumen de asistencias recalculado", extra={'datos': {'filas': total}})
+
+@app.cli.command('particionar-tablas')
+@click.option('--simular', is_flag=True, help='Listar las tablas y las filas que se copiarían sin tocarlas')
+def particionar_tablas_comando(simular):
+    """Convierte reservas y asistencias en tablas particionadas por mes (solo
+    Postgres, una vez). Cada tabla queda bloqueada para lecturas y escrituras
+    mientras se copian sus filas: ejecutar con la API detenida"""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('El particionado requiere PostgreSQL')
+    for tabla, filas in particionar_tablas(simular):
+        click.echo(f"{tabla}: {filas} filas {'por copiar' if simular else 'copiadas'}")
+
+@app.cli.command('mantener-particiones')
+def mantener_particiones_comando():
+    """Crea las particiones de los próximos PARTICIONES_MESES_ADELANTE meses y
+    saca de la partición por defecto los meses que hayan caído ahí. Para un
+    cron diario; varias ejecuciones a la vez no chocan (bloqueo advisory)"""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('El particionado requiere PostgreSQL')
+    asegurar_particiones()
+
+@app.cli.command('archivar-particiones')
+@click.option('--conservar-meses', type=int, default=12, show_default=True,
+              help='Meses completos que quedan en las tablas, además del actual')
+@click.option('--destino', type=click.Path(file_okay=False), default=None,
+              help='Exportar cada mes a DESTINO/<partición>.csv.gz y borrarlo '
+                   '(sin esta opción la partición pasa al esquema archivo)')
+@click.option('--simular', is_flag=True, help='Listar los meses que se archivarían sin tocarlos')
+def archivar_particiones_comando(conservar_meses, destino, simular):
+    """Saca de reservas y asistencias los meses viejos (solo Postgres).
+    resumen_asistencias no se toca: reconstruir-resumen sin --desde ya no
+    vería los meses archivados"""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('El particionado requiere PostgreSQL')
+    for tabla, mes, ruta in archivar_particiones(conservar_meses, destino, simular):
+        click.echo(f"{tabla} {mes:%Y-%m}: {ruta or 'se archivaría'}")
+
+@app.cli.command('asignar-mesas')
+@click.option('--fecha', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+              help='Día (UTC) cuyas reservas pendientes se reasignan')
+@click.option('--simular', is_flag=True, help='Calcular la asignación sin guardarla')
+def asignar_mesas_comando(fecha, simular):
+    """Reasigna las mesas de las reservas pendientes de un día"""
+    resultado = asignar_mesas(fecha.date(), aplicar=not simular)
+    logger.info("Mesas asignadas", extra={'datos': {
+        clave: (len(valor) if isinstance(valor, list) else valor) for clave, valor in resultado.items()
+    }})
+    for cambio in resultado['cambios']:
+        click.echo(f"reserva {cambio['reserva_id']}: mesa {cambio['mesa_anterior']} -> {cambio['mesa_id']}")
+    if resultado['sin_mesa']:
+        click.echo(f"sin mesa: {', '.join(map(str, resultado['sin_mesa']))}")
+
+@app.cli.command('procesar-imagenes')
+@click.argument('directorio', type=click.Path(exists=True, file_okay=False))
+@click.option('--salida', type=click.Path(file_okay=False), default=None,
+              help='Carpeta de los derivados (por defecto DIRECTORIO/derivados)')
+@click.option('--url-base', default='images/derivados', show_default=True,
+              help='Prefijo de las URLs del manifiesto')
+@click.option('--html', 'paginas', type=click.Path(exists=True, dir_okay=False), multiple=True,
+              help='Página que cita derivados por nombre; se actualiza con los nombres nuevos (repetible)')
+def procesar_imagenes_comando(directorio, salida, url_base, paginas):
+    """Genera los derivados AVIF/WebP de las imágenes de DIRECTORIO y un
+    manifest.json con el srcset y el src de cada una (para los <picture> del frontend).
+    Los nombres llevan el hash del contenido: al cambiar una imagen (o la
+    versión de Pillow) cambian, y las páginas de --html se reescriben con ellos"""
+    salida = salida or os.path.join(directorio, 'derivados')
+    almacen = AlmacenImagenes(salida, url_base)
+    manifiesto, usados = {}, set()
+    for nombre in sorted(os.listdir(directorio)):
+        ruta = os.path.join(directorio, nombre)
+        if not os.path.isfile(ruta) or not nombre.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+            continue
+        with open(ruta, 'rb') as f:
+            archivos, info = procesar_imagen(f.read(), nombre)
+        almacen.guardar(archivos)
+        usados.update(archivo for archivo, _ in archivos)
+        manifiesto[nombre] = {**descriptor_imagen(info, almacen.url), 'src': predeterminada(info, almacen.url)}
+        logger.info("Imagen procesada", extra={'datos': {'imagen': nombre, 'derivados': len(archivos)}})
+    for archivo in os.listdir(salida):  # derivados de versiones anteriores
+        if archivo not in usados and archivo != 'manifest.json':
+            os.remove(os.path.join(salida, archivo))
+    with open(os.path.join(salida, 'manifest.json'), 'w') as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False, sort_keys=True)
+    for pagina in paginas:
+        with open(pagina, encoding='utf-8') as f:
+            original = f.read()
+        html, huerfanas = actualizar_referencias(original, almacen.url_base, usados)
+        if html != original:
+            with open(pagina, 'w', encoding='utf-8') as f:
+                f.write(html)
+            click.echo(f'{pagina}: referencias actualizadas')
+        for url in huerfanas:
+            click.echo(f'{pagina}: {url} no tiene derivado actual (ancho o imagen que ya no existe)', err=True)
+
+@app.cli.command('procesar-imagenes-platos')
+@click.option('--todos', is_flag=True, help='Reprocesar también los platos que ya tienen derivados')
+def procesar_imagenes_platos_comando(todos):
+    """Genera los derivados de las imagen_url existentes (URL o archivo local).
+    Requiere IMAGENES_URL: fuera de una petición no hay origen del que armar las URLs"""
+    import urllib.request
+    if not IMAGENES_URL:
+        raise click.ClickException('Configura IMAGENES_URL (p. ej. https://api.ejemplo.com/imagenes)')
+    almacen = AlmacenImagenes(IMAGENES_DIR, IMAGENES_URL)
+    consulta = Plato.query.filter(Plato.imagen_url.isnot(None), Plato.imagen_url != '')
+    if not todos:
+        consulta = consulta.filter(Plato.imagen_variantes.is_(None))
+    for plato in consulta.all():
+        try:
+            if plato.imagen_url.startswith(('http://', 'https://')):
+                with urllib.request.urlopen(plato.imagen_url, timeout=15) as r:
+                    datos = r.read(IMAGENES_MAXIMO_BYTES + 1)
+            else:
+                with open(plato.imagen_url, 'rb') as f:
+                    datos = f.read(IMAGENES_MAXIMO_BYTES + 1)
+            if len(datos) > IMAGENES_MAXIMO_BYTES:
+                raise ValueError('imagen demasiado grande')
+            plato.imagen_url, plato.imagen_variantes = almacen.procesar(datos, plato.nombre)
+            db.session.commit()
+            logger.info("Imagen de plato procesada", extra={'datos': {'plato': plato.id}})
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("No se pudo procesar la imagen del plato",
+                           extra={'datos': {'plato': plato.id, 'error': str(e)}})
+    menu_cache.invalidar()
+
+# Importar este módulo NO toca la base de datos: cada worker de gunicorn arranca
+# sin consultas. La inicialización corre con `flask --app app inicializar-db`
+# (ver .ebextensions) o al levantar el servidor de desarrollo.
 
 # ============================================
 # ARRANQUE DEL SERVIDOR
@@ -827,8 +2752,9 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.getenv("FLASK_ENV") != "production"
     
-    print(f"🚀 Iniciando servidor en puerto {port}")
-    print(f"🔧 Modo debug: {debug}")
+    inicializar_base_datos()
+    
+    logger.info("Iniciando servidor", extra={'datos': {'puerto': port, 'debug': debug}})
     
     app.run(
         host='0.0.0.0',
@@ -0,0 +1,52 @@
+"""Punto de entrada ASGI de la API.
+
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:aplicacion
+
+Las lecturas más concurridas (lectura_async.rutas) se atienden en el bucle de
+eventos con el motor asíncrono; cualquier otra ruta pasa a la app Flask, que
+corre en un pool de hilos (WSGI_HILOS, por defecto 10) dentro del mismo worker.
+`gunicorn app:app` sigue funcionando igual, solo que sin el camino asíncrono.
+
+ProxyConfiable hace aquí lo que ProxyFix en app.py: request.client es la IP
+que puso en X-Forwarded-For el último de los PROXIES_CONFIABLES proxies propios.
+"""
+import contextlib
+import os
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.middleware import Middleware
+from starlette.routing import Mount
+
+from app import PROXIES_CONFIABLES, app
+from lectura_async import motores, rutas
+
+
+class ProxyConfiable:
+    """scope['client'] con la N-ésima IP desde la derecha de X-Forwarded-For
+    (las anteriores las controla el cliente); con menos entradas, la del socket"""
+
+    def __init__(self, aplicacion, proxies):
+        self.aplicacion = aplicacion
+        self.proxies = proxies
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] in ('http', 'websocket') and self.proxies:
+            reenviado = ','.join(Headers(scope=scope).getlist('x-forwarded-for')).split(',')
+            if len(reenviado) >= self.proxies and reenviado[-self.proxies].strip():
+                scope = dict(scope, client=(reenviado[-self.proxies].strip(), 0))
+        await self.aplicacion(scope, receive, send)
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(aplicacion):
+    async with motores() as estado:
+        yield estado  # las vistas lo leen en request.state
+
+
+aplicacion = Starlette(
+    routes=[*rutas, Mount('/', WSGIMiddleware(app, workers=int(os.getenv('WSGI_HILOS', 10))))],
+    middleware=[Middleware(ProxyConfiable, proxies=PROXIES_CONFIABLES)],
+    lifespan=ciclo_de_vida,
+)
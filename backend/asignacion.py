@@ -0,0 +1,199 @@
+"""Asignación de mesas a las reservas de un servicio (maximiza comensales sentados).
+
+Cada reserva ocupa su mesa durante [inicio, inicio + duracion). Los extremos de
+todos los intervalos parten el día en segmentos; una reserva es una máscara de
+bits con los segmentos que cubre y cada mesa la unión (OR) de las suyas, así
+que "¿cabe esta reserva en esta mesa?" es un solo AND entre enteros sin
+recorrer las reservas de la mesa.
+
+Se prueban dos puntos de partida:
+
+- voraz: las reservas de más personas primero, cada una en la mesa libre más
+  chica que la admite (mejor ajuste: no gasta mesas grandes en parejas);
+- la asignación actual, quitando lo que se cruza o ya no cabe.
+
+Luego se intenta sentar a las que quedaron fuera liberando una mesa: las
+reservas que se cruzan se mueven a otra mesa libre o, si no hay, se desplazan
+si suman menos comensales que la que entra. Gana la solución con más
+comensales sentados, luego la que menos asientos desperdicia y luego la que
+menos reservas cambia de mesa.
+
+Una reserva que ya tiene una mesa válida (cabe y no se cruza con nada) puede
+cambiar de mesa pero nunca quedarse sin ella. Las que quedan sin mesa
+conservan la que tenían (mesa_id no admite NULL), así que esa mesa sigue
+ocupada: se vuelve a resolver con ellas fijas hasta que ninguna quede sin
+mesa en una mesa del problema. Así la asignación nunca pone dos reservas en
+la misma mesa a la vez.
+"""
+from collections import namedtuple
+
+Reserva = namedtuple('Reserva', 'id inicio personas mesa_id')
+Mesa = namedtuple('Mesa', 'id capacidad')
+
+MAXIMO_PASADAS = 3  # pasadas de mejora sobre las reservas sin mesa
+
+
+def mascaras(inicios, duracion):
+    """Máscara de bits de cada intervalo [inicio, inicio + duracion) sobre los
+    segmentos elementales que forman todos los extremos"""
+    puntos = sorted({t for inicio in inicios for t in (inicio, inicio + duracion)})
+    indice = {t: n for n, t in enumerate(puntos)}
+    return [((1 << (indice[i + duracion] - indice[i])) - 1) << indice[i] for i in inicios]
+
+
+class _Solucion:
+    def __init__(self, problema):
+        self.p = problema
+        self.ocupado = list(problema.fijas)  # por mesa
+        self.mesa_de = {}                    # reserva -> mesa
+        self.en_mesa = [set() for _ in problema.mesas]
+
+    def libre(self, r, m):
+        return not self.ocupado[m] & self.p.mascara[r]
+
+    def sentar(self, r, m):
+        self.ocupado[m] |= self.p.mascara[r]
+        self.mesa_de[r] = m
+        self.en_mesa[m].add(r)
+
+    def levantar(self, r):
+        m = self.mesa_de.pop(r)
+        self.ocupado[m] &= ~self.p.mascara[r]
+        self.en_mesa[m].discard(r)
+        return m
+
+    def sin_mesa(self):
+        return [r for r in self.p.orden if r not in self.mesa_de]
+
+    def mover_otra_mesa(self, r, excluida):
+        ocupado, mascara = self.ocupado, self.p.mascara[r]
+        for m in self.p.candidatas[r]:
+            if m != excluida and not ocupado[m] & mascara:
+                self.sentar(r, m)
+                return True
+        return False
+
+    def intentar_sentar(self, r):
+        """Libera una mesa para r moviendo o desplazando las reservas que se cruzan"""
+        mascara = self.p.mascara[r]
+        personas = self.p.reservas[r].personas
+        for m in self.p.candidatas[r]:
+            if self.p.fijas[m] & mascara:
+                continue  # se cruza con una reserva que no se mueve
+            cruzadas = [s for s in self.en_mesa[m] if self.p.mascara[s] & mascara]
+            for s in cruzadas:
+                self.levantar(s)
+            self.sentar(r, m)
+            movidas, desplazados, posible = [], 0, True
+            for s in sorted(cruzadas, key=lambda s: -self.p.reservas[s].personas):
+                if self.mover_otra_mesa(s, m):
+                    movidas.append(s)
+                    continue
+                desplazados += self.p.reservas[s].personas
+                if s in self.p.protegidas or desplazados >= personas:
+                    posible = False  # no se deja sin mesa a quien ya la tenía, o ya no mejora
+                    break
+            if posible:
+                return True
+            # Deshacer: vuelve todo a como estaba
+            for s in movidas:
+                self.levantar(s)
+            self.levantar(r)
+            for s in cruzadas:
+                self.sentar(s, m)
+        return False
+
+    def mejorar(self):
+        for _ in range(MAXIMO_PASADAS):
+            if not any([self.intentar_sentar(r) for r in self.sin_mesa()]):
+                break
+        return self
+
+    def puntaje(self):
+        reservas, mesas = self.p.reservas, self.p.mesas
+        sentados = sum(reservas[r].personas for r in self.mesa_de)
+        desperdicio = sum(mesas[m].capacidad - reservas[r].personas for r, m in self.mesa_de.items())
+        cambios = sum(mesas[m].id != reservas[r].mesa_id for r, m in self.mesa_de.items())
+        return sentados, -desperdicio, -cambios
+
+
+class _Problema:
+    def __init__(self, reservas, mesas, ocupadas, duracion):
+        self.reservas = list(reservas)
+        self.mesas = list(mesas)
+        posicion = {mesa.id: m for m, mesa in enumerate(self.mesas)}
+        ocupadas = [(posicion[mesa_id], inicio) for mesa_id, inicio in ocupadas if mesa_id in posicion]
+
+        todas = mascaras([r.inicio for r in self.reservas] + [inicio for _, inicio in ocupadas], duracion)
+        self.mascara = todas[:len(self.reservas)]
+        self.fijas = [0] * len(self.mesas)
+        for (m, _), mascara in zip(ocupadas, todas[len(self.reservas):]):
+            self.fijas[m] |= mascara
+
+        self.posicion = posicion
+        # Más personas primero; a igual tamaño, por hora
+        self.orden = sorted(range(len(self.reservas)),
+                            key=lambda r: (-self.reservas[r].personas, self.reservas[r].inicio))
+        # Mesas que admiten a cada reserva, de la más chica a la más grande
+        # (a igual capacidad, primero la que ya tiene)
+        por_capacidad = sorted(range(len(self.mesas)), key=lambda m: self.mesas[m].capacidad)
+        self.candidatas = [
+            sorted((m for m in por_capacidad if self.mesas[m].capacidad >= r.personas),
+                   key=lambda m: (self.mesas[m].capacidad, self.mesas[m].id != r.mesa_id))
+            for r in self.reservas
+        ]
+        # Las que ya están bien sentadas en su mesa: no pueden quedarse sin mesa
+        self.protegidas = frozenset(self.actual().mesa_de)
+
+    def voraz(self):
+        solucion = _Solucion(self)
+        for r in self.orden:
+            for m in self.candidatas[r]:
+                if solucion.libre(r, m):
+                    solucion.sentar(r, m)
+                    break
+        return solucion
+
+    def actual(self):
+        solucion = _Solucion(self)
+        for r in sorted(range(len(self.reservas)), key=lambda r: self.reservas[r].inicio):
+            m = self.posicion.get(self.reservas[r].mesa_id)
+            if m is not None and m in self.candidatas[r] and solucion.libre(r, m):
+                solucion.sentar(r, m)
+        return solucion
+
+
+def asignar(reservas, mesas, ocupadas, duracion):
+    """Mesa para cada reserva.
+
+    reservas: Reserva(id, inicio, personas, mesa_id actual) a asignar
+    mesas:    Mesa(id, capacidad) utilizables
+    ocupadas: pares (mesa_id, inicio) de reservas que no se mueven
+    duracion: lo que ocupa cada reserva (mismo tipo que la diferencia de inicios)
+
+    Devuelve ({reserva_id: mesa_id}, [reserva_id sin mesa]), las sin mesa de
+    mayor a menor número de personas
+    """
+    reservas, ocupadas, fuera = list(reservas), list(ocupadas), []
+    while reservas:
+        problema = _Problema(reservas, mesas, ocupadas, duracion)
+        soluciones = [s for s in (problema.voraz().mejorar(), problema.actual().mejorar())
+                      if problema.protegidas <= s.mesa_de.keys()]  # la actual siempre cumple
+        mejor = max(soluciones, key=_Solucion.puntaje)
+        # Sin mesa pero con una mesa del problema: la siguen ocupando
+        conservan = [problema.reservas[r] for r in mejor.sin_mesa()
+                     if problema.reservas[r].mesa_id in problema.posicion]
+        if not conservan:
+            break
+        fuera.extend(conservan)
+        ocupadas.extend((r.mesa_id, r.inicio) for r in conservan)
+        reservas = [r for r in reservas if r not in conservan]
+    else:
+        mejor = None
+
+    asignadas, sin_mesa = {}, list(fuera)
+    if mejor is not None:
+        asignadas = {problema.reservas[r].id: problema.mesas[m].id for r, m in mejor.mesa_de.items()}
+        sin_mesa.extend(problema.reservas[r] for r in mejor.sin_mesa())
+    sin_mesa.sort(key=lambda r: -r.personas)
+    return asignadas, [r.id for r in sin_mesa]
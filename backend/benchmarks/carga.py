@@ -0,0 +1,303 @@
+"""Prueba de carga reproducible de la API contra una base de datos local.
+
+Levanta la app con gunicorn sobre SQLite temporal (o el Postgres desechable que
+se pase en --database-url), siembra volúmenes realistas con `flask generate-data`
+y ejecuta escenarios que imitan el tráfico del frontend:
+
+    menu        index.html: platos, categorías y mesas
+    reserva     reservas.js: reservas del mes, disponibilidad y crear reserva
+    asistencia  asistencia.js: login, entrada, mis registros y salida
+    admin       admin.js: empleados, asistencias, resumen y reservas
+
+Informa throughput y p50/p95/p99 por endpoint y guarda un JSON en
+benchmarks/resultados/ para comparar entre commits (--comparar).
+
+Uso (desde backend/):
+    python benchmarks/carga.py --duracion 30 --usuarios 20
+    python benchmarks/carga.py --comparar benchmarks/resultados/<anterior>.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+from generador_datos import CLAVE_EMPLEADOS  # noqa: E402
+RESULTADOS = os.path.join(BACKEND, 'benchmarks', 'resultados')
+HORARIOS = [12, 13, 14, 18, 19, 20, 21]
+PESOS_ESCENARIOS = {'menu': 50, 'reserva': 20, 'asistencia': 15, 'admin': 15}
+
+
+# ===== PREPARACIÓN =====
+
+def sembrar(args, entorno):
+    """Inicializa la BD, genera el volumen con `flask generate-data` y devuelve
+    los correos de empleados activos para los usuarios virtuales"""
+    flask = [sys.executable, '-m', 'flask', '--app', 'app']
+    subprocess.run(flask + ['inicializar-db'], cwd=BACKEND, env=entorno, check=True, capture_output=True)
+
+    os.environ.update(entorno)
+    import app as api
+
+    with api.app.app_context():
+        db = api.db
+        if not db.session.execute(db.select(db.func.count(api.Cliente.id))).scalar() >= args.clientes:
+            subprocess.run(flask + [
+                'generate-data', '--semilla', str(args.semilla), '--mesas', str(args.mesas),
+                '--clientes', str(args.clientes), '--reservas', str(args.reservas),
+                '--empleados', str(args.empleados), '--dias-asistencia', str(args.dias_asistencia),
+            ], cwd=BACKEND, env=entorno, check=True, capture_output=True)
+        return db.session.execute(
+            db.select(api.Usuario.email)
+            .where(api.Usuario.email.like('empleado%@generado.test'), api.Usuario.activo.is_(True))
+            .order_by(api.Usuario.id)
+        ).scalars().all()
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def levantar_servidor(args, entorno, puerto):
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{puerto}']
+        + (['-k', 'uvicorn.workers.UvicornWorker', 'asgi:aplicacion'] if args.asgi else ['app:app']),
+        cwd=BACKEND, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=2)
+            conexion.request('GET', '/health')
+            conexion.getresponse().read()
+            return proceso
+        except OSError:
+            time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError('El servidor no arrancó')
+
+
+# ===== CLIENTE =====
+
+class UsuarioVirtual:
+    def __init__(self, puerto, registro, aleatorio, email):
+        self.conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+        self.registro = registro
+        self.aleatorio = aleatorio
+        self.email = email
+        self.token = None
+
+    def pedir(self, metodo, ruta, nombre, cuerpo=None):
+        cabeceras = {'Content-Type': 'application/json'}
+        if self.token:
+            cabeceras['Authorization'] = f'Bearer {self.token}'
+        inicio = time.perf_counter()
+        try:
+            self.conexion.request(metodo, ruta, body=json.dumps(cuerpo) if cuerpo is not None else None,
+                                  headers=cabeceras)
+            respuesta = self.conexion.getresponse()
+            datos = respuesta.read()
+            estado = respuesta.status
+        except (OSError, http.client.HTTPException):
+            self.conexion.close()
+            datos, estado = b'', 0
+        self.registro.anotar(f'{metodo} {nombre}', time.perf_counter() - inicio, estado)
+        try:
+            return estado, json.loads(datos) if datos else None
+        except ValueError:
+            return estado, None
+
+    def menu(self):
+        self.pedir('GET', '/api/platos', '/api/platos')
+        self.pedir('GET', '/api/categorias', '/api/categorias')
+        self.pedir('GET', '/api/mesas', '/api/mesas')
+
+    def reserva(self):
+        dia = date.today() + timedelta(days=self.aleatorio.randint(1, 30))
+        inicio_mes = dia.replace(day=1)
+        fin_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+        self.pedir('GET', f'/api/reservas?desde={inicio_mes}&hasta={fin_mes}&limit=500', '/api/reservas')
+        fecha_hora = datetime.combine(dia, datetime.min.time()).replace(hour=self.aleatorio.choice(HORARIOS))
+        personas = self.aleatorio.randint(1, 6)
+        _, mesas = self.pedir('GET', f'/api/mesas/disponibilidad?fecha_hora={fecha_hora.isoformat()}'
+                                     f'&personas={personas}', '/api/mesas/disponibilidad')
+        if mesas:
+            n = self.aleatorio.randint(0, 10**9)
+            self.pedir('POST', '/api/reservas', '/api/reservas', {
+                'nombre': f'Carga {n}', 'email': f'carga{n}@carga.test', 'telefono': '3000000000',
+                'mesa_id': mesas[0]['id'], 'fecha_hora': fecha_hora.isoformat(), 'num_personas': personas
+            })
+
+    def asistencia(self):
+        self.token = None
+        _, datos = self.pedir('POST', '/api/login', '/api/login',
+                              {'email': self.email, 'password': CLAVE_EMPLEADOS})
+        if not datos or 'token' not in datos:
+            return
+        self.token = datos['token']
+        usuario_id = datos['usuario']['id']
+        self.pedir('POST', '/api/asistencia/entrada', '/api/asistencia/entrada', {})
+        self.pedir('GET', f'/api/asistencia/mis-registros/{usuario_id}', '/api/asistencia/mis-registros/<id>')
+        self.pedir('POST', '/api/asistencia/salida', '/api/asistencia/salida', {})
+
+    def admin(self):
+        if not self.token or not getattr(self, 'es_admin', False):
+            _, datos = self.pedir('POST', '/api/login', '/api/login',
+                                  {'email': 'admin@restaurante.com', 'password': 'admin123'})
+            self.token = datos and datos.get('token')
+            self.es_admin = True
+        self.pedir('GET', '/api/empleados', '/api/empleados')
+        self.pedir('GET', '/api/asistencia/todas?limit=500', '/api/asistencia/todas')
+        self.pedir('GET', '/api/asistencia/resumen?periodo=semana', '/api/asistencia/resumen')
+        self.pedir('GET', '/api/reservas?limit=100', '/api/reservas')
+
+    def ejecutar(self, hasta):
+        escenarios = list(PESOS_ESCENARIOS)
+        pesos = list(PESOS_ESCENARIOS.values())
+        while time.time() < hasta:
+            escenario = self.aleatorio.choices(escenarios, pesos)[0]
+            if escenario != 'admin':
+                self.es_admin = False
+            getattr(self, escenario)()
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.estados = {}
+
+    def anotar(self, nombre, segundos, estado):
+        with self._lock:
+            self.latencias.setdefault(nombre, []).append(segundos * 1000)
+            self.estados.setdefault(nombre, {}).setdefault(estado, 0)
+            self.estados[nombre][estado] += 1
+
+
+# ===== REPORTE =====
+
+def percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def resumir(registro, duracion):
+    endpoints = {}
+    for nombre, latencias in sorted(registro.latencias.items()):
+        estados = registro.estados[nombre]
+        endpoints[nombre] = {
+            'peticiones': len(latencias),
+            'errores': sum(n for estado, n in estados.items() if estado == 0 or estado >= 500),
+            'estados': {str(k): v for k, v in sorted(estados.items())},
+            'rps': round(len(latencias) / duracion, 2),
+            'p50_ms': round(percentil(latencias, 50), 2),
+            'p95_ms': round(percentil(latencias, 95), 2),
+            'p99_ms': round(percentil(latencias, 99), 2),
+            'max_ms': round(max(latencias), 2),
+        }
+    return endpoints
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconocido'
+
+
+def imprimir(resultado, anterior=None):
+    print(f"\nCommit {resultado['commit']}  duración {resultado['config']['duracion']} s  "
+          f"usuarios {resultado['config']['usuarios']}  total {resultado['total_rps']} req/s")
+    print(f"{'endpoint':45s} {'req':>7s} {'err':>5s} {'req/s':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+    for nombre, datos in resultado['endpoints'].items():
+        linea = (f"{nombre:45s} {datos['peticiones']:7d} {datos['errores']:5d} {datos['rps']:8.1f} "
+                 f"{datos['p50_ms']:8.1f} {datos['p95_ms']:8.1f} {datos['p99_ms']:8.1f}")
+        previo = anterior and anterior['endpoints'].get(nombre)
+        if previo and previo['p95_ms']:
+            cambio = (datos['p95_ms'] - previo['p95_ms']) / previo['p95_ms'] * 100
+            linea += f"   p95 {cambio:+.0f}% vs {anterior['commit']}"
+        print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='BD desechable; por defecto SQLite temporal')
+    parser.add_argument('--duracion', type=int, default=20, help='segundos de carga')
+    parser.add_argument('--usuarios', type=int, default=10, help='usuarios virtuales concurrentes')
+    parser.add_argument('--workers', type=int, default=2, help='workers de gunicorn')
+    parser.add_argument('--asgi', action='store_true', help='servir con asgi.py (lecturas asíncronas)')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--mesas', type=int, default=30)
+    parser.add_argument('--clientes', type=int, default=20_000)
+    parser.add_argument('--reservas', type=int, default=50_000)
+    parser.add_argument('--empleados', type=int, default=50)
+    parser.add_argument('--dias-asistencia', type=int, default=90)
+    parser.add_argument('--salida', help='archivo JSON de resultados')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior')
+    args = parser.parse_args()
+
+    entorno = dict(os.environ)
+    entorno['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'carga.db')
+    entorno.setdefault('SECRET_KEY', 'benchmark')
+    entorno.setdefault('LOG_LEVEL', 'WARNING')
+    entorno['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp()
+
+    print('Sembrando datos...')
+    empleados = sembrar(args, entorno)
+    if len(empleados) < args.usuarios:
+        sys.exit(f'Hay {len(empleados)} empleados activos para {args.usuarios} usuarios virtuales; sube --empleados')
+    puerto = puerto_libre()
+    servidor = levantar_servidor(args, entorno, puerto)
+    try:
+        registro = Registro()
+        hasta = time.time() + args.duracion
+        hilos = [threading.Thread(target=UsuarioVirtual(puerto, registro, random.Random(args.semilla + i), empleados[i]).ejecutar,
+                                  args=(hasta,)) for i in range(args.usuarios)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    endpoints = resumir(registro, args.duracion)
+    resultado = {
+        'commit': commit_actual(),
+        'fecha': datetime.utcnow().isoformat(timespec='seconds'),
+        'config': {k: v for k, v in vars(args).items() if k not in ('salida', 'comparar', 'database_url')},
+        'motor': entorno['DATABASE_URL'].split(':', 1)[0],
+        'servidor': 'asgi' if args.asgi else 'wsgi',
+        'total_rps': round(sum(d['peticiones'] for d in endpoints.values()) / args.duracion, 2),
+        'endpoints': endpoints,
+    }
+    anterior = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)
+    imprimir(resultado, anterior)
+
+    salida = args.salida or os.path.join(
+        RESULTADOS, f"{datetime.utcnow():%Y%m%d-%H%M%S}-{resultado['commit']}.json")
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, 'w') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f'\nResultados guardados en {salida}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Microbenchmark de la serialización JSON de los listados.
+
+Compara, sobre filas sintéticas con la forma de /api/reservas y
+/api/asistencia/todas, tres variantes:
+
+    anterior          dict armado a mano con isoformat/strftime + json de Flask
+    serializador      Serializador compilado + ProveedorJSON con json estándar
+    serializador+orjson  lo mismo con orjson (si está instalado)
+
+Solo mide CPU de serialización, sin BD ni HTTP.
+
+Uso (desde backend/):
+    python benchmarks/serializacion.py --filas 500 --repeticiones 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+import serializacion  # noqa: E402
+from app import app, ASISTENCIA_EMPLEADO_JSON, RESERVA_JSON  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+
+def filas_reservas(n):
+    inicio = datetime(2026, 3, 1, 12, 30)
+    return [(i, i % 900 + 1, f'Cliente Pérez {i}', f'cliente{i}@correo.com', i % 40 + 1, i % 40 + 1,
+             inicio + timedelta(hours=i), 2 + i % 5, 'confirmada', None if i % 3 else 'Cumpleaños')
+            for i in range(n)]
+
+
+def filas_asistencias(n):
+    inicio = datetime(2026, 3, 1, 7, 2, 11, 123456)
+    return [(i, i % 30 + 1, f'Empleado {i % 30}', (inicio + timedelta(days=i)).date(),
+             inicio + timedelta(days=i), inicio + timedelta(days=i, hours=8) if i % 7 else None, None)
+            for i in range(n)]
+
+
+# Lo que hacían las rutas antes: un dict por fila con conversiones en Python
+def reserva_anterior(f):
+    return {
+        'id': f[0],
+        'cliente': {'id': f[1], 'nombre': f[2], 'email': f[3]},
+        'mesa': {'id': f[4], 'numero': f[5]},
+        'fecha_hora': f[6].isoformat(),
+        'num_personas': f[7],
+        'estado': f[8],
+        'notas': f[9]
+    }
+
+
+def asistencia_anterior(f):
+    return {
+        'id': f[0],
+        'empleado': {'id': f[1], 'nombre': f[2]},
+        'fecha': f[3].isoformat(),
+        'hora_entrada': f[4].strftime('%H:%M:%S') if f[4] else None,
+        'hora_salida': f[5].strftime('%H:%M:%S') if f[5] else None,
+        'notas': f[6]
+    }
+
+
+def medir(funcion, repeticiones):
+    funcion()  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=500, help='filas por respuesta (LIMITE_MAXIMO = 500)')
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    anterior = DefaultJSONProvider(app)
+    nuevo = serializacion.ProveedorJSON(app)
+    orjson = serializacion.orjson
+
+    casos = (
+        ('reservas', filas_reservas(args.filas), reserva_anterior, RESERVA_JSON),
+        ('asistencias', filas_asistencias(args.filas), asistencia_anterior, ASISTENCIA_EMPLEADO_JSON),
+    )
+    print(f'{args.filas} filas, mediana de {args.repeticiones} repeticiones')
+    for nombre, filas, a_mano, serializador in casos:
+        variantes = [('anterior', lambda: anterior.dumps([a_mano(f) for f in filas]).encode())]
+        serializacion.orjson = None
+        variantes.append(('serializador', lambda: nuevo.a_bytes(serializador.lista(filas))))
+        resultados = [(n, medir(v, args.repeticiones)) for n, v in variantes]
+        if orjson is not None:
+            serializacion.orjson = orjson
+            resultados.append(('serializador+orjson',
+                               medir(lambda: nuevo.a_bytes(serializador.lista(filas)), args.repeticiones)))
+        base = resultados[0][1]
+        for variante, mediana in resultados:
+            print(f'{nombre:12s} {variante:22s} {mediana:8.3f} ms  x{base / mediana:5.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Mide cuánto tarda un worker en importar app.py.
+
+Compara el arranque actual (importar sin tocar la BD) con el comportamiento
+anterior, en el que cada worker ejecutaba inicializar_base_datos() al importar.
+Cada medición corre en un proceso nuevo, como un worker de gunicorn.
+
+Uso (desde backend/):
+    python benchmarks/tiempo_importacion.py --repeticiones 10 --workers 4
+
+Sin DATABASE_URL usa una base SQLite temporal.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO = '''
+import sys, time
+sys.path.insert(0, {backend!r})
+inicio = time.perf_counter()
+import app
+if {inicializar}:
+    app.inicializar_base_datos()
+sys.stderr.write("TIEMPO=%f\\n" % (time.perf_counter() - inicio))
+'''
+
+
+def medir(inicializar, repeticiones, entorno):
+    tiempos = []
+    for _ in range(repeticiones):
+        proceso = subprocess.run(
+            [sys.executable, '-c', CODIGO.format(backend=BACKEND, inicializar=inicializar)],
+            env=entorno, capture_output=True, text=True, check=True
+        )
+        linea = [l for l in proceso.stderr.splitlines() if l.startswith('TIEMPO=')][-1]
+        tiempos.append(float(linea.split('=')[1]) * 1000)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', 4)),
+                        help='workers de gunicorn para estimar el arranque total')
+    args = parser.parse_args()
+
+    entorno = dict(os.environ)
+    if not entorno.get('DATABASE_URL'):
+        entorno['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    # Una inicialización previa para que ambas variantes vean la BD ya creada,
+    # como ocurre en producción después del primer despliegue
+    medir(True, 1, entorno)
+
+    for nombre, inicializar in (('import sin BD (actual)', False),
+                                ('import + inicializar_base_datos (anterior)', True)):
+        tiempos = medir(inicializar, args.repeticiones, entorno)
+        mediana = statistics.median(tiempos)
+        print(f'{nombre:45s} mediana {mediana:8.1f} ms  '
+              f'min {min(tiempos):8.1f} ms  max {max(tiempos):8.1f} ms  '
+              f'x{args.workers} workers ≈ {mediana * args.workers:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""Búsqueda de texto con índices de la BD (typeahead de platos y clientes).
+
+Postgres: índices GIN sobre to_tsvector('simple', ...) para los prefijos de
+palabra ("nic gar" -> nic:* & gar:*) y pg_trgm para similitud (tolera errores
+de tipeo) y para los prefijos de email y teléfono. Las tildes se quitan con
+unaccent envuelto en f_unaccent, que es IMMUTABLE y por eso indexable.
+
+unaccent es obligatoria. pg_trgm no: si el usuario de la BD no puede crearla
+(Postgres administrado sin permisos), la búsqueda queda solo con tsvector,
+ordenada por ts_rank, sin tolerancia a errores de tipeo y con email y teléfono
+sin índice. Para activarla se crea la extensión por fuera
+(CREATE EXTENSION pg_trgm) y se vuelve a ejecutar inicializar-db.
+
+SQLite (desarrollo): tablas FTS5 de contenido externo con remove_diacritics,
+sincronizadas con triggers.
+
+Las expresiones de las consultas son las mismas de los índices (mismo texto),
+que es lo que necesita el planificador de Postgres para usarlos.
+"""
+import logging
+import re
+
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.exc import DBAPIError
+
+MINIMO_CARACTERES = 2     # con menos, un prefijo coincide con media tabla
+MINIMO_TRIGRAMA = 3       # LIKE 'abc%' solo usa el índice de trigramas desde 3 caracteres
+MAXIMO_TERMINOS = 8
+
+logger = logging.getLogger('restaurante')
+
+# ----- Postgres -----
+
+DOCUMENTOS_PG = {
+    'platos': "to_tsvector('simple', f_unaccent(coalesce(nombre, '') || ' ' || coalesce(descripcion, '')))",
+    'clientes': "to_tsvector('simple', f_unaccent(coalesce(nombre, '')))",
+}
+NOMBRE_PG = 'f_unaccent(lower(nombre))'
+
+PREPARAR_PG = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    # unaccent() es STABLE (depende del search_path); fijando el diccionario es indexable
+    "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+    f"CREATE INDEX IF NOT EXISTS ix_platos_busqueda ON platos USING gin (({DOCUMENTOS_PG['platos']}))",
+    f"CREATE INDEX IF NOT EXISTS ix_clientes_busqueda ON clientes USING gin (({DOCUMENTOS_PG['clientes']}))",
+]
+
+TRIGRAMAS_PG = [
+    f'CREATE INDEX IF NOT EXISTS ix_platos_nombre_trgm ON platos USING gin ({NOMBRE_PG} gin_trgm_ops)',
+    f'CREATE INDEX IF NOT EXISTS ix_clientes_nombre_trgm ON clientes USING gin ({NOMBRE_PG} gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_clientes_email_trgm ON clientes USING gin (lower(email) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_clientes_telefono_trgm ON clientes USING gin (telefono gin_trgm_ops)',
+]
+
+CONSULTA_TS = "to_tsquery('simple', f_unaccent(:tsquery))"
+
+
+def _coincidencias_pg(tabla, trigramas):
+    """Coinciden por prefijo de palabra (tsvector) o, con pg_trgm, por similitud
+    del nombre. Primero las que empiezan por el texto y luego por similitud (o
+    ts_rank sin pg_trgm). Se ordenan todas antes del LIMIT: Postgres lo resuelve
+    con un top-N que solo guarda `limite` filas en memoria"""
+    condiciones = [f'{DOCUMENTOS_PG[tabla]} @@ {CONSULTA_TS}']
+    empieza = f'{NOMBRE_PG} LIKE f_unaccent(:prefijo)'
+    if trigramas:
+        condiciones.append(f'{NOMBRE_PG} % f_unaccent(:texto)')
+        rango = f'similarity({NOMBRE_PG}, f_unaccent(:texto))'
+    else:
+        rango = f'ts_rank({DOCUMENTOS_PG[tabla]}, {CONSULTA_TS})'
+    if tabla == 'clientes':
+        condiciones.append('lower(email) LIKE :prefijo_trigrama OR telefono LIKE :telefono')
+        empieza += ' OR lower(email) LIKE :prefijo'
+    return f"""
+        SELECT id, ({empieza}) AS empieza, {rango} AS rango
+        FROM {tabla}
+        WHERE {' OR '.join(condiciones)}
+        ORDER BY empieza DESC, rango DESC, id
+        LIMIT :limite
+    """
+
+# ----- SQLite -----
+
+COLUMNAS_FTS = {
+    'platos': ('nombre', 'descripcion'),
+    'clientes': ('nombre', 'email', 'telefono'),
+}
+# En clientes '.' y '@' forman parte del token: el email se busca por prefijo completo
+TOKENIZADORES_FTS = {
+    'platos': "unicode61 remove_diacritics 2",
+    'clientes': "unicode61 remove_diacritics 2 tokenchars '.@'",
+}
+PESOS_FTS = {'platos': '10.0, 1.0', 'clientes': '10.0, 5.0, 5.0'}  # el nombre pesa más
+
+
+def _sql_fts(tabla):
+    columnas = COLUMNAS_FTS[tabla]
+    lista = ', '.join(columnas)
+    nuevos = ', '.join(f'new.{c}' for c in columnas)
+    viejos = ', '.join(f'old.{c}' for c in columnas)
+    borrar = f"INSERT INTO {tabla}_fts({tabla}_fts, rowid, {lista}) VALUES ('delete', old.id, {viejos});"
+    insertar = f'INSERT INTO {tabla}_fts(rowid, {lista}) VALUES (new.id, {nuevos});'
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {tabla}_fts USING fts5({lista}, content={tabla!r}, '
+        f'content_rowid=\'id\', tokenize="{TOKENIZADORES_FTS[tabla]}", prefix=\'2 3\')',
+        f'CREATE TRIGGER IF NOT EXISTS {tabla}_fts_ai AFTER INSERT ON {tabla} BEGIN {insertar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {tabla}_fts_ad AFTER DELETE ON {tabla} BEGIN {borrar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {tabla}_fts_au AFTER UPDATE ON {tabla} BEGIN {borrar} {insertar} END',
+    ]
+
+
+def _coincidencias_fts(tabla):
+    return f"""
+        SELECT rowid AS id, 0 AS empieza, -bm25({tabla}_fts, {PESOS_FTS[tabla]}) AS rango
+        FROM {tabla}_fts
+        WHERE {tabla}_fts MATCH :consulta
+        ORDER BY rango DESC, id
+        LIMIT :limite
+    """
+
+
+# ----- API -----
+
+def trigramas_instalados(conexion):
+    return conexion.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first() is not None
+
+
+def _crear_trigramas(conexion):
+    """CREATE EXTENSION pg_trgm en un savepoint; False si no hay permisos"""
+    try:
+        with conexion.begin_nested():
+            conexion.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DBAPIError as e:
+        logger.warning("Sin pg_trgm: la búsqueda usa solo tsvector",
+                       extra={'datos': {'error': str(e.orig).strip()}})
+        return False
+    return True
+
+
+def preparar_busqueda(conexion):
+    """Crea (si faltan) extensiones, índices, tablas FTS y triggers. Idempotente.
+    En Postgres devuelve si quedó pg_trgm (y sus índices)"""
+    if conexion.dialect.name == 'postgresql':
+        for sentencia in PREPARAR_PG:
+            conexion.exec_driver_sql(sentencia)
+        if not (trigramas_instalados(conexion) or _crear_trigramas(conexion)):
+            return False
+        for sentencia in TRIGRAMAS_PG:
+            conexion.exec_driver_sql(sentencia)
+        return True
+    for tabla in COLUMNAS_FTS:
+        existia = conexion.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (f'{tabla}_fts',)
+        ).first()
+        for sentencia in _sql_fts(tabla):
+            conexion.exec_driver_sql(sentencia)
+        if not existia:  # indexar las filas que ya estaban
+            conexion.exec_driver_sql(f"INSERT INTO {tabla}_fts({tabla}_fts) VALUES ('rebuild')")
+
+
+def _escapar_like(valor):
+    return valor.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def coincidencias(tabla, texto, limite, dialecto, trigramas=True):
+    """Subconsulta (id, empieza, rango) con las mejores `limite` filas de `tabla`
+    para el texto, o None si es demasiado corto para buscar. trigramas indica si
+    en Postgres está pg_trgm"""
+    texto = ' '.join(texto.lower().split())
+    if len(texto) < MINIMO_CARACTERES:
+        return None
+
+    if dialecto == 'postgresql':
+        palabras = re.findall(r'\w+', texto)[:MAXIMO_TERMINOS]
+        if not palabras:
+            return None
+        prefijo = _escapar_like(texto) + '%'
+        parametros = {
+            'tsquery': ' & '.join(f'{palabra}:*' for palabra in palabras),
+            'prefijo': prefijo,
+            'limite': limite,
+        }
+        if trigramas:
+            parametros['texto'] = texto
+        if tabla == 'clientes':
+            # Email y teléfono solo por prefijo y desde MINIMO_TRIGRAMA caracteres
+            largo = len(texto) >= MINIMO_TRIGRAMA
+            parametros['prefijo_trigrama'] = prefijo if largo else None
+            telefono = re.fullmatch(r'[\d +()-]+', texto) and re.sub(r'\D', '', texto)
+            parametros['telefono'] = telefono + '%' if largo and telefono else None
+        sql = _coincidencias_pg(tabla, trigramas)
+    else:
+        terminos = texto.split()[:MAXIMO_TERMINOS]
+        # Cada término entre comillas (sin sintaxis FTS5) y como prefijo
+        parametros = {
+            'consulta': ' '.join('"{}"*'.format(t.replace('"', '""')) for t in terminos),
+            'limite': limite,
+        }
+        sql = _coincidencias_fts(tabla)
+
+    return (
+        text(sql).bindparams(**parametros)
+        .columns(id=Integer, empieza=Integer, rango=Float)
+        .subquery('coincidencias')
+    )
@@ -0,0 +1,155 @@
+"""Feed de cambios de reservas, mesas y asistencias para /api/stream (SSE).
+
+Las rutas llaman a FeedCambios.publicar() dentro de la transacción que hace el
+cambio, así que un rollback no publica nada:
+
+- En Postgres se emite pg_notify('cambios', ...). Postgres lo entrega solo tras
+  el commit y a todas las conexiones con LISTEN: cada proceso (worker o
+  instancia) mantiene una en un hilo y reparte los eventos a sus clientes.
+- En otros motores (SQLite en desarrollo y pruebas) los eventos esperan en la
+  sesión y se reparten en el mismo proceso después del commit.
+
+Un evento es {'entidad', 'accion', 'id', 'ts', 'datos'}; 'datos' es la fila con
+la misma forma que su listado y falta en las eliminaciones (y en el canal
+público de /api/stream, que solo reparte qué cambió). Si un proceso pierde
+la conexión de LISTEN, al recuperarla reparte RESINCRONIZAR para que los
+clientes vuelvan a cargar sus listas.
+"""
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+
+CANAL = 'cambios'
+LIMITE_NOTIFY = 7900  # pg_notify admite cargas de hasta 8000 bytes
+RESINCRONIZAR = {'entidad': None, 'accion': 'resincronizar'}
+_PENDIENTES = 'cambios_pendientes'
+
+logger = logging.getLogger('restaurante')
+
+
+def formato_sse(carga, evento='cambio'):
+    """Un mensaje Server-Sent Events con la carga JSON ya codificada"""
+    return f'event: {evento}\ndata: {carga}\n\n'
+
+
+# Primer mensaje de cada conexión: 'listo' indica al cliente que recargue sus
+# listas (lo que cambió mientras no estaba conectado no se repite)
+INICIO_SSE = 'retry: 3000\n' + formato_sse('{}', 'listo')
+LATIDO_SSE = ': ping\n\n'  # comentario SSE: mantiene viva la conexión en proxies
+
+
+def mensaje_sse(evento, carga):
+    if evento['accion'] == RESINCRONIZAR['accion']:
+        return formato_sse(carga, 'listo')
+    return formato_sse(carga)
+
+
+class FeedCambios:
+    """Publicación transaccional y reparto por proceso de los eventos del feed"""
+
+    def __init__(self, codificar):
+        self.codificar = codificar
+        self._suscriptores = {}
+        self._lock = threading.Lock()
+        self._url_escucha = None
+        self._pid = None
+
+    def instalar(self, sesion, url_escucha):
+        """Engancha la entrega local a los commits de la sesión. url_escucha es la
+        conexión de LISTEN (directa, no a través de PgBouncer en modo transaction)"""
+        self._url_escucha = url_escucha
+        event.listen(sesion, 'after_commit', self._tras_commit)
+        event.listen(sesion, 'after_rollback', lambda s: s.info.pop(_PENDIENTES, None))
+
+    # ----- publicación -----
+
+    def publicar(self, sesion, eventos):
+        """Publica los eventos en la transacción en curso de la sesión"""
+        if not eventos:
+            return
+        cargas = [self._carga(e) for e in eventos]
+        if sesion.get_bind().dialect.name == 'postgresql':
+            sesion.execute(
+                text('SELECT pg_notify(:canal, carga) FROM unnest(CAST(:cargas AS text[])) AS carga'),
+                {'canal': CANAL, 'cargas': cargas}
+            )
+        else:
+            sesion.info.setdefault(_PENDIENTES, []).extend(cargas)
+
+    def _carga(self, evento):
+        carga = self.codificar(evento)
+        if len(carga.encode()) > LIMITE_NOTIFY:
+            # Sin los datos: el cliente recarga esa fila o su lista
+            carga = self.codificar({k: v for k, v in evento.items() if k != 'datos'})
+        return carga
+
+    def _tras_commit(self, sesion):
+        for carga in sesion.info.pop(_PENDIENTES, ()):
+            self.repartir(carga)
+
+    # ----- reparto -----
+
+    def suscribir(self, entregar):
+        """entregar(evento, carga) se llama desde otro hilo y no debe bloquear"""
+        self._asegurar_oyente()
+        clave = object()
+        with self._lock:
+            self._suscriptores[clave] = entregar
+        return clave
+
+    def desuscribir(self, clave):
+        with self._lock:
+            self._suscriptores.pop(clave, None)
+
+    def repartir(self, carga):
+        evento = json.loads(carga)
+        with self._lock:
+            suscriptores = list(self._suscriptores.values())
+        for entregar in suscriptores:
+            entregar(evento, carga)
+
+    def _asegurar_oyente(self):
+        url = self._url_escucha or ''
+        if not url.startswith(('postgres://', 'postgresql')) or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():  # un hilo por proceso (después del fork)
+                self._pid = os.getpid()
+                threading.Thread(target=self._escuchar, name='feed-cambios', daemon=True).start()
+
+    def _escuchar(self):
+        url = self._url_escucha.replace('postgres://', 'postgresql://', 1)
+        motor = create_engine(url, poolclass=NullPool)
+        espera = 1
+        conectado_antes = False
+        while True:
+            try:
+                conexion = motor.raw_connection()
+                try:
+                    dbapi = conexion.driver_connection
+                    dbapi.autocommit = True
+                    dbapi.cursor().execute(f'LISTEN {CANAL}')
+                    if conectado_antes:
+                        # Pudo haber eventos mientras no escuchábamos
+                        self.repartir(json.dumps(RESINCRONIZAR))
+                    conectado_antes, espera = True, 1
+                    while True:
+                        if select.select([dbapi], [], [], 30) == ([], [], []):
+                            dbapi.cursor().execute('SELECT 1')  # detecta conexiones caídas
+                            continue
+                        dbapi.poll()
+                        while dbapi.notifies:
+                            self.repartir(dbapi.notifies.pop(0).payload)
+                finally:
+                    conexion.close()
+            except Exception:
+                logger.exception("Conexión LISTEN perdida; reintentando",
+                                 extra={'datos': {'reintento_s': espera}})
+                time.sleep(espera)
+                espera = min(espera * 2, 30)
@@ -0,0 +1,88 @@
+"""Compresión gzip/brotli de las respuestas, negociada con Accept-Encoding.
+
+Se aplica a JSON, NDJSON y CSV, tanto en Flask (after_request en app.py) como en
+las rutas de lectura_async.py (CompresionASGI). Las respuestas en streaming (exportaciones) se
+comprimen por fragmentos y cada uno se vacía al enviarse, así el cliente sigue
+recibiendo datos a medida que salen de la BD en vez de esperar al final.
+
+brotli es opcional: sin el paquete solo se ofrece gzip.
+"""
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+TIPOS_COMPRIMIBLES = ('application/json', 'application/x-ndjson', 'text/csv')
+TAMANO_MINIMO = 1024  # por debajo de esto la compresión no compensa
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5    # calidades altas (hasta 11) son para estáticos, no para respuestas por petición
+
+
+def elegir_codificacion(accept_encoding):
+    """'br', 'gzip' o None según la cabecera Accept-Encoding (brotli si empatan)"""
+    ofrecidas = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return parse_accept_header(accept_encoding or '').best_match(ofrecidas)
+
+
+def es_comprimible(mimetype):
+    return mimetype in TIPOS_COMPRIMIBLES
+
+
+def etag_debil(etag):
+    """El cuerpo comprimido ya no es byte a byte la representación del ETag fuerte"""
+    return etag if etag.startswith('W/') else 'W/' + etag
+
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=CALIDAD_BROTLI)
+    return zlib.compress(datos, NIVEL_GZIP, wbits=31)  # wbits=31: formato gzip
+
+
+class _Gzip:
+    def __init__(self):
+        self._compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def fragmento(self, datos):
+        return self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def final(self):
+        return self._compresor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+
+    def fragmento(self, datos):
+        return self._compresor.process(datos) + self._compresor.flush()
+
+    def final(self):
+        return self._compresor.finish()
+
+
+def _compresor(codificacion):
+    return _Brotli() if codificacion == 'br' else _Gzip()
+
+
+def _a_bytes(fragmento):
+    return fragmento.encode() if isinstance(fragmento, str) else fragmento
+
+
+def comprimir_stream(fragmentos, codificacion):
+    """Comprime un iterable de fragmentos (str o bytes) sin acumularlo"""
+    compresor = _compresor(codificacion)
+    try:
+        for fragmento in fragmentos:
+            if fragmento:
+                yield compresor.fragmento(_a_bytes(fragmento))
+        yield compresor.final()
+    finally:
+        cerrar = getattr(fragmentos, 'close', None)
+        if cerrar:  # libera el cursor de la exportación si el cliente corta
+            cerrar()
+
@@ -0,0 +1,284 @@
+"""Generador de datos sintéticos masivos para dimensionar índices y probar listados.
+
+Se usa con `flask --app app generate-data` (ver app.py). Todo sale de un
+random.Random(semilla): misma semilla sobre la misma base, mismos datos.
+Las filas se cargan con COPY en Postgres y con inserts en lote (executemany)
+en SQLite, por bloques, sin pasar por objetos del ORM.
+"""
+import csv
+import io
+import random
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import insert
+
+NOMBRES = ['Ana', 'Carlos', 'María', 'Juan', 'Laura', 'Andrés', 'Valentina', 'Santiago', 'Camila',
+           'Felipe', 'Daniela', 'Julián', 'Sofía', 'Mateo', 'Paula', 'Diego', 'Natalia', 'Sebastián',
+           'Isabella', 'Alejandro', 'Mariana', 'David', 'Gabriela', 'Nicolás', 'Lucía', 'Tomás']
+APELLIDOS = ['García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez', 'Sánchez', 'Ramírez',
+             'Torres', 'Díaz', 'Vargas', 'Castro', 'Rojas', 'Moreno', 'Jiménez', 'Herrera', 'Medina',
+             'Acosta', 'Ruiz', 'Ortiz', 'Suárez', 'Gómez', 'Cárdenas', 'Ríos', 'Mejía', 'Álvarez']
+PLATOS_BASE = {
+    'Entradas': ['Empanadas', 'Patacones', 'Ceviche', 'Ensalada', 'Sopa', 'Croquetas', 'Arepitas'],
+    'Platos Principales': ['Bandeja paisa', 'Filete', 'Pasta', 'Pollo', 'Salmón', 'Ajiaco', 'Risotto'],
+    'Postres': ['Tiramisú', 'Flan', 'Brownie', 'Tres leches', 'Cheesecake', 'Helado', 'Arroz con leche'],
+    'Bebidas': ['Jugo', 'Limonada', 'Café', 'Té', 'Gaseosa', 'Cerveza', 'Vino'],
+}
+VARIANTES = ['de la casa', 'especial', 'tradicional', 'del chef', 'de temporada', 'clásico', 'gratinado',
+             'a la parrilla', 'con hierbas', 'picante']
+PRECIOS = {'Entradas': (5, 14), 'Platos Principales': (14, 45), 'Postres': (5, 12), 'Bebidas': (2, 10)}
+CARGOS = ['mesero', 'mesero', 'mesero', 'cocinero', 'cocinero', 'cajero']
+
+# Peso de cada día de la semana (lunes=0): viernes y sábado llenan el restaurante
+PESO_DIA_SEMANA = [0.6, 0.7, 0.8, 0.9, 1.4, 1.6, 1.1]
+# Turnos de reserva del día: (horas de inicio, peso de cada hora, peso del turno).
+# Cada turno empieza cuando termina el anterior (con DURACION_RESERVA de 2 h),
+# así una mesa recibe a lo sumo una reserva por turno y nunca hay cruces
+TURNOS_RESERVA = [
+    ([time(12, 0), time(12, 30)], [3, 2], 3),     # almuerzo
+    ([time(14, 30)], [1], 1),                     # almuerzo tardío
+    ([time(18, 0), time(18, 30)], [2, 3], 2.5),   # primera cena
+    ([time(20, 30), time(21, 0)], [3, 2], 3.5),   # segunda cena
+]
+# Ni el día más lleno ocupa todas las mesas en todos los turnos
+OCUPACION_MAXIMA = 0.85
+# Turnos de los empleados: (hora media de entrada en minutos, duración media en minutos)
+TURNOS = [(7 * 60, 8 * 60), (11 * 60, 8 * 60), (15 * 60, 7 * 60 + 30)]
+CLAVE_EMPLEADOS = 'empleado123'
+
+
+class Cargador:
+    """Acumula filas y las vuelca cada `lote` filas con COPY o executemany"""
+
+    def __init__(self, db, modelo, lote):
+        self.db = db
+        self.modelo = modelo
+        self.lote = lote
+        self.filas = []
+        self.total = 0
+        self.copy = db.engine.dialect.name == 'postgresql'
+
+    def agregar(self, fila):
+        self.filas.append(fila)
+        if len(self.filas) >= self.lote:
+            self.volcar()
+
+    def volcar(self):
+        if not self.filas:
+            return
+        if self.copy:
+            columnas = list(self.filas[0])
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            for fila in self.filas:
+                escritor.writerow([fila[c] for c in columnas])
+            buffer.seek(0)
+            cursor = self.db.session.connection().connection.cursor()
+            cursor.copy_expert(
+                f'COPY {self.modelo.__tablename__} ({", ".join(columnas)}) FROM STDIN WITH (FORMAT csv)', buffer
+            )
+        else:
+            self.db.session.execute(insert(self.modelo), self.filas)
+        self.total += len(self.filas)
+        self.filas = []
+
+
+def _ids_nuevos(db, modelo, id_previo):
+    return db.session.execute(
+        db.select(modelo.id).where(modelo.id > id_previo).order_by(modelo.id)
+    ).scalars().all()
+
+
+def _max_id(db, modelo):
+    return db.session.execute(db.select(db.func.coalesce(db.func.max(modelo.id), 0))).scalar()
+
+
+def _nombre(aleatorio):
+    return f'{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}'
+
+
+def _verificar_turnos(duracion):
+    """Los turnos no se cruzan con la duración de reserva configurada"""
+    for (horas, _, _), (siguientes, _, _) in zip(TURNOS_RESERVA, TURNOS_RESERVA[1:]):
+        ultima = datetime.combine(datetime.min, max(horas)) + duracion
+        if ultima > datetime.combine(datetime.min, min(siguientes)):
+            raise ValueError(f'Con reservas de {duracion} el turno de las {min(siguientes)} se cruza con el anterior')
+
+
+def repartir(total, pesos, tope):
+    """Reparte total en partes proporcionales a pesos sin que ninguna pase de tope"""
+    partes = [0] * len(pesos)
+    while total:
+        abiertas = sorted((i for i, parte in enumerate(partes) if parte < tope), key=lambda i: -pesos[i])
+        if not abiertas:
+            raise ValueError(f'{total} de más: no caben en {len(pesos)} partes de {tope}')
+        suma = sum(pesos[i] for i in abiertas)
+        for i in abiertas:
+            cuota = min(tope - partes[i], int(total * pesos[i] / suma) or 1, total)
+            partes[i] += cuota
+            total -= cuota
+            if not total:
+                break
+    return partes
+
+
+def generar_datos(semilla=42, clientes=100_000, reservas=1_000_000, empleados=30, dias_asistencia=365,
+                  platos=120, mesas=40, dias_historia=365, dias_futuro=60, lote=10_000, fecha_base=None,
+                  informar=print):
+    """Genera el volumen pedido sobre la base actual y devuelve {tabla: filas}.
+    Las fechas se cuentan desde fecha_base (hoy si no se indica). Las reservas se
+    reparten en `mesas` mesas nuevas; si no caben en dias_historia, la historia
+    se alarga hacia atrás"""
+    from app import (db, Asistencia, Categoria, Cliente, Mesa, Plato, Reserva, Usuario,
+                     menu_cache, reconstruir_resumen, DURACION_RESERVA)
+    from werkzeug.security import generate_password_hash
+
+    aleatorio = random.Random(semilla)
+    ahora = datetime.combine(fecha_base, time()) if fecha_base else datetime.utcnow().replace(second=0, microsecond=0)
+    hoy = ahora.date()
+    totales = {}
+
+    # Categorías y platos
+    categorias = dict(db.session.execute(db.select(Categoria.nombre, Categoria.id)).all())
+    faltantes = [nombre for nombre in PLATOS_BASE if nombre not in categorias]
+    if faltantes:
+        db.session.execute(insert(Categoria), [{'nombre': nombre} for nombre in faltantes])
+        categorias = dict(db.session.execute(db.select(Categoria.nombre, Categoria.id)).all())
+    cargador = Cargador(db, Plato, lote)
+    for i in range(platos):
+        categoria = aleatorio.choice(list(PLATOS_BASE))
+        minimo, maximo = PRECIOS[categoria]
+        cargador.agregar({
+            'nombre': f'{aleatorio.choice(PLATOS_BASE[categoria])} {aleatorio.choice(VARIANTES)}',
+            'descripcion': f'Preparación {aleatorio.choice(VARIANTES)} #{i}',
+            'precio': round(aleatorio.uniform(minimo, maximo) * 2) / 2,
+            'categoria_id': categorias[categoria],
+            'disponible': aleatorio.random() < 0.9,
+            'imagen_url': None,
+        })
+    cargador.volcar()
+    totales['platos'] = cargador.total
+    informar(f'platos: {cargador.total}')
+
+    # Reparto de reservas por día: más los fines de semana, un 10 % de ruido diario.
+    # Cada mesa atiende una reserva por turno; si el día más lleno no cabe en
+    # OCUPACION_MAXIMA de las mesas, se agregan días de historia (no mesas)
+    _verificar_turnos(DURACION_RESERVA)
+    capacidad_dia = int(mesas * len(TURNOS_RESERVA) * OCUPACION_MAXIMA)
+    if reservas and not capacidad_dia:
+        raise ValueError('Hacen falta mesas para generar reservas')
+    dias = [hoy - timedelta(days=d) for d in range(dias_historia, -dias_futuro - 1, -1)]
+    pesos = [PESO_DIA_SEMANA[d.weekday()] * aleatorio.uniform(0.9, 1.1) for d in dias]
+    while reservas and max(pesos) * reservas / sum(pesos) > capacidad_dia:
+        faltan = len(dias) * (max(pesos) * reservas / sum(pesos) / capacidad_dia - 1)
+        for _ in range(int(faltan) + 1):
+            dias.insert(0, dias[0] - timedelta(days=1))
+            pesos.insert(0, PESO_DIA_SEMANA[dias[0].weekday()] * aleatorio.uniform(0.9, 1.1))
+    if len(dias) > dias_historia + dias_futuro + 1:
+        informar(f'historia ampliada a {(hoy - dias[0]).days} días: {reservas} reservas en {mesas} mesas')
+    suma = sum(pesos)
+    por_dia, acumulado, asignadas = [], 0.0, 0
+    for peso in pesos:
+        acumulado += peso * reservas / suma
+        por_dia.append(round(acumulado) - asignadas)
+        asignadas += por_dia[-1]
+
+    # Mesas
+    numero_previo = db.session.execute(db.select(db.func.coalesce(db.func.max(Mesa.numero), 0))).scalar()
+    id_previo = _max_id(db, Mesa)
+    cargador = Cargador(db, Mesa, lote)
+    for i in range(mesas):
+        cargador.agregar({'numero': numero_previo + i + 1, 'capacidad': aleatorio.choice([2, 2, 4, 4, 4, 6, 8]),
+                          'disponible': True})
+    cargador.volcar()
+    mesas_ids = [(m.id, m.capacidad) for m in db.session.execute(
+        db.select(Mesa.id, Mesa.capacidad).where(Mesa.id > id_previo).order_by(Mesa.id))]
+    totales['mesas'] = len(mesas_ids)
+    informar(f'mesas: {len(mesas_ids)}')
+
+    # Clientes: correos únicos a partir del mayor id existente
+    id_previo = _max_id(db, Cliente)
+    cargador = Cargador(db, Cliente, lote)
+    for i in range(id_previo + 1, id_previo + clientes + 1):
+        nombre = _nombre(aleatorio)
+        cargador.agregar({'nombre': nombre, 'email': f'cliente{i}@generado.test',
+                          'telefono': f'3{aleatorio.randint(0, 10**9 - 1):09d}'})
+    cargador.volcar()
+    clientes_ids = _ids_nuevos(db, Cliente, id_previo)
+    totales['clientes'] = len(clientes_ids)
+    informar(f'clientes: {len(clientes_ids)}')
+
+    # Reservas: unos pocos clientes frecuentes concentran muchas visitas (pesos 1/rango)
+    if clientes_ids and mesas_ids:
+        frecuencia = [0.0] * len(clientes_ids)
+        acumulado = 0.0
+        for i in range(len(clientes_ids)):
+            acumulado += 1 / (i + 1) ** 0.7
+            frecuencia[i] = acumulado
+        cargador = Cargador(db, Reserva, lote)
+        pesos_turno = [peso for _, _, peso in TURNOS_RESERVA]
+        for dia, total_dia in zip(dias, por_dia):
+            por_turno = repartir(total_dia, pesos_turno, len(mesas_ids))
+            for (horas, pesos_hora, _), cantidad in zip(TURNOS_RESERVA, por_turno):
+                elegidas = aleatorio.sample(mesas_ids, cantidad)
+                clientes_dia = aleatorio.choices(clientes_ids, cum_weights=frecuencia, k=cantidad)
+                for (mesa_id, capacidad), cliente_id in zip(elegidas, clientes_dia):
+                    inicio = datetime.combine(dia, aleatorio.choices(horas, pesos_hora)[0])
+                    creada = min(inicio - timedelta(hours=aleatorio.expovariate(1 / 72)), ahora)
+                    if inicio < ahora:
+                        estado = 'cancelada' if aleatorio.random() < 0.08 else 'confirmada'
+                    else:
+                        estado = aleatorio.choices(['pendiente', 'confirmada', 'cancelada'], [5, 4, 1])[0]
+                    cargador.agregar({
+                        'cliente_id': cliente_id, 'mesa_id': mesa_id, 'fecha_hora': inicio,
+                        'num_personas': aleatorio.randint(max(1, capacidad - 3), capacidad),
+                        'estado': estado, 'notas': None, 'creada_en': creada,
+                    })
+        cargador.volcar()
+        totales['reservas'] = cargador.total
+        informar(f'reservas: {cargador.total}')
+
+    # Empleados: un solo hash compartido, miles de PBKDF2 no aportan nada
+    id_previo = _max_id(db, Usuario)
+    hash_clave = generate_password_hash(CLAVE_EMPLEADOS)
+    generados = db.session.execute(
+        db.select(db.func.count(Usuario.id)).where(Usuario.email.like('empleado%@generado.test'))
+    ).scalar()
+    cargador = Cargador(db, Usuario, lote)
+    for i in range(generados, generados + empleados):
+        cargador.agregar({
+            'nombre': _nombre(aleatorio), 'email': f'empleado{i}@generado.test', 'password_hash': hash_clave,
+            'rol': 'empleado', 'cargo': aleatorio.choice(CARGOS), 'activo': aleatorio.random() < 0.95,
+            'creado_en': ahora - timedelta(days=dias_asistencia),
+        })
+    cargador.volcar()
+    empleados_ids = _ids_nuevos(db, Usuario, id_previo)
+    totales['usuarios'] = len(empleados_ids)
+    informar(f'empleados: {len(empleados_ids)} (clave {CLAVE_EMPLEADOS})')
+
+    # Asistencias: cada empleado tiene un turno fijo, dos días libres por semana y
+    # ausencias ocasionales; la entrada varía unos minutos alrededor de la hora del turno
+    cargador = Cargador(db, Asistencia, lote)
+    for usuario_id in empleados_ids:
+        entrada_media, duracion_media = aleatorio.choice(TURNOS)
+        libres = set(aleatorio.sample(range(7), 2))
+        for d in range(dias_asistencia, 0, -1):
+            dia = hoy - timedelta(days=d)
+            if dia.weekday() in libres or aleatorio.random() < 0.03:
+                continue
+            entrada = datetime.combine(dia, time()) + timedelta(
+                minutes=round(aleatorio.gauss(entrada_media, 8)))
+            salida = entrada + timedelta(minutes=round(aleatorio.gauss(duracion_media, 25)))
+            cargador.agregar({'usuario_id': usuario_id, 'fecha': dia, 'hora_entrada': entrada,
+                              'hora_salida': salida, 'notas': None})
+    cargador.volcar()
+    totales['asistencias'] = cargador.total
+    informar(f'asistencias: {cargador.total}')
+
+    db.session.commit()
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexion:
+            conexion.exec_driver_sql('ANALYZE')
+    reconstruir_resumen()
+    menu_cache.invalidar()
+    return totales
@@ -0,0 +1,21 @@
+# Configuración de gunicorn; se carga sola al ejecutar gunicorn desde backend/
+import os
+import shutil
+import tempfile
+
+# Directorio donde cada worker deja sus métricas para que /metrics las sume.
+# Se define aquí, en el proceso maestro, para que todos los workers lo hereden.
+directorio_metricas = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'restaurante_metricas')
+)
+
+
+def on_starting(server):
+    # Métricas de una ejecución anterior no deben sumarse a las nuevas
+    shutil.rmtree(directorio_metricas, ignore_errors=True)
+    os.makedirs(directorio_metricas, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
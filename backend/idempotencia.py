@@ -0,0 +1,137 @@
+"""Almacenes de respuestas para la cabecera Idempotency-Key.
+
+Un cliente que reintenta un POST (doble clic, timeout durante el arranque en
+frío) manda la misma clave; la primera petición la reclama y guarda su
+respuesta, y las repeticiones reciben esa respuesta sin volver a ejecutar la
+ruta. reclamar() devuelve uno de:
+
+    NUEVA      la clave no existía (o expiró): ejecutar la ruta y completar()
+    GUARDADA   ya hay respuesta para esta clave y esta misma petición
+    EN_CURSO   otra petición con la clave todavía no terminó
+    OTRA       la clave se usó con una petición distinta (otra ruta o cuerpo)
+
+AlmacenBD guarda las claves en una tabla propia y sirve para varios workers e
+instancias; AlmacenMemoria es un LRU acotado por proceso. En ambos las claves
+expiran a los `ttl` segundos y una reclamada que no se completa (el worker
+murió a mitad) se libera a los `ttl_en_curso` segundos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+NUEVA, GUARDADA, EN_CURSO, OTRA = 'nueva', 'guardada', 'en_curso', 'otra'
+
+
+class AlmacenMemoria:
+    """LRU de como mucho `maximo` claves, por proceso"""
+
+    def __init__(self, maximo, ttl, ttl_en_curso):
+        self.maximo = maximo
+        self.ttl = ttl
+        self.ttl_en_curso = ttl_en_curso
+        self._entradas = OrderedDict()  # clave -> [huella, respuesta o None, creada]
+        self._lock = threading.Lock()
+
+    def _vencida(self, entrada, ahora):
+        vida = self.ttl if entrada[1] is not None else self.ttl_en_curso
+        return ahora - entrada[2] > vida
+
+    def reclamar(self, clave, huella):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and not self._vencida(entrada, ahora):
+                self._entradas.move_to_end(clave)
+                if entrada[0] != huella:
+                    return OTRA, None
+                return (GUARDADA, entrada[1]) if entrada[1] is not None else (EN_CURSO, None)
+            self._entradas[clave] = [huella, None, ahora]
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+            return NUEVA, None
+
+    def completar(self, clave, huella, respuesta):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == huella:
+                entrada[1] = respuesta
+                entrada[2] = time.monotonic()
+
+    def liberar(self, clave, huella):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == huella and entrada[1] is None:
+                del self._entradas[clave]
+
+
+class AlmacenBD:
+    """Claves en la tabla del modelo (clave, huella, estado, cuerpo, tipo, creada_en).
+    Usa conexiones propias del motor: reclamar y completar se confirman aparte
+    de la transacción de la ruta"""
+
+    PURGAR_CADA = 500  # reclamos entre borrados de las claves expiradas
+
+    def __init__(self, motor, modelo, ttl, ttl_en_curso):
+        self.motor = motor
+        self.tabla = modelo.__table__
+        self.ttl = ttl
+        self.ttl_en_curso = ttl_en_curso
+        self._reclamos = 0
+
+    def _expiradas(self, ahora):
+        columnas = self.tabla.c
+        return or_(
+            columnas.creada_en < ahora - timedelta(seconds=self.ttl),
+            and_(columnas.estado.is_(None), columnas.creada_en < ahora - timedelta(seconds=self.ttl_en_curso))
+        )
+
+    def reclamar(self, clave, huella):
+        ahora = datetime.utcnow()
+        columnas = self.tabla.c
+        with self.motor.begin() as conexion:
+            self._reclamos += 1
+            if self._reclamos % self.PURGAR_CADA == 0:
+                conexion.execute(delete(self.tabla).where(self._expiradas(ahora)))
+            else:
+                conexion.execute(delete(self.tabla).where(columnas.clave == clave, self._expiradas(ahora)))
+            dialecto = postgresql if self.motor.dialect.name == 'postgresql' else sqlite
+            reclamada = conexion.execute(
+                dialecto.insert(self.tabla)
+                .values(clave=clave, huella=huella, creada_en=ahora)
+                .on_conflict_do_nothing(index_elements=['clave'])
+            ).rowcount
+            if reclamada:
+                return NUEVA, None
+            fila = conexion.execute(
+                select(columnas.huella, columnas.estado, columnas.cuerpo, columnas.tipo)
+                .where(columnas.clave == clave)
+            ).first()
+        if fila is None:  # se liberó entre el INSERT y el SELECT
+            return EN_CURSO, None
+        if fila.huella != huella:
+            return OTRA, None
+        if fila.estado is None:
+            return EN_CURSO, None
+        return GUARDADA, (fila.estado, fila.cuerpo, fila.tipo)
+
+    def completar(self, clave, huella, respuesta):
+        estado, cuerpo, tipo = respuesta
+        columnas = self.tabla.c
+        with self.motor.begin() as conexion:
+            conexion.execute(
+                update(self.tabla)
+                .where(columnas.clave == clave, columnas.huella == huella)
+                .values(estado=estado, cuerpo=cuerpo, tipo=tipo, creada_en=datetime.utcnow())
+            )
+
+    def liberar(self, clave, huella):
+        columnas = self.tabla.c
+        with self.motor.begin() as conexion:
+            conexion.execute(delete(self.tabla).where(
+                columnas.clave == clave, columnas.huella == huella, columnas.estado.is_(None)
+            ))
@@ -0,0 +1,168 @@
+"""Derivados de imágenes para la web: AVIF y WebP a varios anchos.
+
+Cada derivado se guarda con el hash de su contenido en el nombre
+(ensalada-640.3f2a9c1b7e4d.webp), así la URL de un archivo nunca cambia de
+contenido y se puede servir con Cache-Control immutable. Una imagen nueva da
+nombres nuevos; las viejas dejan de referenciarse.
+
+descriptor() resume los derivados de una imagen en lo que necesita un
+<picture>: el srcset de cada formato y el tamaño original. Las páginas
+estáticas que los citan por nombre se ponen al día con actualizar_referencias().
+
+Pillow es opcional: sin el paquete (o sin soporte AVIF en su build) se
+generan solo los formatos disponibles, y sin ninguno procesar() falla con
+ValueError.
+"""
+import hashlib
+import io
+import os
+import re
+import unicodedata
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # dependencia opcional
+    Image = None
+
+ANCHOS = (320, 640, 960, 1280)  # el mayor es el tope: no se sirven originales más grandes
+ANCHO_PREDETERMINADO = 960      # el de imagen_url, para clientes que no usan srcset
+FORMATOS = ('avif', 'webp')     # en orden de preferencia para <picture>
+OPCIONES = {
+    'avif': {'format': 'AVIF', 'quality': 50, 'speed': 6},
+    'webp': {'format': 'WEBP', 'quality': 78, 'method': 4},
+}
+TIPOS_ENTRADA = {'JPEG', 'MPO', 'PNG', 'WEBP', 'GIF', 'AVIF'}
+MAXIMO_PIXELES = 40_000_000  # unos 7000x5700; más es un archivo malicioso o un error
+_DERIVADO = r'([a-z0-9-]+)-(\d+)\.[0-9a-f]{12}\.(\w+)'  # base-ancho.hash.formato
+
+
+def formatos_disponibles():
+    if Image is None:
+        return ()
+    return tuple(f for f in FORMATOS if features.check(f))
+
+
+def nombre_base(nombre):
+    """'Fotos Restaurante.jpg' -> 'fotos-restaurante'"""
+    nombre = os.path.splitext(os.path.basename(nombre))[0]
+    nombre = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '-', nombre.lower()).strip('-') or 'imagen'
+
+
+def _abrir(datos):
+    try:
+        imagen = Image.open(io.BytesIO(datos))
+    except Exception:
+        raise ValueError('El archivo no es una imagen válida')
+    if imagen.format not in TIPOS_ENTRADA:
+        raise ValueError(f'Formato de imagen no soportado: {imagen.format}')
+    if imagen.width * imagen.height > MAXIMO_PIXELES:
+        raise ValueError('La imagen es demasiado grande')
+    imagen = ImageOps.exif_transpose(imagen)  # fotos de celular giradas por EXIF
+    # AVIF y WebP admiten transparencia: se conserva solo si la imagen la tiene
+    transparente = imagen.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagen.info
+    return imagen.convert('RGBA' if transparente else 'RGB')
+
+
+def anchos_para(ancho_original):
+    """Los anchos de ANCHOS menores que el original, más el original si cabe bajo el tope"""
+    anchos = {a for a in ANCHOS if a < ancho_original}
+    anchos.add(min(ancho_original, ANCHOS[-1]))
+    return sorted(anchos)
+
+
+def procesar(datos, nombre):
+    """Genera los derivados de una imagen (bytes). Devuelve (archivos, info):
+    archivos es una lista de (nombre_archivo, bytes) e info tiene el tamaño
+    original y, por formato, los pares (ancho, nombre_archivo)"""
+    formatos = formatos_disponibles()
+    if not formatos:
+        raise ValueError('El procesamiento de imágenes no está disponible (falta Pillow)')
+    imagen = _abrir(datos)
+    base = nombre_base(nombre)
+    archivos = []
+    info = {'ancho': imagen.width, 'alto': imagen.height, 'formatos': {f: [] for f in formatos}}
+    for ancho in anchos_para(imagen.width):
+        alto = max(1, round(imagen.height * ancho / imagen.width))
+        redimensionada = imagen if ancho == imagen.width else \
+            imagen.resize((ancho, alto), Image.LANCZOS, reducing_gap=3.0)
+        for formato in formatos:
+            salida = io.BytesIO()
+            redimensionada.save(salida, **OPCIONES[formato])
+            contenido = salida.getvalue()
+            archivo = f'{base}-{ancho}.{hashlib.sha256(contenido).hexdigest()[:12]}.{formato}'
+            archivos.append((archivo, contenido))
+            info['formatos'][formato].append((ancho, archivo))
+    return archivos, info
+
+
+def descriptor(info, url):
+    """{'ancho', 'alto', 'srcset': {formato: 'url 320w, ...'}} con url(archivo)
+    para cada derivado"""
+    return {
+        'ancho': info['ancho'],
+        'alto': info['alto'],
+        'srcset': {
+            formato: ', '.join(f'{url(archivo)} {ancho}w' for ancho, archivo in derivados)
+            for formato, derivados in info['formatos'].items()
+        },
+    }
+
+
+def predeterminada(info, url):
+    """URL del derivado para <img src>: WebP (el más compatible) del ancho
+    predeterminado o el mayor por debajo"""
+    formato = 'webp' if 'webp' in info['formatos'] else next(iter(info['formatos']))
+    derivados = info['formatos'][formato]
+    candidatos = [d for d in derivados if d[0] <= ANCHO_PREDETERMINADO] or derivados[:1]
+    return url(candidatos[-1][1])
+
+
+def actualizar_referencias(html, url_base, archivos):
+    """html con cada URL url_base/base-ancho.hash.formato cambiada por la del
+    derivado actual de ese base, ancho y formato (de la lista de nombres
+    archivos). Devuelve (html, URLs sin derivado actual)"""
+    actuales = {}
+    for archivo in archivos:
+        coincidencia = re.fullmatch(_DERIVADO, archivo)
+        if coincidencia:
+            actuales[coincidencia.groups()] = archivo
+    huerfanas = []
+
+    def reemplazar(coincidencia):
+        archivo = actuales.get(coincidencia.groups())
+        if archivo is None:
+            huerfanas.append(coincidencia.group(0))
+            return coincidencia.group(0)
+        return f'{url_base}/{archivo}'
+
+    return re.sub(re.escape(url_base) + '/' + _DERIVADO, reemplazar, html), huerfanas
+
+
+class AlmacenImagenes:
+    """Derivados en un directorio local, publicados bajo url_base. url_base puede
+    ser un CDN o bucket que sirva una copia del directorio"""
+
+    def __init__(self, directorio, url_base):
+        self.directorio = directorio
+        self.url_base = url_base.rstrip('/')
+
+    def url(self, archivo):
+        return f'{self.url_base}/{archivo}'
+
+    def guardar(self, archivos):
+        os.makedirs(self.directorio, exist_ok=True)
+        for archivo, contenido in archivos:
+            ruta = os.path.join(self.directorio, archivo)
+            if os.path.exists(ruta):  # mismo nombre = mismo contenido
+                continue
+            temporal = f'{ruta}.{os.getpid()}.tmp'
+            with open(temporal, 'wb') as f:
+                f.write(contenido)
+            os.replace(temporal, ruta)
+
+    def procesar(self, datos, nombre):
+        """Genera y guarda los derivados; devuelve (imagen_url, descriptor)"""
+        archivos, info = procesar(datos, nombre)
+        self.guardar(archivos)
+        return predeterminada(info, self.url), descriptor(info, self.url)
@@ -1,15 +1,6 @@
-from app import db, seed_db
+# Equivalente a `flask --app app inicializar-db`
+from app import inicializar_base_datos
 
-# Crea todas las tablas
-db.create_all()
-
-# Carga los datos de ejemplo
-seed_db()
-
-print("Base de datos inicializada y datos de ejemplo cargados")
-
-# Verificar si ya hay empleados
-empleados_count = Usuario.query.count()
-if empleados_count == 0:
-    print("⚠️ No hay empleados. Creando empleados de prueba...")
-    seed_empleados()
\ No newline at end of file
+# Crea tablas, índices y datos de ejemplo (mesas, categorías, platos y empleados)
+if inicializar_base_datos():
+    print("Base de datos inicializada y datos de ejemplo cargados")
@@ -0,0 +1,322 @@
+"""Camino de lectura asíncrono para los listados más concurridos.
+
+asgi.py monta estas rutas delante de la app Flask. Con un worker uvicorn, una
+petición que espera a Postgres (asyncpg) no bloquea al worker: el bucle de
+eventos atiende otras mientras tanto, así que la concurrencia por proceso la
+limita la BD y no el número de workers.
+
+Las consultas y la forma del JSON salen de las mismas funciones y
+serializadores de app.py; aquí solo cambia cómo se ejecutan. El resto de rutas
+(escrituras, exportaciones, admin) sigue en Flask.
+
+/api/stream también vive aquí: cada conexión SSE abierta es una cola en el
+bucle de eventos en lugar de un hilo ocupado.
+
+CORS lo pone el CORSMiddleware de Starlette en cada ruta, con las mismas
+reglas que Flask-CORS; la compresión, CompresionASGI con la negociación de
+compresion.py (brotli o gzip), igual que comprimir_respuesta en app.py. Los motores
+asíncronos se crean en el lifespan de asgi.py (motores()) y las vistas los
+toman de request.state.
+"""
+import asyncio
+import contextlib
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.middleware import Middleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+
+import app as api
+from busqueda import trigramas_instalados
+from cambios import INICIO_SSE, LATIDO_SSE
+from compresion import TAMANO_MINIMO, comprimir, elegir_codificacion, es_comprimible, etag_debil
+from observabilidad import DURACION, PETICIONES, TAMANO
+from replica import error_de_conexion, identidad
+
+
+def url_async(url):
+    """URL de la BD con el driver asíncrono: asyncpg en Postgres, aiosqlite en local"""
+    if url.startswith('postgres://'):  # formato de Heroku/Render
+        url = 'postgresql://' + url[len('postgres://'):]
+    if url.startswith('postgresql://'):
+        # asyncpg llama ssl a lo que libpq llama sslmode
+        return 'postgresql+asyncpg://' + url[len('postgresql://'):].replace('sslmode=', 'ssl=')
+    if url.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + url[len('sqlite://'):]
+    return url
+
+
+@contextlib.asynccontextmanager
+async def motores():
+    """Estado del lifespan: el motor de la primaria y el de la réplica
+    (DATABASE_READ_URL, None si no hay), con las opciones de pool del motor
+    síncrono (DB_POOL_*). Se crean en el bucle de eventos de cada worker, después
+    del fork, y se cierran al apagarlo"""
+    motor = create_async_engine(url_async(api.app.config['SQLALCHEMY_DATABASE_URI'] or ''), **api.opciones_pool())
+    motor_replica = (create_async_engine(url_async(api.URL_REPLICA), **api.opciones_pool())
+                     if api.replica is not None else None)
+    try:
+        # 'busqueda' se llena en la primera búsqueda (ver con_trigramas)
+        yield {'motor': motor, 'motor_replica': motor_replica, 'busqueda': {}}
+    finally:
+        await motor.dispose()
+        if motor_replica is not None:
+            await motor_replica.dispose()
+
+
+_bloqueo_menu = asyncio.Lock()
+
+
+async def _ejecutar(motor_lectura, consulta):
+    async with motor_lectura.connect() as conexion:
+        return (await conexion.execute(consulta)).all()
+
+
+async def leer(request, consulta, replica=True):
+    """Filas de la consulta. De la réplica (su estado lo mantiene api.replica,
+    igual que en Flask) si replica y api.replica lo permiten para ese cliente;
+    si la réplica falla por la conexión, de la primaria"""
+    motor_replica = request.state.motor_replica
+    if replica and motor_replica is not None and api.replica.usar(identidad(
+            request.headers.get('authorization'), request.client.host if request.client else None)):
+        try:
+            return await _ejecutar(motor_replica, consulta)
+        except Exception as e:
+            if not error_de_conexion(e):
+                raise
+            api.replica.caida(e)
+    return await _ejecutar(request.state.motor, consulta)
+
+
+def respuesta_json(datos, estado=200, cabeceras=None):
+    return Response(api.app.json.a_bytes(datos), estado, headers=cabeceras, media_type='application/json')
+
+
+class CompresionASGI:
+    """Lo mismo que comprimir_respuesta de app.py: brotli o gzip según
+    Accept-Encoding para JSON, NDJSON y CSV desde TAMANO_MINIMO, con Vary y el
+    ETag debilitado. Aquí solo hay respuestas de un mensaje que comprimir: las
+    de streaming (el SSE) pasan tal cual"""
+
+    def __init__(self, aplicacion):
+        self.aplicacion = aplicacion
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.aplicacion(scope, receive, send)
+            return
+        aceptadas = Headers(scope=scope).get('accept-encoding')
+        inicio = None
+
+        async def enviar(mensaje):
+            nonlocal inicio
+            if mensaje['type'] == 'http.response.start':
+                inicio = mensaje  # se envía con el primer fragmento del cuerpo
+                return
+            if inicio is not None:
+                if mensaje['type'] == 'http.response.body' and not mensaje.get('more_body', False):
+                    self._comprimir(inicio, mensaje, aceptadas)
+                await send(inicio)
+                inicio = None
+            await send(mensaje)
+
+        await self.aplicacion(scope, receive, enviar)
+
+    @staticmethod
+    def _comprimir(inicio, mensaje, aceptadas):
+        cabeceras = MutableHeaders(raw=inicio['headers'])
+        tipo = cabeceras.get('content-type', '').split(';')[0].strip()
+        if inicio['status'] in (204, 304) or 'content-encoding' in cabeceras or not es_comprimible(tipo):
+            return
+        cabeceras.add_vary_header('Accept-Encoding')
+        codificacion = elegir_codificacion(aceptadas)
+        cuerpo = mensaje.get('body', b'')
+        if codificacion is None or len(cuerpo) < TAMANO_MINIMO:
+            return
+        mensaje['body'] = comprimir(cuerpo, codificacion)
+        cabeceras['Content-Length'] = str(len(mensaje['body']))
+        cabeceras['Content-Encoding'] = codificacion
+        if 'etag' in cabeceras:
+            cabeceras['ETag'] = etag_debil(cabeceras['etag'])
+
+
+# Las mismas reglas que Flask-CORS en /api/* (origen reflejado, con credenciales)
+MIDDLEWARE_RUTAS = [
+    Middleware(CORSMiddleware, allow_origin_regex='.*', allow_credentials=True,
+               allow_methods=['GET'], expose_headers=api.CABECERAS_EXPUESTAS),
+    Middleware(CompresionASGI),
+]
+
+
+def ruta(regla, camino):
+    """Registra la vista con las métricas de observabilidad y el manejo de errores
+    de las rutas Flask (ValueError -> 400, ErrorAutenticacion -> 401/403, resto -> 500)"""
+    def decorador(vista):
+        async def envoltura(request):
+            inicio = time.perf_counter()
+            try:
+                respuesta = await vista(request)
+            except api.ErrorAutenticacion as e:
+                respuesta = respuesta_json({'error': str(e)}, e.estado)
+            except ValueError as e:
+                respuesta = respuesta_json({'error': str(e)}, 400)
+            except Exception as e:
+                api.logger.exception("Error en lectura asíncrona", extra={'datos': {'endpoint': regla}})
+                respuesta = respuesta_json({'error': str(e)}, 500)
+            DURACION.labels(regla, request.method).observe(time.perf_counter() - inicio)
+            PETICIONES.labels(regla, request.method, str(respuesta.status_code)).inc()
+            if hasattr(respuesta, 'body'):  # las respuestas en streaming no tienen tamaño fijo
+                TAMANO.labels(regla).observe(len(respuesta.body))
+            return respuesta
+        return Route(camino, envoltura, methods=['GET'], middleware=MIDDLEWARE_RUTAS)
+    return decorador
+
+
+def argumentos(request):
+    # MultiDict de werkzeug: las funciones compartidas usan args.get(..., type=int)
+    return MultiDict(request.query_params.multi_items())
+
+
+async def snapshot_menu(request):
+    """Como CacheMenu.actual(), sin bloquear el bucle mientras se consulta.
+    Lee de la primaria: la versión del snapshot tiene que ver todas las escrituras"""
+    snapshot = api.menu_cache.vigente()
+    if snapshot is None:
+        async with _bloqueo_menu:
+            snapshot = api.menu_cache.vigente()
+            if snapshot is None:
+                version = api.menu_cache.version_compartida()
+                platos = await leer(request, api.consulta_platos(), replica=False)
+                categorias = await leer(request, api.consulta_categorias(), replica=False)
+                snapshot = api.menu_cache.guardar(version, {
+                    'platos': api.PLATO_JSON.lista(platos),
+                    'categorias': api.CATEGORIA_JSON.lista(categorias),
+                })
+    return snapshot
+
+
+@ruta('/api/platos', '/api/platos')
+async def obtener_platos(request):
+    serializador = api.serializador_pedido(api.PLATO_JSON, argumentos(request))
+    snapshot = await snapshot_menu(request)
+    if serializador is api.PLATO_JSON:
+        serializado = snapshot['platos']
+    else:
+        clave = ('platos', serializador.etiquetas)
+        serializado = api.menu_cache.variante(snapshot, clave) or api.menu_cache.guardar_variante(
+            snapshot, clave,
+            serializador.lista(await leer(request, api.consulta_platos(serializador), replica=False)))
+    cuerpo, etag, version = serializado
+    cabeceras = {'ETag': f'"{etag}"', 'X-Menu-Version': str(version), 'Cache-Control': 'no-cache'}
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+        return Response(status_code=304, headers=cabeceras)
+    return Response(cuerpo, headers=cabeceras, media_type='application/json')
+
+
+@ruta('/api/mesas', '/api/mesas')
+async def obtener_mesas(request):
+    serializador = api.serializador_pedido(api.MESA_JSON, argumentos(request))
+    return respuesta_json(serializador.lista(await leer(request, api.consulta_mesas(serializador))))
+
+
+@ruta('/api/reservas', '/api/reservas')
+async def obtener_reservas(request):
+    args = argumentos(request)
+    limite = api.leer_limite(args)
+    serializador = api.serializador_reservas(api.usuario_opcional(request.headers.get('authorization', '')), args)
+    filas, cursor = api.paginar(await leer(request, api.consulta_reservas(args, limite, serializador)), limite,
+                                api.clave_cursor_reserva)
+    return respuesta_json(serializador.lista(filas), cabeceras={'X-Next-Cursor': cursor} if cursor else None)
+
+
+@ruta('/api/asistencia/mis-registros/<int:usuario_id>', '/api/asistencia/mis-registros/{usuario_id:int}')
+async def obtener_mis_registros(request):
+    usuario = api.usuario_del_token(request.headers.get('authorization', ''))
+    usuario_id = request.path_params['usuario_id']
+    if not api.puede_acceder_a(usuario_id, usuario):
+        return respuesta_json({'error': 'No tienes permisos para esta acción'}, 403)
+    serializador = api.serializador_pedido(api.ASISTENCIA_JSON, argumentos(request))
+    return respuesta_json(serializador.lista(
+        await leer(request, api.consulta_mis_registros(usuario_id, serializador))))
+
+
+async def con_trigramas(request):
+    """Como api.busqueda_con_trigramas(), con el motor asíncrono: se consulta
+    en la primera búsqueda del worker y queda en el estado del lifespan (un
+    error no se guarda y se reintenta en la siguiente)"""
+    motor = request.state.motor
+    if motor.dialect.name != 'postgresql':
+        return False
+    estado = request.state.busqueda
+    if 'trigramas' not in estado:
+        async with motor.connect() as conexion:
+            estado['trigramas'] = await conexion.run_sync(trigramas_instalados)
+    return estado['trigramas']
+
+
+async def respuesta_busqueda(request, modelo, serializador_base):
+    args = argumentos(request)
+    serializador = api.serializador_pedido(serializador_base, args)
+    trigramas = await con_trigramas(request)
+    consulta = api.consulta_busqueda(modelo, serializador, request.state.motor.dialect.name, args, trigramas)
+    if consulta is None:
+        return respuesta_json([])
+    return respuesta_json(serializador.lista(await leer(request, consulta)))
+
+
+@ruta('/api/platos/buscar', '/api/platos/buscar')
+async def buscar_platos(request):
+    return await respuesta_busqueda(request, api.Plato, api.PLATO_JSON)
+
+
+@ruta('/api/clientes/buscar', '/api/clientes/buscar')
+async def buscar_clientes(request):
+    api.usuario_del_token(request.headers.get('authorization', ''))
+    return await respuesta_busqueda(request, api.Cliente, api.CLIENTE_JSON)
+
+
+@ruta('/api/stream', '/api/stream')
+async def stream_cambios(request):
+    preparar = api.filtro_stream(argumentos(request))
+    bucle = asyncio.get_running_loop()
+    cola = asyncio.Queue(api.COLA_STREAM)
+
+    def encolar(mensaje):
+        try:
+            cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo pendiente y se cierra; al reconectar recarga
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait(None)
+
+    def entregar(evento, carga):  # desde el hilo que hizo el commit o el de LISTEN
+        mensaje = preparar(evento, carga)
+        if mensaje:
+            bucle.call_soon_threadsafe(encolar, mensaje)
+
+    async def generar():
+        clave = api.feed_cambios.suscribir(entregar)
+        try:
+            yield INICIO_SSE
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(cola.get(), api.LATIDO_STREAM)
+                except asyncio.TimeoutError:
+                    mensaje = LATIDO_SSE
+                if mensaje is None:
+                    return
+                yield mensaje
+        finally:
+            api.feed_cambios.desuscribir(clave)
+
+    return StreamingResponse(generar(), media_type='text/event-stream', headers=api.CABECERAS_STREAM)
+
+
+rutas = [obtener_platos, obtener_mesas, obtener_reservas, obtener_mis_registros, buscar_platos, buscar_clientes,
+         stream_cambios]
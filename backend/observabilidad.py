@@ -0,0 +1,148 @@
+"""Logging estructurado y métricas Prometheus de la API.
+
+Con gunicorn, gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR antes de crear
+los workers: cada worker escribe sus métricas ahí y /metrics las suma todas.
+Sin esa variable (servidor de desarrollo) se usa el registro del proceso.
+
+/metrics pide 'Authorization: Bearer <METRICS_TOKEN>'; sin METRICS_TOKEN
+definido la ruta no existe (404), así las métricas nunca quedan públicas.
+"""
+import atexit
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+from flask import Response, abort, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ===== LOGGING =====
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro; los datos extra van en extra={'datos': {...}}"""
+
+    def format(self, registro):
+        linea = {
+            'ts': round(registro.created, 3),
+            'nivel': registro.levelname,
+            'logger': registro.name,
+            'mensaje': registro.getMessage(),
+        }
+        if isinstance(getattr(registro, 'datos', None), dict):
+            linea.update(registro.datos)
+        if registro.exc_info:
+            linea['excepcion'] = self.formatException(registro.exc_info)
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+def configurar_logging():
+    """Logger 'restaurante' con nivel de LOG_LEVEL. El handler solo encola el
+    registro; un hilo aparte lo escribe, así la petición nunca espera por stdout"""
+    logger = logging.getLogger('restaurante')
+    if logger.handlers:
+        return logger
+    logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    logger.propagate = False
+
+    salida = logging.StreamHandler()
+    salida.setFormatter(FormatoJSON())
+    cola = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(cola))
+    oyente = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    oyente.start()
+    atexit.register(oyente.stop)
+    return logger
+
+
+# ===== MÉTRICAS =====
+
+BUCKETS_LATENCIA = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+BUCKETS_TAMANO = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+DURACION = Histogram('http_request_duration_seconds', 'Latencia de las peticiones',
+                     ['endpoint', 'method'], buckets=BUCKETS_LATENCIA)
+PETICIONES = Counter('http_requests_total', 'Peticiones atendidas',
+                     ['endpoint', 'method', 'status'])
+TAMANO = Histogram('http_response_size_bytes', 'Tamaño del cuerpo de la respuesta',
+                   ['endpoint'], buckets=BUCKETS_TAMANO)
+CONSULTAS = Histogram('db_queries_per_request', 'Sentencias SQL por petición',
+                      ['endpoint'], buckets=BUCKETS_CONSULTAS)
+TIEMPO_SQL = Histogram('db_query_seconds_per_request', 'Tiempo total en SQL por petición',
+                       ['endpoint'], buckets=BUCKETS_LATENCIA)
+
+
+def _endpoint():
+    # La regla (/api/reservas/<int:id>) y no la URL, para no disparar la cardinalidad
+    return request.url_rule.rule if request.url_rule else 'sin_ruta'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_de_sql(conexion, cursor, sentencia, parametros, contexto, executemany):
+    conexion.info.setdefault('inicios_sql', []).append(time.perf_counter())
+
+
+def _medir_sql(inicio):
+    if has_request_context() and 'sql_consultas' in g:
+        g.sql_consultas += 1
+        g.sql_tiempo += time.perf_counter() - inicio
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _despues_de_sql(conexion, cursor, sentencia, parametros, contexto, executemany):
+    _medir_sql(conexion.info['inicios_sql'].pop())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _error_de_sql(contexto):
+    # Una sentencia que falla no llega a after_cursor_execute: sin esto su inicio
+    # quedaría en la conexión (que vuelve al pool) y desfasaría las siguientes
+    if contexto.connection is None:  # falló al conectar: no hubo sentencia
+        return
+    inicios = contexto.connection.info.pop('inicios_sql', None)
+    if inicios:
+        _medir_sql(inicios[-1])
+
+
+def instrumentar(app):
+    """Registra los hooks de métricas y la ruta /metrics"""
+
+    @app.before_request
+    def _iniciar_medicion():
+        g.inicio_peticion = time.perf_counter()
+        g.sql_consultas = 0
+        g.sql_tiempo = 0.0
+
+    @app.after_request
+    def _registrar_medicion(respuesta):
+        if 'inicio_peticion' not in g:
+            return respuesta
+        endpoint = _endpoint()
+        DURACION.labels(endpoint, request.method).observe(time.perf_counter() - g.inicio_peticion)
+        PETICIONES.labels(endpoint, request.method, str(respuesta.status_code)).inc()
+        if respuesta.content_length is not None:  # las respuestas en streaming no tienen tamaño
+            TAMANO.labels(endpoint).observe(respuesta.content_length)
+        CONSULTAS.labels(endpoint).observe(g.sql_consultas)
+        TIEMPO_SQL.labels(endpoint).observe(g.sql_tiempo)
+        return respuesta
+
+    @app.route('/metrics')
+    def metricas():
+        """Métricas en formato de texto Prometheus, sumadas entre workers"""
+        token = os.getenv('METRICS_TOKEN')
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return Response('Token de métricas inválido\n', 401, {'WWW-Authenticate': 'Bearer'})
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            registro = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registro)
+        else:
+            registro = REGISTRY
+        return Response(generate_latest(registro), mimetype=CONTENT_TYPE_LATEST)
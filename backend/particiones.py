@@ -0,0 +1,221 @@
+"""Particionado mensual por rango (PostgreSQL) de las tablas que solo crecen.
+
+reservas se parte por fecha_hora y asistencias por fecha, una partición por
+mes: reservas_p2026_10 guarda [2026-10-01, 2026-11-01). Las consultas con
+rango de fechas (los últimos 7 o 30 días de asistencia, las reservas de un
+día) solo leen las particiones que cruzan, y los meses viejos se archivan
+sin tocar los recientes.
+
+- convertir(): pasa una tabla normal a particionada copiando sus filas. Una
+  sola vez, a mano (flask particionar-tablas) y en una ventana de
+  mantenimiento: la tabla queda bloqueada (ACCESS EXCLUSIVE, ni lecturas ni
+  escrituras) mientras se copian todas sus filas.
+- asegurar(): crea las particiones del mes actual y los siguientes. La
+  partición por defecto recibe lo que cae fuera (una reserva para dentro de
+  dos años, una carga de datos históricos); asegurar() también le saca esos
+  meses a particiones propias. La corre inicializar-db en cada despliegue y
+  flask mantener-particiones desde un cron, no los workers.
+- archivar(): quita un mes de la tabla. Lo mueve al esquema `archivo` (sigue
+  consultable a mano) o lo exporta a un CSV gzip y lo borra.
+
+La clave primaria pasa a ser (id, columna): Postgres exige que los índices
+únicos de una tabla particionada incluyan la columna de partición. El id
+sigue siendo único porque sale de la misma secuencia.
+"""
+import csv
+import gzip
+import io
+import logging
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+ESQUEMA_ARCHIVO = 'archivo'
+CLAVE_BLOQUEO = 7_203_115  # pg_advisory_xact_lock de asegurar(): un proceso a la vez
+FILAS_POR_LOTE = 5000
+_MES = re.compile(r'_p(\d{4})_(\d{2})$')
+
+logger = logging.getLogger('restaurante')
+
+
+def mes_de(fecha):
+    return date(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(mes, meses):
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nombre_particion(tabla, mes):
+    return f'{tabla}_p{mes:%Y_%m}'
+
+
+def particion_defecto(tabla):
+    return f'{tabla}_pdefecto'
+
+
+def mes_de_particion(tabla, nombre):
+    """Mes de la partición `nombre` de `tabla`; None si no es una partición mensual suya"""
+    coincidencia = _MES.search(nombre)
+    if coincidencia and nombre == f'{tabla}{coincidencia.group(0)}':
+        return date(int(coincidencia[1]), int(coincidencia[2]), 1)
+    return None
+
+
+def rango(mes):
+    """[desde, hasta) de la partición de `mes`"""
+    return mes, sumar_meses(mes, 1)
+
+
+def meses_siguientes(hoy, meses_adelante):
+    """El mes de hoy y los `meses_adelante` siguientes"""
+    actual = mes_de(hoy)
+    return [sumar_meses(actual, n) for n in range(meses_adelante + 1)]
+
+
+def meses_por_archivar(meses, hoy, conservar_meses):
+    """Los meses anteriores a los últimos `conservar_meses` (más el actual)"""
+    limite = sumar_meses(mes_de(hoy), -conservar_meses)
+    return [mes for mes in meses if mes < limite]
+
+
+def particionada(conexion, tabla):
+    return conexion.execute(
+        text('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)'), {'tabla': tabla}
+    ).first() is not None
+
+
+def meses_particionados(conexion, tabla):
+    """Meses con partición propia, en orden (sin la de defecto)"""
+    nombres = conexion.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:tabla)
+    """), {'tabla': tabla}).scalars()
+    return sorted(mes for mes in (mes_de_particion(tabla, nombre) for nombre in nombres) if mes)
+
+
+def meses_con_filas(conexion, tabla, columna):
+    return [mes_de(m) for m in conexion.exec_driver_sql(
+        f"SELECT DISTINCT date_trunc('month', {columna}) FROM {tabla}"
+    ).scalars()]
+
+
+def _rango(mes):
+    desde, hasta = rango(mes)
+    return f"FROM ('{desde.isoformat()}') TO ('{hasta.isoformat()}')"
+
+
+def crear_mes(conexion, tabla, columna, mes):
+    """Partición de `mes` con las filas de ese mes que hubiera en la de defecto"""
+    particion, defecto = nombre_particion(tabla, mes), particion_defecto(tabla)
+    # Bloquear la de defecto primero: un INSERT del mes que llegue entre el
+    # DELETE y el ATTACH haría fallar la validación del ATTACH
+    conexion.exec_driver_sql(f'LOCK TABLE {defecto} IN ACCESS EXCLUSIVE MODE')
+    conexion.exec_driver_sql(f'CREATE TABLE {particion} (LIKE {tabla} INCLUDING DEFAULTS)')
+    conexion.execute(text(f"""
+        WITH movidas AS (
+            DELETE FROM {defecto} WHERE {columna} >= :desde AND {columna} < :hasta RETURNING *
+        )
+        INSERT INTO {particion} SELECT * FROM movidas
+    """), dict(zip(('desde', 'hasta'), rango(mes))))
+    conexion.exec_driver_sql(f'ALTER TABLE {tabla} ATTACH PARTITION {particion} FOR VALUES {_rango(mes)}')
+
+
+def asegurar(conexion, tabla, columna, meses_adelante, hoy):
+    """Crea las particiones que falten: del mes de hoy a `meses_adelante` meses
+    después, y las de los meses con filas en la de defecto. Devuelve los meses
+    creados ([] si la tabla no está particionada u otro proceso está en ello)"""
+    if not particionada(conexion, tabla):
+        return []
+    if not conexion.execute(text('SELECT pg_try_advisory_xact_lock(:clave)'), {'clave': CLAVE_BLOQUEO}).scalar():
+        return []
+    existentes = set(meses_particionados(conexion, tabla))
+    faltan = set(meses_siguientes(hoy, meses_adelante))
+    faltan.update(meses_con_filas(conexion, particion_defecto(tabla), columna))
+    creados = sorted(faltan - existentes)
+    for mes in creados:
+        crear_mes(conexion, tabla, columna, mes)
+    return creados
+
+
+def convertir(conexion, tabla, columna, meses_adelante, hoy):
+    """Reemplaza la tabla normal `tabla` (Table de SQLAlchemy) por una
+    particionada por mes de `columna` con las mismas filas, índices, claves
+    foráneas y secuencia. False si ya estaba particionada"""
+    nombre = tabla.name
+    if particionada(conexion, nombre):
+        return False
+    nueva = f'{nombre}_particionada'
+    conexion.exec_driver_sql(f'LOCK TABLE {nombre} IN ACCESS EXCLUSIVE MODE')
+    conexion.exec_driver_sql(
+        f'CREATE TABLE {nueva} (LIKE {nombre} INCLUDING DEFAULTS, PRIMARY KEY (id, {columna})) '
+        f'PARTITION BY RANGE ({columna})'
+    )
+    conexion.exec_driver_sql(f'CREATE TABLE {particion_defecto(nombre)} PARTITION OF {nueva} DEFAULT')
+    meses = set(meses_con_filas(conexion, nombre, columna))
+    meses.update(meses_siguientes(hoy, meses_adelante))
+    for mes in sorted(meses):
+        conexion.exec_driver_sql(
+            f'CREATE TABLE {nombre_particion(nombre, mes)} PARTITION OF {nueva} FOR VALUES {_rango(mes)}'
+        )
+    conexion.exec_driver_sql(f'INSERT INTO {nueva} SELECT * FROM {nombre}')
+
+    # LIKE no copia las claves foráneas; la secuencia del id se borraría con la tabla vieja
+    foraneas = conexion.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(:tabla) AND contype = 'f'
+    """), {'tabla': nombre}).all()
+    for restriccion, definicion in foraneas:
+        conexion.exec_driver_sql(f'ALTER TABLE {nueva} ADD CONSTRAINT {restriccion} {definicion}')
+    secuencia = conexion.execute(text("SELECT pg_get_serial_sequence(:tabla, 'id')"), {'tabla': nombre}).scalar()
+    if secuencia:
+        conexion.exec_driver_sql(f'ALTER SEQUENCE {secuencia} OWNED BY {nueva}.id')
+
+    conexion.exec_driver_sql(f'DROP TABLE {nombre}')
+    conexion.exec_driver_sql(f'ALTER TABLE {nueva} RENAME TO {nombre}')
+    conexion.exec_driver_sql(f'ALTER TABLE {nombre} RENAME CONSTRAINT {nueva}_pkey TO {nombre}_pkey')
+    for indice in tabla.indexes:  # en la tabla particionada se crean en cada partición
+        indice.create(bind=conexion)
+    return True
+
+
+def exportar(conexion, tabla, ruta):
+    """Escribe las filas de `tabla` en un CSV gzip con encabezado. El archivo se
+    escribe aparte, se sincroniza a disco y se renombra; devuelve las filas"""
+    resultado = conexion.execution_options(yield_per=FILAS_POR_LOTE).exec_driver_sql(f'SELECT * FROM {tabla}')
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    filas = 0
+    with open(temporal, 'wb') as crudo:
+        with gzip.GzipFile(fileobj=crudo, mode='wb') as comprimido, \
+                io.TextIOWrapper(comprimido, encoding='utf-8', newline='') as salida:
+            escritor = csv.writer(salida)
+            escritor.writerow(resultado.keys())
+            for fila in resultado:
+                escritor.writerow(fila)
+                filas += 1
+        crudo.flush()
+        os.fsync(crudo.fileno())
+    os.replace(temporal, ruta)
+    return filas
+
+
+def archivar(conexion, tabla, mes, directorio=None):
+    """Quita la partición de `mes` de la tabla. Sin directorio la mueve al
+    esquema archivo; con directorio la exporta a directorio/<partición>.csv.gz
+    y la borra. Devuelve el destino. Si algo falla la transacción se revierte
+    y la partición vuelve a su lugar"""
+    particion = nombre_particion(tabla, mes)
+    conexion.exec_driver_sql(f'ALTER TABLE {tabla} DETACH PARTITION {particion}')
+    if directorio is None:
+        conexion.exec_driver_sql(f'CREATE SCHEMA IF NOT EXISTS {ESQUEMA_ARCHIVO}')
+        conexion.exec_driver_sql(f'ALTER TABLE {particion} SET SCHEMA {ESQUEMA_ARCHIVO}')
+        return f'{ESQUEMA_ARCHIVO}.{particion}'
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f'{particion}.csv.gz')
+    exportar(conexion, particion, ruta)
+    conexion.exec_driver_sql(f'DROP TABLE {particion}')
+    return ruta
+
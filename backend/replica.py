@@ -0,0 +1,194 @@
+"""Réplica de lectura opcional (DATABASE_READ_URL) para las rutas GET.
+
+app.py marca la sesión de las rutas de lectura con la réplica y SesionEnrutada
+manda sus SELECT a ese motor; cualquier escritura (flush, INSERT, UPDATE) sigue
+yendo a la primaria. Se vuelve a la primaria cuando:
+
+- el cliente escribió hace menos de `ventana` segundos (lee lo que escribió);
+- la réplica está caída o su retraso supera `retraso_maximo` según el último
+  chequeo del hilo de fondo;
+- una consulta en la réplica falla por la conexión: se repite en la primaria
+  y la réplica queda fuera hasta el siguiente chequeo correcto.
+
+Las marcas de escritura son archivos en un directorio compartido por los
+workers (como la versión del menú); entre instancias que no comparten disco
+solo cubre el retraso máximo.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, text
+from sqlalchemy.exc import DBAPIError
+
+_REPLICA = 'replica'
+
+# Segundos de retraso de la réplica: 0 si ya aplicó todo lo recibido (una
+# primaria sin escrituras no cuenta como retraso)
+RETRASO_PG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+logger = logging.getLogger('restaurante')
+
+
+def error_de_conexion(error):
+    """Errores por los que tiene sentido repetir la consulta en la primaria"""
+    if isinstance(error, OSError):  # el driver asíncrono puede no envolver el fallo al conectar
+        return True
+    return isinstance(error, DBAPIError) and (error.connection_invalidated or
+                                             type(error.orig).__name__ in ('OperationalError', 'InterfaceError'))
+
+
+def identidad(autorizacion, direccion):
+    """Quién escribe y lee, para leer lo propio: su token si lo manda y si no su
+    IP ya resuelta por los proxies de confianza (request.remote_addr en Flask,
+    request.client en asgi.py). Nunca la cabecera X-Forwarded-For tal cual: sus
+    primeras entradas las pone el cliente"""
+    return autorizacion or direccion or ''
+
+
+class MarcasEscritura:
+    """Última escritura de cada cliente, como mtime de un archivo por cliente"""
+
+    PURGAR_CADA = 200  # marcas entre limpiezas del directorio
+
+    def __init__(self, directorio, ventana):
+        self.directorio = directorio
+        self.ventana = ventana
+        self._marcas = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, identidad):
+        return os.path.join(self.directorio, hashlib.sha256(identidad.encode()).hexdigest()[:32])
+
+    def marcar(self, identidad):
+        ruta = self._ruta(identidad)
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            open(ruta, 'w').close()
+        self._marcas += 1
+        if self._marcas % self.PURGAR_CADA == 0:
+            self.purgar()
+
+    def reciente(self, identidad):
+        try:
+            return time.time() - os.stat(self._ruta(identidad)).st_mtime < self.ventana
+        except FileNotFoundError:
+            return False
+
+    def purgar(self):
+        limite = time.time() - self.ventana
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.stat().st_mtime < limite:
+                        os.remove(entrada.path)
+                except FileNotFoundError:
+                    pass  # la borró otro worker
+
+
+class Replica:
+    """Motor de la réplica más su estado, refrescado en un hilo de fondo"""
+
+    def __init__(self, motor, marcas, retraso_maximo, intervalo):
+        self.motor = motor
+        self.marcas = marcas
+        self.retraso_maximo = retraso_maximo
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._pid = None
+        self.estado = {'status': 'starting'}
+
+    def iniciar(self):
+        """Arranca el hilo una vez por proceso (después del fork de gunicorn)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._ciclo, name='monitor-replica', daemon=True).start()
+
+    def _ciclo(self):
+        while True:
+            self.refrescar()
+            time.sleep(self.intervalo)
+
+    def refrescar(self):
+        try:
+            with self.motor.connect() as conexion:
+                if self.motor.dialect.name == 'postgresql':
+                    retraso = float(conexion.execute(RETRASO_PG).scalar())
+                else:
+                    conexion.execute(text('SELECT 1'))
+                    retraso = 0.0
+            status = 'ok' if retraso <= self.retraso_maximo else 'atrasada'
+            estado = {'status': status, 'retraso_s': round(retraso, 2)}
+        except Exception as e:
+            estado = {'status': 'error', 'detail': str(e)}
+        estado['verificado_en'] = time.time()
+        self.estado = estado
+
+    def caida(self, error):
+        """Saca la réplica de servicio hasta el siguiente chequeo"""
+        logger.warning("Réplica de lectura no disponible; leyendo de la primaria",
+                       extra={'datos': {'error': str(error)}})
+        self.estado = {'status': 'error', 'detail': str(error), 'verificado_en': time.time()}
+
+    def disponible(self):
+        estado = self.estado
+        return (estado['status'] == 'ok'
+                and time.time() - estado['verificado_en'] < 3 * self.intervalo)
+
+    def usar(self, identidad):
+        """True si la lectura de este cliente puede ir a la réplica"""
+        self.iniciar()
+        return self.disponible() and not self.marcas.reciente(identidad)
+
+    def vigente(self):
+        estado = dict(self.estado)
+        if 'verificado_en' in estado:
+            estado['antiguedad_s'] = round(time.time() - estado.pop('verificado_en'), 1)
+        return estado
+
+
+class SesionEnrutada(Session):
+    """Sesión de Flask-SQLAlchemy que manda los SELECT a la réplica cuando la
+    petición la marcó con leer_de(sesion, replica)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get(_REPLICA)
+        if bind is None and replica is not None and isinstance(clause, Select):
+            return replica.motor
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+    def execute(self, statement, *args, **kwargs):
+        replica = self.info.get(_REPLICA)
+        if replica is None:
+            return super().execute(statement, *args, **kwargs)
+        try:
+            return super().execute(statement, *args, **kwargs)
+        except DBAPIError as e:
+            if not error_de_conexion(e):
+                raise
+            replica.caida(e)
+            self.rollback()
+            self.info.pop(_REPLICA, None)
+            return super().execute(statement, *args, **kwargs)
+
+
+def leer_de(sesion, replica):
+    """Las consultas siguientes de la sesión (hasta dejar_de_leer) van a la réplica"""
+    sesion.info[_REPLICA] = replica
+
+
+def dejar_de_leer(sesion):
+    """Devuelve la sesión a la primaria; la marca vive en la sesión y no en la petición"""
+    sesion.info.pop(_REPLICA, None)
@@ -0,0 +1,171 @@
+"""Serialización JSON de la API.
+
+ProveedorJSON reemplaza al proveedor de Flask: codifica con orjson si está
+instalado (y con json de la biblioteca estándar si no), escribe fechas en
+ISO 8601 y respeta el orden de claves declarado.
+
+Serializador declara una sola vez qué columnas lee una respuesta y con qué
+nombre salen en el JSON. De esa declaración salen la proyección del SELECT
+(Serializador.columnas) y una función compilada que pasa cada fila a dict
+leyendo por posición, sin isoformat ni lógica por campo en cada fila.
+Serializador.subconjunto() hace lo mismo con solo parte de los campos
+(?fields=), así que las columnas que no se piden tampoco se consultan.
+
+El dict intermedio por fila es a propósito. orjson no sabe codificar una fila
+(tupla) como objeto con nombres: escribir el JSON directamente exige un
+orjson.dumps por valor y concatenar bytes en Python, y eso resultó más lento
+que armar los dicts y codificar la página en una sola llamada a C (500 filas de
+reservas: 0.66 ms con dicts contra 1.0 ms directo; en asistencias la
+diferencia es menor a 0.5 ms a favor de lo directo). Además los dicts son lo
+que guardan menu_cache y sus variantes y lo que necesita el json estándar
+cuando orjson no está instalado.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional: sin ella se usa json de la biblioteca estándar
+    orjson = None
+
+
+def _por_defecto(valor):
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return DefaultJSONProvider.default(valor)
+
+
+class ProveedorJSON(DefaultJSONProvider):
+    """Proveedor JSON de la app (app.json); a_bytes() evita pasar por str"""
+
+    sort_keys = False  # el orden lo fija cada Serializador
+    default = staticmethod(_por_defecto)
+
+    def _indentar(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def a_bytes(self, obj, indentar=False):
+        if orjson is None:
+            return super().dumps(obj, indent=2 if indentar else None).encode()
+        opciones = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indentar else 0)
+        return orjson.dumps(obj, default=self.default, option=opciones)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.a_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.a_bytes(obj, self._indentar()), mimetype=self.mimetype)
+
+
+class Calculado:
+    """Campo que pasa el valor de la columna por una función antes de publicarlo"""
+
+    def __init__(self, funcion, columna):
+        self.funcion = funcion
+        self.columna = columna
+
+
+def _hora(valor):
+    return valor.time().replace(microsecond=0) if valor is not None else None
+
+
+def hora(columna):
+    """Columna DateTime publicada solo como HH:MM:SS"""
+    return Calculado(_hora, columna)
+
+
+class Serializador:
+    """Serializador declarativo: Serializador(id=Modelo.id, otro={'id': Otro.id}, ...).
+
+    columnas: proyección para db.select(*columnas), etiquetada con el nombre del
+    campo ('otro_id' en los anidados) para poder leer fila.id en los cursores.
+    modelos: modelos de los que lee alguna columna (para saber qué JOIN hace falta).
+    serializar(fila): dict de la fila; lista(filas): lista de dicts."""
+
+    MAXIMO_SUBCONJUNTOS = 64  # combinaciones de ?fields= compiladas que se guardan
+
+    def __init__(self, **campos):
+        self.campos = campos
+        self.columnas = []
+        self.modelos = set()
+        self._subconjuntos = {}
+        entorno = {}
+        codigo = f'def serializar(f):\n    return {self._compilar(campos, "", entorno)}\n'
+        exec(codigo, entorno)
+        self.serializar = entorno['serializar']
+
+    def _compilar(self, campos, prefijo, entorno):
+        partes = []
+        for nombre, valor in campos.items():
+            if isinstance(valor, dict):
+                expresion = self._compilar(valor, f'{prefijo}{nombre}_', entorno)
+            else:
+                indice = len(self.columnas)
+                expresion = f'f[{indice}]'
+                if isinstance(valor, Calculado):
+                    entorno[f'_funcion{indice}'] = valor.funcion
+                    expresion = f'_funcion{indice}({expresion})'
+                    valor = valor.columna
+                self.modelos.add(valor.class_)
+                self.columnas.append(valor.label(f'{prefijo}{nombre}'))
+            partes.append(f'{nombre!r}: {expresion}')
+        return '{' + ', '.join(partes) + '}'
+
+    def lista(self, filas):
+        return list(map(self.serializar, filas))
+
+    @property
+    def etiquetas(self):
+        """Nombres de las columnas en orden; identifican el conjunto de campos"""
+        return tuple(columna.name for columna in self.columnas)
+
+    def columnas_con(self, **necesarias):
+        """columnas más las necesarias (p. ej. la clave del cursor) que el
+        serializador no incluye; van al final, así que no mueven los índices"""
+        return self.columnas + [columna.label(nombre) for nombre, columna in necesarias.items()
+                                if nombre not in self.etiquetas]
+
+    def subconjunto(self, nombres):
+        """Serializador con solo los campos pedidos, en el orden declarado:
+        'cliente' incluye el objeto completo y 'cliente.nombre' solo ese campo.
+        ValueError si alguno no existe"""
+        clave = frozenset(nombre.strip() for nombre in nombres if nombre.strip())
+        if not clave:
+            raise ValueError('fields no puede estar vacío')
+        subconjunto = self._subconjuntos.get(clave)
+        if subconjunto is None:
+            desconocidos = sorted(clave - set(self._rutas(self.campos, '')))
+            if desconocidos:
+                raise ValueError(f"Campos desconocidos en fields: {', '.join(desconocidos)}")
+            subconjunto = Serializador(**self._filtrar(self.campos, clave, ''))
+            if len(self._subconjuntos) < self.MAXIMO_SUBCONJUNTOS:
+                self._subconjuntos[clave] = subconjunto
+        return subconjunto
+
+    def _filtrar(self, campos, pedidos, prefijo):
+        elegidos = {}
+        for nombre, valor in campos.items():
+            ruta = prefijo + nombre
+            if ruta in pedidos:
+                elegidos[nombre] = valor
+            elif isinstance(valor, dict) and any(p.startswith(ruta + '.') for p in pedidos):
+                elegidos[nombre] = self._filtrar(valor, pedidos, ruta + '.')
+        return elegidos
+
+    def _rutas(self, campos, prefijo):
+        for nombre, valor in campos.items():
+            yield prefijo + nombre
+            if isinstance(valor, dict):
+                yield from self._rutas(valor, prefijo + nombre + '.')
@@ -0,0 +1,84 @@
+"""Fixtures de las pruebas: la app sobre SQLite en memoria, tablas nuevas en cada prueba"""
+import asyncio
+import contextvars
+import os
+import sys
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.setdefault('SECRET_KEY', 'clave-de-pruebas')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app as modulo_app
+
+
+@pytest.fixture
+def app():
+    with modulo_app.app.app_context():
+        modulo_app.db.create_all()
+        yield modulo_app.app
+        modulo_app.db.session.remove()
+        modulo_app.db.drop_all()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def token_admin():
+    return {'Authorization': 'Bearer ' + modulo_app.emitir_tokens({'id': 0, 'rol': 'admin'})['token']}
+
+
+class RespuestaASGI:
+    def __init__(self, estado, cabeceras, cuerpo):
+        self.status_code = estado
+        self.headers = cabeceras
+        self.data = cuerpo
+
+
+async def _pedir_asgi(aplicacion, estado, ruta, cabeceras):
+    camino, _, consulta = ruta.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': camino, 'raw_path': camino.encode(), 'query_string': consulta.encode(),
+        'root_path': '', 'headers': [(k.lower().encode(), v.encode()) for k, v in (cabeceras or {}).items()],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80), 'state': dict(estado),
+    }
+    mensajes = []
+
+    async def recibir():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def enviar(mensaje):
+        mensajes.append(mensaje)
+
+    await aplicacion(scope, recibir, enviar)
+    inicio = next(m for m in mensajes if m['type'] == 'http.response.start')
+    cuerpo = b''.join(m.get('body', b'') for m in mensajes if m['type'] == 'http.response.body')
+    return RespuestaASGI(inicio['status'], {k.decode(): v.decode() for k, v in inicio['headers']}, cuerpo)
+
+
+@pytest.fixture
+def asgi(app):
+    """asgi(preparar, *peticiones): corre el lifespan de asgi.aplicacion (motores
+    asíncronos sobre otra SQLite en memoria), espera preparar(estado) si se pasa
+    y hace las peticiones GET (ruta o (ruta, cabeceras)) fuera del contexto de
+    app Flask de la prueba. Devuelve las respuestas"""
+    from asgi import aplicacion
+
+    def pedir(preparar, *peticiones):
+        async def ejecutar():
+            async with aplicacion.router.lifespan_context(aplicacion) as estado:
+                async with estado['motor'].begin() as conexion:
+                    await conexion.run_sync(modulo_app.db.metadata.create_all)
+                if preparar is not None:
+                    await preparar(estado)
+                return [await _pedir_asgi(aplicacion, estado, *((p, None) if isinstance(p, str) else p))
+                        for p in peticiones]
+        # Sin el contexto de app Flask de la prueba, como en un worker uvicorn
+        return contextvars.Context().run(asyncio.run, ejecutar())
+    return pedir
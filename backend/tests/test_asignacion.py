@@ -0,0 +1,68 @@
+from datetime import date, datetime, timedelta
+
+from asignacion import Mesa, Reserva, asignar
+import app as modulo_app
+from app import Cliente, Mesa as MesaBD, Reserva as ReservaBD, asignar_mesas, db
+
+DURACION = timedelta(hours=2)
+HORA = datetime(2030, 1, 1, 20)
+
+
+def cruces(filas):
+    """Pares de reservas en la misma mesa cuyos intervalos se cruzan"""
+    por_mesa = {}
+    for id_, mesa_id, inicio in filas:
+        por_mesa.setdefault(mesa_id, []).append((inicio, id_))
+    pares = []
+    for reservas in por_mesa.values():
+        reservas.sort()
+        for (a, ra), (b, rb) in zip(reservas, reservas[1:]):
+            if b - a < DURACION:
+                pares.append((ra, rb))
+    return pares
+
+
+def test_no_deja_sin_mesa_a_una_reserva_sentada():
+    asignadas, sin_mesa = asignar([Reserva(1, HORA, 2, 1), Reserva(2, HORA, 4, None)], [Mesa(1, 4)], [], DURACION)
+    assert asignadas == {1: 1}
+    assert sin_mesa == [2]
+
+
+def test_mueve_a_otra_mesa_en_lugar_de_desplazar():
+    asignadas, sin_mesa = asignar([Reserva(1, HORA, 2, 1), Reserva(2, HORA, 4, None)],
+                                  [Mesa(1, 4), Mesa(2, 2)], [], DURACION)
+    assert asignadas == {1: 2, 2: 1}
+    assert sin_mesa == []
+
+
+def test_la_que_queda_sin_mesa_conserva_la_suya():
+    # La reserva 1 no cabe en su mesa: sigue en ella, así que la 2 tiene que salir de ahí
+    asignadas, sin_mesa = asignar([Reserva(1, HORA, 6, 1), Reserva(2, HORA, 2, 1)],
+                                  [Mesa(1, 4), Mesa(2, 2)], [], DURACION)
+    assert asignadas == {2: 2}
+    assert sin_mesa == [1]
+
+
+def test_asignar_mesas_no_guarda_reservas_cruzadas(app, monkeypatch):
+    monkeypatch.setattr(modulo_app, 'DURACION_RESERVA', DURACION)
+    db.session.add(Cliente(id=1, nombre='Ana', email='ana@example.com', telefono='300'))
+    db.session.add_all([MesaBD(id=1, numero=1, capacidad=4), MesaBD(id=2, numero=2, capacidad=2),
+                        MesaBD(id=3, numero=3, capacidad=8)])
+    db.session.add_all([
+        ReservaBD(id=1, cliente_id=1, mesa_id=1, fecha_hora=HORA, num_personas=2, estado='pendiente'),
+        ReservaBD(id=2, cliente_id=1, mesa_id=3, fecha_hora=HORA, num_personas=4, estado='pendiente'),
+        ReservaBD(id=3, cliente_id=1, mesa_id=3, fecha_hora=HORA + DURACION, num_personas=8, estado='confirmada'),
+        # No cabe en su mesa; la única que le sirve es la 3, que tiene la reserva 2 sin otra mesa libre
+        ReservaBD(id=4, cliente_id=1, mesa_id=2, fecha_hora=HORA + timedelta(minutes=30), num_personas=6,
+                  estado='pendiente'),
+    ])
+    db.session.commit()
+
+    resultado = asignar_mesas(date(2030, 1, 1))
+
+    filas = db.session.execute(
+        db.select(ReservaBD.id, ReservaBD.mesa_id, ReservaBD.fecha_hora).where(ReservaBD.estado != 'cancelada')
+    ).all()
+    assert cruces(filas) == []
+    assert resultado['sin_mesa'] == [4]
+    assert db.session.get(ReservaBD, 2).mesa_id == 3
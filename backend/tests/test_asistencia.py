@@ -0,0 +1,59 @@
+"""Entrada y salida: una fila por empleado y día, sin duplicados ante dobles toques"""
+import pytest
+
+import app as modulo_app
+from app import Asistencia, Usuario, db
+
+
+@pytest.fixture
+def empleado(app):
+    usuario = Usuario(id=5, nombre='Empleado', email='e5@example.com', rol='empleado', cargo='mesero')
+    usuario.password_hash = 'x'
+    db.session.add(usuario)
+    db.session.commit()
+    return {'Authorization': 'Bearer ' + modulo_app.emitir_tokens({'id': 5, 'rol': 'empleado'})['token']}
+
+
+def fichar(cliente, empleado, que):
+    return cliente.post(f'/api/asistencia/{que}', json={}, headers=empleado)
+
+
+def filas():
+    db.session.expire_all()
+    return db.session.execute(db.select(Asistencia)).scalars().all()
+
+
+def test_doble_entrada_conserva_la_fila_existente(cliente, empleado):
+    assert fichar(cliente, empleado, 'entrada').status_code == 201
+    [primera] = filas()
+    hora = primera.hora_entrada
+    respuesta = fichar(cliente, empleado, 'entrada')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['error'] == 'Ya registraste tu entrada hoy'
+    [fila] = filas()
+    assert (fila.id, fila.hora_entrada) == (primera.id, hora)
+
+
+def test_salida_sin_entrada(cliente, empleado):
+    respuesta = fichar(cliente, empleado, 'salida')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['error'] == 'Debes registrar tu entrada primero'
+    assert filas() == []
+
+
+def test_doble_salida_se_rechaza(cliente, empleado):
+    fichar(cliente, empleado, 'entrada')
+    assert fichar(cliente, empleado, 'salida').status_code == 200
+    [fila] = filas()
+    salida = fila.hora_salida
+    respuesta = fichar(cliente, empleado, 'salida')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['error'] == 'Ya registraste tu salida hoy'
+    [fila] = filas()
+    assert fila.hora_salida == salida
+
+
+def test_empleado_no_ficha_por_otro(cliente, empleado):
+    respuesta = cliente.post('/api/asistencia/entrada', json={'usuario_id': 6}, headers=empleado)
+    assert respuesta.status_code == 403
+    assert filas() == []
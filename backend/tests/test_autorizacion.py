@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+from app import Cliente, Mesa, Reserva, db
+
+RUTAS_ADMIN = [
+    ('get', '/api/reservas/1'),
+    ('put', '/api/reservas/1'),
+    ('delete', '/api/reservas/1'),
+    ('post', '/api/mesas'),
+    ('put', '/api/mesas/1'),
+    ('post', '/api/platos'),
+    ('put', '/api/platos/1'),
+    ('delete', '/api/platos/1'),
+    ('post', '/api/categorias'),
+    ('get', '/api/clientes'),
+]
+
+
+@pytest.fixture
+def reserva(app):
+    db.session.add(Cliente(id=1, nombre='Ana', email='ana@example.com', telefono='300'))
+    db.session.add(Mesa(id=1, numero=1, capacidad=4))
+    db.session.add(Reserva(id=1, cliente_id=1, mesa_id=1, fecha_hora=datetime(2030, 1, 1, 20), num_personas=2))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('metodo,ruta', RUTAS_ADMIN)
+def test_rutas_de_escritura_piden_token(cliente, reserva, metodo, ruta):
+    assert getattr(cliente, metodo)(ruta, json={}).status_code == 401
+
+
+def test_empleado_no_modifica_reservas(cliente, reserva):
+    import app as modulo_app
+    token = modulo_app.emitir_tokens({'id': 5, 'rol': 'empleado'})['token']
+    respuesta = cliente.put('/api/reservas/1', json={'estado': 'cancelada'},
+                            headers={'Authorization': f'Bearer {token}'})
+    assert respuesta.status_code == 403
+
+
+def test_listado_publico_de_reservas_sin_datos_del_cliente(cliente, reserva, token_admin):
+    publico = cliente.get('/api/reservas').json
+    assert publico[0].keys() == {'id', 'mesa', 'fecha_hora', 'num_personas', 'estado'}
+    admin = cliente.get('/api/reservas', headers=token_admin).json
+    assert admin[0]['cliente']['email'] == 'ana@example.com'
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from app import Categoria, Plato, db
+from busqueda import coincidencias, preparar_busqueda
+
+
+@pytest.fixture
+def platos(app):
+    with db.engine.begin() as conexion:
+        preparar_busqueda(conexion)
+    db.session.add(Categoria(id=1, nombre='Fuertes'))
+    # Muchas coincidencias débiles (solo en la descripción) antes de la mejor
+    for i in range(1, 41):
+        db.session.add(Plato(id=i, nombre=f'Arroz {i}', descripcion='acompañado de pollo', precio=10,
+                             categoria_id=1))
+    db.session.add(Plato(id=41, nombre='Pollo asado', descripcion='pollo al horno con pollo', precio=20,
+                         categoria_id=1))
+    db.session.commit()
+
+
+def test_la_mejor_coincidencia_no_se_pierde_por_el_limite(cliente, platos):
+    respuesta = cliente.get('/api/platos/buscar?q=pollo&limit=1')
+    assert [p['nombre'] for p in respuesta.get_json()] == ['Pollo asado']
+
+
+@pytest.mark.parametrize('tabla', ['platos', 'clientes'])
+def test_postgres_sin_pg_trgm_no_usa_trigramas(tabla):
+    sql = str(coincidencias(tabla, 'nico', 10, 'postgresql', trigramas=False).element)
+    assert 'similarity' not in sql and ' % ' not in sql
+    assert 'ts_rank' in sql
+    assert sql.index('ORDER BY') < sql.index('LIMIT')
+
+
+def test_busqueda_asincrona_en_postgres_no_necesita_contexto_flask(asgi, monkeypatch):
+    import lectura_async
+    consultas_extension = []
+    dialectos = []
+
+    def trigramas_instalados(conexion):
+        consultas_extension.append(conexion)
+        return True
+
+    consulta_original = lectura_async.api.consulta_busqueda
+
+    def consulta_busqueda(modelo, serializador, dialecto, args, trigramas):
+        dialectos.append((dialecto, trigramas))
+        return consulta_original(modelo, serializador, 'sqlite', args, False)  # se ejecuta en SQLite
+
+    async def preparar(estado):
+        async with estado['motor'].begin() as conexion:
+            await conexion.run_sync(preparar_busqueda)
+            await conexion.run_sync(lambda c: c.execute(Categoria.__table__.insert(), {'id': 1, 'nombre': 'Fuertes'}))
+            await conexion.run_sync(lambda c: c.execute(Plato.__table__.insert(), {
+                'id': 1, 'nombre': 'Pollo asado', 'precio': 20, 'categoria_id': 1}))
+        monkeypatch.setattr(estado['motor'].dialect, 'name', 'postgresql')
+
+    monkeypatch.setattr(lectura_async, 'trigramas_instalados', trigramas_instalados)
+    monkeypatch.setattr(lectura_async.api, 'consulta_busqueda', consulta_busqueda)
+    respuestas = asgi(preparar, '/api/platos/buscar?q=pollo', '/api/platos/buscar?q=pollo')
+    assert [r.status_code for r in respuestas] == [200, 200]
+    assert [p['nombre'] for p in json.loads(respuestas[0].data)] == ['Pollo asado']
+    assert dialectos == [('postgresql', True)] * 2
+    assert len(consultas_extension) == 1  # una vez por worker
@@ -0,0 +1,56 @@
+"""Cada listado hace un número fijo de consultas, tenga las filas que tenga (sin N+1)"""
+import contextlib
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import Categoria, Cliente, Mesa, Plato, Reserva, Usuario, db, menu_cache
+
+
+@contextlib.contextmanager
+def contar_consultas():
+    sentencias = []
+
+    def registrar(conexion, cursor, sentencia, parametros, contexto, executemany):
+        sentencias.append(sentencia)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+
+
+def cargar(filas):
+    db.session.add_all([Categoria(id=c, nombre=f'Categoría {c}') for c in (1, 2)])
+    db.session.add_all([Mesa(id=m, numero=m, capacidad=4) for m in range(1, filas + 1)])
+    db.session.add_all([Cliente(id=c, nombre=f'Cliente {c}', email=f'c{c}@example.com', telefono='300')
+                        for c in range(1, filas + 1)])
+    db.session.add_all([
+        Reserva(cliente_id=n, mesa_id=n, fecha_hora=datetime(2030, 1, 1, 12) + timedelta(hours=n), num_personas=2)
+        for n in range(1, filas + 1)
+    ])
+    db.session.add_all([Plato(nombre=f'Plato {n}', precio=10, categoria_id=1 + n % 2) for n in range(filas)])
+    for n in range(filas):
+        empleado = Usuario(nombre=f'Empleado {n}', email=f'e{n}@example.com', rol='empleado', cargo='mesero')
+        empleado.password_hash = 'x'
+        db.session.add(empleado)
+    db.session.commit()
+    db.session.remove()  # que las consultas no salgan del mapa de identidad
+    menu_cache.invalidar()
+
+
+@pytest.mark.parametrize('ruta,maximo', [
+    ('/api/reservas', 1),
+    ('/api/platos', 2),  # platos y categorías: el snapshot del menú se arma entero
+    ('/api/empleados', 1),
+])
+@pytest.mark.parametrize('filas', [1, 25])
+def test_consultas_por_listado(cliente, token_admin, ruta, maximo, filas):
+    cargar(filas)
+    with contar_consultas() as sentencias:
+        respuesta = cliente.get(ruta, headers=token_admin)
+    assert respuesta.status_code == 200
+    assert len(respuesta.json) == filas
+    assert 1 <= len(sentencias) <= maximo, sentencias
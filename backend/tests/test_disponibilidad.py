@@ -0,0 +1,63 @@
+"""Cruce de reservas: una mesa no se reserva dos veces en intervalos que se solapan"""
+from datetime import datetime
+
+import pytest
+
+from app import DURACION_RESERVA, Cliente, Mesa, Reserva, db
+
+HORA = datetime(2030, 1, 1, 20)
+
+
+@pytest.fixture
+def reservada(app):
+    """Mesa 1 reservada a las 20:00; la mesa 2 está libre"""
+    db.session.add(Cliente(id=1, nombre='Ana', email='ana@example.com', telefono='300'))
+    db.session.add_all([Mesa(id=1, numero=1, capacidad=4), Mesa(id=2, numero=2, capacidad=4)])
+    db.session.add(Reserva(id=1, cliente_id=1, mesa_id=1, fecha_hora=HORA, num_personas=2))
+    db.session.commit()
+
+
+def reservar(cliente, fecha_hora, mesa_id=1):
+    return cliente.post('/api/reservas', json={
+        'nombre': 'Luis', 'email': 'luis@example.com', 'telefono': '301',
+        'mesa_id': mesa_id, 'fecha_hora': fecha_hora.isoformat(), 'num_personas': 2,
+    })
+
+
+def libres(cliente, fecha_hora):
+    respuesta = cliente.get('/api/mesas/disponibilidad',
+                            query_string={'fecha_hora': fecha_hora.isoformat(), 'personas': 2})
+    assert respuesta.status_code == 200
+    return [m['id'] for m in respuesta.get_json()]
+
+
+@pytest.mark.parametrize('fecha_hora', [HORA, HORA + DURACION_RESERVA / 2, HORA - DURACION_RESERVA / 2])
+def test_reserva_que_se_cruza_responde_409(cliente, reservada, fecha_hora):
+    respuesta = reservar(cliente, fecha_hora)
+    assert respuesta.status_code == 409
+    assert Reserva.query.filter_by(mesa_id=1).count() == 1
+
+
+@pytest.mark.parametrize('fecha_hora', [HORA + DURACION_RESERVA, HORA - DURACION_RESERVA])
+def test_turnos_seguidos_se_permiten(cliente, reservada, fecha_hora):
+    assert reservar(cliente, fecha_hora).status_code == 201
+
+
+def test_reserva_cancelada_no_bloquea(cliente, reservada):
+    db.session.get(Reserva, 1).estado = 'cancelada'
+    db.session.commit()
+    assert reservar(cliente, HORA).status_code == 201
+    assert libres(cliente, HORA + DURACION_RESERVA / 2) == [2]  # ahora la ocupa la nueva
+
+
+def test_disponibilidad_excluye_la_mesa_reservada(cliente, reservada):
+    assert libres(cliente, HORA) == [2]
+    assert libres(cliente, HORA + DURACION_RESERVA / 2) == [2]
+    assert libres(cliente, HORA + DURACION_RESERVA) == [1, 2]
+
+
+def test_mover_una_reserva_sobre_otra_responde_409(cliente, token_admin, reservada):
+    assert reservar(cliente, HORA, mesa_id=2).status_code == 201
+    nueva = Reserva.query.filter_by(mesa_id=2).one().id
+    respuesta = cliente.put(f'/api/reservas/{nueva}', json={'mesa_id': 1}, headers=token_admin)
+    assert respuesta.status_code == 409
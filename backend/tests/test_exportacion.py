@@ -0,0 +1,57 @@
+"""Exportación: la respuesta sale por lotes desde un generador, no armada en memoria"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as modulo_app
+from app import Cliente, Mesa, Reserva, db
+
+FILAS = 25
+
+
+@pytest.fixture
+def reservas(app, monkeypatch):
+    monkeypatch.setattr(modulo_app, 'FILAS_POR_LOTE', 10)
+    db.session.add(Mesa(id=1, numero=1, capacidad=4))
+    db.session.add(Cliente(id=1, nombre='Ana', email='ana@example.com', telefono='300'))
+    db.session.add_all([Reserva(id=n, cliente_id=1, mesa_id=1, fecha_hora=datetime(2030, 1, 1) + timedelta(hours=3 * n),
+                                num_personas=2) for n in range(1, FILAS + 1)])
+    db.session.commit()
+
+
+def exportar(cliente, token_admin, **parametros):
+    respuesta = cliente.get('/api/reservas/export', query_string=parametros, headers=token_admin, buffered=False)
+    assert respuesta.status_code == 200
+    assert respuesta.is_streamed
+    fragmentos = [f for f in respuesta.iter_encoded() if f]
+    respuesta.close()
+    return respuesta, fragmentos
+
+
+def test_csv_en_streaming(cliente, token_admin, reservas):
+    respuesta, fragmentos = exportar(cliente, token_admin, formato='csv')
+    assert respuesta.mimetype == 'text/csv'
+    assert respuesta.headers['Content-Disposition'] == 'attachment; filename=reservas.csv'
+    assert respuesta.headers['X-Accel-Buffering'] == 'no'
+    assert 'Content-Length' not in respuesta.headers
+    assert len(fragmentos) == 3  # un fragmento por lote de FILAS_POR_LOTE
+    filas = list(csv.reader(io.StringIO(b''.join(fragmentos).decode())))
+    assert filas[0][:3] == ['id', 'fecha_hora', 'num_personas']
+    assert [int(f[0]) for f in filas[1:]] == list(range(1, FILAS + 1))
+
+
+def test_ndjson_con_filtros(cliente, token_admin, reservas):
+    respuesta, fragmentos = exportar(cliente, token_admin, desde='2030-01-02T00:00:00')
+    assert respuesta.mimetype == 'application/x-ndjson'
+    assert respuesta.headers['Content-Disposition'] == 'attachment; filename=reservas.ndjson'
+    lineas = b''.join(fragmentos).decode().splitlines()
+    filas = [json.loads(linea) for linea in lineas]
+    assert [f['id'] for f in filas] == list(range(8, FILAS + 1))
+    assert filas[0]['cliente_email'] == 'ana@example.com'
+
+
+def test_formato_desconocido_responde_400(cliente, token_admin, reservas):
+    assert cliente.get('/api/reservas/export?formato=xlsx', headers=token_admin).status_code == 400
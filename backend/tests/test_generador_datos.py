@@ -0,0 +1,35 @@
+"""generate-data: mesas fijas y reservas repartidas en días y turnos, sin cruces"""
+from datetime import date
+
+import pytest
+
+from app import DURACION_RESERVA, Mesa, Reserva, db
+from generador_datos import generar_datos, repartir
+
+
+def test_mesas_fijas_y_sin_cruces(app):
+    totales = generar_datos(clientes=200, reservas=3000, empleados=1, dias_asistencia=1, platos=1, mesas=5,
+                            dias_historia=30, dias_futuro=5, fecha_base=date(2030, 1, 1), informar=lambda _: None)
+    assert totales['mesas'] == 5 and totales['reservas'] == 3000
+    assert Mesa.query.count() == 5
+    filas = db.session.execute(db.select(Reserva.mesa_id, Reserva.fecha_hora)
+                               .order_by(Reserva.mesa_id, Reserva.fecha_hora)).all()
+    assert not [(a, b) for a, b in zip(filas, filas[1:]) if a.mesa_id == b.mesa_id
+                and b.fecha_hora - a.fecha_hora < DURACION_RESERVA]
+    # no cabían en 36 días: la historia se alargó hacia atrás
+    assert min(f.fecha_hora for f in filas).date() < date(2029, 12, 1)
+
+
+@pytest.mark.parametrize('total,tope,esperado', [
+    (10, 10, [3, 1, 2, 4]),
+    (40, 10, [10, 10, 10, 10]),
+    (30, 8, [8, 6, 8, 8]),
+    (0, 5, [0, 0, 0, 0]),
+])
+def test_repartir_respeta_el_tope(total, tope, esperado):
+    assert repartir(total, [3, 1, 2.5, 3.5], tope) == esperado
+
+
+def test_repartir_sin_lugar():
+    with pytest.raises(ValueError):
+        repartir(9, [1, 1], 4)
@@ -0,0 +1,63 @@
+"""Idempotency-Key: la repetición recibe la respuesta guardada, con ambos almacenes"""
+import pytest
+
+import app as modulo_app
+from app import ClaveIdempotencia, Mesa, Reserva, db
+from idempotencia import EN_CURSO, GUARDADA, NUEVA, OTRA, AlmacenBD, AlmacenMemoria
+
+RESERVA = {'nombre': 'Ana', 'email': 'ana@example.com', 'telefono': '300',
+           'mesa_id': 1, 'fecha_hora': '2030-01-01T20:00:00', 'num_personas': 2}
+
+
+@pytest.fixture(params=['memoria', 'bd'])
+def almacen(request, app, monkeypatch):
+    if request.param == 'memoria':
+        almacen = AlmacenMemoria(maximo=100, ttl=60, ttl_en_curso=60)
+    else:
+        almacen = AlmacenBD(db.engine, ClaveIdempotencia, ttl=60, ttl_en_curso=60)
+    monkeypatch.setattr(modulo_app, 'almacen_idempotencia', lambda: almacen)
+    db.session.add(Mesa(id=1, numero=1, capacidad=4))
+    db.session.commit()
+    return almacen
+
+
+def reservar(cliente, cuerpo=RESERVA, clave='clave-1'):
+    return cliente.post('/api/reservas', json=cuerpo, headers={'Idempotency-Key': clave})
+
+
+def test_reclamar_completar_y_liberar(almacen):
+    assert almacen.reclamar('k', 'h1') == (NUEVA, None)
+    assert almacen.reclamar('k', 'h1') == (EN_CURSO, None)
+    assert almacen.reclamar('k', 'h2') == (OTRA, None)
+    almacen.completar('k', 'h1', (201, b'{}', 'application/json'))
+    assert almacen.reclamar('k', 'h1') == (GUARDADA, (201, b'{}', 'application/json'))
+    assert almacen.reclamar('otra', 'h1') == (NUEVA, None)
+    almacen.liberar('otra', 'h1')
+    assert almacen.reclamar('otra', 'h1') == (NUEVA, None)
+
+
+def test_repeticion_devuelve_la_respuesta_guardada(cliente, almacen):
+    primera = reservar(cliente)
+    segunda = reservar(cliente)
+    assert primera.status_code == segunda.status_code == 201
+    assert segunda.get_json() == primera.get_json()
+    assert segunda.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in primera.headers
+    assert Reserva.query.count() == 1
+
+
+def test_clave_en_curso_responde_409(app, cliente, almacen):
+    with app.test_request_context('/api/reservas', method='POST', json=RESERVA):
+        huella = modulo_app.huella_peticion()
+    almacen.reclamar('clave-1', huella)  # la primera petición todavía no terminó
+    respuesta = reservar(cliente)
+    assert respuesta.status_code == 409
+    assert respuesta.headers['Retry-After'] == '1'
+    assert Reserva.query.count() == 0
+
+
+def test_misma_clave_con_otro_cuerpo_responde_422(cliente, almacen):
+    assert reservar(cliente).status_code == 201
+    respuesta = reservar(cliente, dict(RESERVA, num_personas=3))
+    assert respuesta.status_code == 422
+    assert Reserva.query.count() == 1
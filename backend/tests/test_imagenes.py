@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from app import Categoria, db
+import imagenes
+
+pytestmark = pytest.mark.skipif(not imagenes.formatos_disponibles(), reason='Pillow sin soporte WebP/AVIF')
+
+
+def foto():
+    salida = io.BytesIO()
+    imagenes.Image.new('RGB', (400, 300), 'orange').save(salida, 'PNG')
+    salida.seek(0)
+    return salida
+
+
+def test_subir_imagen_requiere_admin(cliente):
+    respuesta = cliente.post('/api/platos', data={'nombre': 'Sopa', 'precio': '5', 'categoria_id': '1',
+                                                  'imagen': (foto(), 'sopa.png')})
+    assert respuesta.status_code == 401
+
+
+def test_imagen_url_es_absoluta(cliente, token_admin, monkeypatch, tmp_path):
+    monkeypatch.setattr('app.IMAGENES_DIR', str(tmp_path))
+    db.session.add(Categoria(id=1, nombre='Entradas'))
+    db.session.commit()
+    respuesta = cliente.post('/api/platos', headers={**token_admin, 'X-Forwarded-Proto': 'https'},
+                             base_url='http://api.ejemplo.com',
+                             data={'nombre': 'Sopa', 'precio': '5', 'categoria_id': '1',
+                                   'imagen': (foto(), 'sopa.png')})
+    assert respuesta.status_code == 201, respuesta.json
+    plato = cliente.get(f"/api/platos/{respuesta.json['id']}").json
+    assert plato['imagen_url'].startswith('https://api.ejemplo.com/imagenes/sopa-400.')
+    assert all(url.startswith('https://') for url in plato['imagen_variantes']['srcset']['webp'].split()[::2])
+
+
+def test_actualizar_referencias_cambia_solo_los_hashes():
+    html = ('<source srcset="images/derivados/bg-320.000000000000.avif 320w, '
+            'images/derivados/bg-640.111111111111.avif 640w">'
+            '<img src="images/derivados/logo-320.222222222222.webp">')
+    nuevo, huerfanas = imagenes.actualizar_referencias(
+        html, 'images/derivados', ['bg-320.aaaaaaaaaaaa.avif', 'logo-320.bbbbbbbbbbbb.webp'])
+    assert nuevo == ('<source srcset="images/derivados/bg-320.aaaaaaaaaaaa.avif 320w, '
+                     'images/derivados/bg-640.111111111111.avif 640w">'
+                     '<img src="images/derivados/logo-320.bbbbbbbbbbbb.webp">')
+    assert huerfanas == ['images/derivados/bg-640.111111111111.avif']
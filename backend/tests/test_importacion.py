@@ -0,0 +1,58 @@
+"""Importación masiva: se valida el lote completo y, si una fila falla, no se inserta nada"""
+import io
+
+import pytest
+
+from app import Categoria, Mesa, Plato, db
+
+CSV_MIXTO = (
+    'numero,capacidad,disponible\n'
+    '10,4,si\n'       # 1: válida
+    '11,,\n'          # 2: falta capacidad
+    '12,dos,no\n'     # 3: capacidad no es entero
+    '13,4,quizas\n'   # 4: disponible no es booleano
+    '10,2,\n'         # 5: número repetido en el lote
+    '1,2,\n'          # 6: número que ya existe en la BD
+    '14,6,0\n'        # 7: válida
+)
+
+
+@pytest.fixture
+def mesa_existente(app):
+    db.session.add(Mesa(id=1, numero=1, capacidad=4))
+    db.session.commit()
+
+
+def test_csv_mixto_reporta_filas_y_no_inserta_nada(cliente, token_admin, mesa_existente):
+    respuesta = cliente.post('/api/mesas/bulk', data=CSV_MIXTO, content_type='text/csv', headers=token_admin)
+    assert respuesta.status_code == 400
+    errores = respuesta.get_json()['errores']
+    assert [e['fila'] for e in errores] == [2, 3, 4, 5, 6]
+    assert errores[0]['errores'] == ['capacidad es obligatorio']
+    assert errores[1]['errores'] == ['capacidad no es un int válido']
+    assert errores[2]['errores'] == ['disponible no es un bool válido']
+    assert errores[3]['errores'] == ['numero 10 ya existe']
+    assert errores[4]['errores'] == ['numero 1 ya existe']
+    assert db.session.execute(db.select(Mesa.numero)).scalars().all() == [1]
+
+
+def test_csv_en_archivo_valido_inserta_todo(cliente, token_admin, mesa_existente):
+    archivo = (io.BytesIO('\ufeffnumero,capacidad,disponible\n10,4,si\n14,6,0\n'.encode()), 'mesas.csv')
+    respuesta = cliente.post('/api/mesas/bulk', data={'archivo': archivo}, headers=token_admin)
+    assert respuesta.status_code == 201
+    assert len(respuesta.get_json()['ids']) == 2
+    mesas = db.session.execute(db.select(Mesa.numero, Mesa.disponible).order_by(Mesa.numero)).all()
+    assert [tuple(m) for m in mesas] == [(1, True), (10, True), (14, False)]
+
+
+def test_json_con_categoria_inexistente_no_inserta_platos(cliente, token_admin, app):
+    db.session.add(Categoria(id=1, nombre='Entradas'))
+    db.session.commit()
+    respuesta = cliente.post('/api/platos/bulk', headers=token_admin, json=[
+        {'nombre': 'Arepa', 'precio': 10, 'categoria_id': 1},
+        {'nombre': 'Empanada', 'precio': 5, 'categoria_id': 9},
+        {'nombre': 'Jugo', 'categoria_id': 1},
+    ])
+    assert respuesta.status_code == 400
+    assert [e['fila'] for e in respuesta.get_json()['errores']] == [2, 3]
+    assert Plato.query.count() == 0
@@ -0,0 +1,31 @@
+import json
+
+import brotli
+
+from app import Categoria, Plato, menu_cache
+
+
+async def menu(estado):
+    async with estado['motor'].begin() as conexion:
+        await conexion.run_sync(lambda c: c.execute(Categoria.__table__.insert(), {'id': 1, 'nombre': 'Fuertes'}))
+        await conexion.run_sync(lambda c: c.execute(Plato.__table__.insert(), [
+            {'id': i, 'nombre': f'Plato {i}', 'descripcion': 'con arroz y ensalada', 'precio': 10, 'categoria_id': 1}
+            for i in range(1, 31)
+        ]))
+    menu_cache.invalidar()
+
+
+def test_listado_asincrono_en_brotli_con_etag_debil(asgi):
+    identidad, br = asgi(menu, '/api/platos', ('/api/platos', {'Accept-Encoding': 'br, gzip'}))
+    assert 'content-encoding' not in identidad.headers
+    assert br.headers['content-encoding'] == 'br'
+    assert br.headers['etag'] == 'W/' + identidad.headers['etag']
+    assert 'Accept-Encoding' in br.headers['vary']
+    assert json.loads(brotli.decompress(br.data)) == json.loads(identidad.data)
+
+
+def test_etag_debil_revalida_con_304(asgi):
+    primera, = asgi(menu, ('/api/platos', {'Accept-Encoding': 'gzip'}))
+    assert primera.headers['content-encoding'] == 'gzip'
+    segunda, = asgi(menu, ('/api/platos', {'Accept-Encoding': 'gzip', 'If-None-Match': primera.headers['etag']}))
+    assert segunda.status_code == 304 and segunda.data == b''
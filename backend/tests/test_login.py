@@ -0,0 +1,21 @@
+import app as modulo_app
+
+
+def test_limite_por_ip_no_se_evade_cambiando_x_forwarded_for(cliente, monkeypatch):
+    monkeypatch.setattr(modulo_app.limite_ip, 'rafaga', 2)
+    monkeypatch.setattr(modulo_app.limite_ip, 'prefijo', 'ip-prueba')
+    estados = [
+        cliente.post('/api/login', json={'email': f'nadie{n}@example.com', 'password': 'x'},
+                     headers={'X-Forwarded-For': f'10.0.0.{n}, 203.0.113.7'},
+                     environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code
+        for n in range(3)
+    ]
+    assert estados == [401, 401, 429]
+
+
+def test_hash_ficticio_se_calcula_en_el_primer_login(cliente):
+    modulo_app.hash_ficticio.cache_clear()
+    assert modulo_app.hash_ficticio.cache_info().currsize == 0
+    respuesta = cliente.post('/api/login', json={'email': 'nadie@example.com', 'password': 'x'})
+    assert respuesta.status_code == 401
+    assert modulo_app.hash_ficticio.cache_info().currsize == 1
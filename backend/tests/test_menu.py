@@ -0,0 +1,51 @@
+"""ETag del menú: 304 mientras no cambie y un ETag nuevo tras cada escritura de platos"""
+import pytest
+
+from app import Categoria, Plato, db, menu_cache
+
+
+@pytest.fixture
+def menu(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(menu_cache, 'ruta_version', str(tmp_path / 'menu_version'))
+    db.session.add(Categoria(id=1, nombre='Entradas'))
+    db.session.add(Plato(id=1, nombre='Arepa', precio=10, categoria_id=1))
+    db.session.commit()
+    menu_cache.invalidar()
+
+
+def etag(cliente, ruta='/api/platos'):
+    respuesta = cliente.get(ruta)
+    assert respuesta.status_code == 200
+    return respuesta.headers['ETag']
+
+
+def test_if_none_match_responde_304(cliente, menu):
+    primera = cliente.get('/api/platos')
+    assert primera.headers['Cache-Control'] == 'no-cache'
+    repetida = cliente.get('/api/platos', headers={'If-None-Match': primera.headers['ETag']})
+    assert repetida.status_code == 304
+    assert repetida.data == b''
+    assert repetida.headers['ETag'] == primera.headers['ETag']
+    assert cliente.get('/api/platos', headers={'If-None-Match': '"otro"'}).status_code == 200
+
+
+def test_if_none_match_en_variante_fields(cliente, menu):
+    anterior = etag(cliente, '/api/platos?fields=id,nombre')
+    assert anterior != etag(cliente)
+    respuesta = cliente.get('/api/platos?fields=id,nombre', headers={'If-None-Match': anterior})
+    assert respuesta.status_code == 304
+
+
+@pytest.mark.parametrize('metodo,ruta,cuerpo', [
+    ('post', '/api/platos', {'nombre': 'Empanada', 'precio': 5, 'categoria_id': 1}),
+    ('put', '/api/platos/1', {'precio': 12}),
+    ('delete', '/api/platos/1', None),
+])
+def test_escribir_un_plato_cambia_el_etag(cliente, token_admin, menu, metodo, ruta, cuerpo):
+    anterior = etag(cliente)
+    anterior_variante = etag(cliente, '/api/platos?fields=id,precio')
+    respuesta = getattr(cliente, metodo)(ruta, json=cuerpo, headers=token_admin)
+    assert respuesta.status_code in (200, 201)
+    assert etag(cliente) != anterior
+    assert cliente.get('/api/platos', headers={'If-None-Match': anterior}).status_code == 200
+    assert etag(cliente, '/api/platos?fields=id,precio') != anterior_variante
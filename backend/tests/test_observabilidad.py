@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import app as modulo_app
+from app import db
+
+
+def test_sentencia_fallida_no_deja_inicios_en_la_conexion(app):
+    with db.engine.connect() as conexion:
+        with pytest.raises(OperationalError):
+            conexion.execute(text('SELECT * FROM tabla_que_no_existe'))
+        assert not conexion.info.get('inicios_sql')
+        conexion.execute(text('SELECT 1'))
+        assert not conexion.info.get('inicios_sql')
+
+
+def test_metricas_exigen_token(cliente, monkeypatch):
+    assert cliente.get('/metrics').status_code == 404
+    monkeypatch.setenv('METRICS_TOKEN', 'secreto')
+    assert cliente.get('/metrics').status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 401
+    respuesta = cliente.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+    assert respuesta.status_code == 200 and b'http_requests_total' in respuesta.data
+
+
+@pytest.fixture
+def monitor(app, monkeypatch):
+    """Monitor sin hilo de fondo: la prueba decide cuándo se refresca"""
+    monitor = modulo_app.MonitorBaseDatos(intervalo=5)
+    monitor._pid = os.getpid()
+    monkeypatch.setattr(modulo_app, 'monitor_bd', monitor)
+    return monitor
+
+
+def test_ready_cae_con_la_bd_y_se_recupera(cliente, monitor, monkeypatch):
+    assert cliente.get('/health/ready').status_code == 503  # aún sin primer chequeo
+    monitor.refrescar()
+    respuesta = cliente.get('/health/ready')
+    assert respuesta.status_code == 200 and respuesta.get_json()['database'] == 'connected'
+
+    def sin_conexion():
+        raise OperationalError('SELECT 1', {}, Exception('connection refused'))
+    monkeypatch.setattr(db.engine, 'connect', sin_conexion)
+    monitor.refrescar()
+    respuesta = cliente.get('/health/ready')
+    assert respuesta.status_code == 503
+    assert respuesta.get_json()['database'] == 'unreachable'
+    assert cliente.get('/health').status_code == 500
+
+    monkeypatch.delattr(db.engine, 'connect')  # vuelve el connect del motor
+    monitor.refrescar()
+    assert cliente.get('/health/ready').status_code == 200
+    assert cliente.get('/health').status_code == 200
+
+
+def test_ready_sin_refrescos_queda_obsoleto(cliente, monitor):
+    monitor.refrescar()
+    monitor.estado['verificado_en'] -= 3 * monitor.intervalo + 1
+    respuesta = cliente.get('/health/ready')
+    assert respuesta.status_code == 503
+    assert respuesta.get_json()['status'] == 'stale'
@@ -0,0 +1,127 @@
+"""Paginación por cursor: recorrer X-Next-Cursor devuelve cada fila una vez y en orden"""
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import Asistencia, Cliente, Mesa, Reserva, Usuario, db
+
+HORA = datetime(2030, 1, 1, 12)
+
+
+def cursor(valor):
+    return base64.urlsafe_b64encode(json.dumps(valor).encode()).decode()
+
+
+@pytest.fixture
+def datos(app):
+    """23 reservas en dos mesas (varias comparten fecha_hora) y 23 clientes"""
+    db.session.add_all([Mesa(id=m, numero=m, capacidad=4) for m in (1, 2)])
+    db.session.add_all([Cliente(id=c, nombre=f'Cliente {c}', email=f'c{c}@example.com', telefono='300')
+                        for c in range(1, 24)])
+    db.session.add_all([
+        Reserva(id=n, cliente_id=n, mesa_id=1 + n % 2, fecha_hora=HORA + timedelta(hours=n // 2),
+                num_personas=2, estado='cancelada' if n % 5 == 0 else 'pendiente')
+        for n in range(1, 24)
+    ])
+    db.session.commit()
+
+
+def recorrer(cliente, ruta, cabeceras=None, **parametros):
+    """Todas las páginas siguiendo X-Next-Cursor; devuelve las filas y cuántas páginas hubo"""
+    filas, paginas, siguiente = [], 0, None
+    while True:
+        query = dict(parametros, **({'cursor': siguiente} if siguiente else {}))
+        respuesta = cliente.get(ruta, query_string=query, headers=cabeceras)
+        assert respuesta.status_code == 200, respuesta.get_json()
+        filas += respuesta.get_json()
+        paginas += 1
+        siguiente = respuesta.headers.get('X-Next-Cursor')
+        if siguiente is None:
+            return filas, paginas
+
+
+@pytest.mark.parametrize('limite', [1, 4, 23, 100])
+def test_reservas_cada_fila_una_vez_y_en_orden(cliente, datos, limite):
+    filas, paginas = recorrer(cliente, '/api/reservas', limit=limite)
+    claves = [(f['fecha_hora'], f['id']) for f in filas]
+    assert sorted(f['id'] for f in filas) == list(range(1, 24))
+    assert claves == sorted(claves, reverse=True)
+    assert paginas == -(-23 // limite)
+
+
+def test_clientes_cada_fila_una_vez_y_en_orden(cliente, token_admin, datos):
+    filas, paginas = recorrer(cliente, '/api/clientes', token_admin, limit=5)
+    assert [f['id'] for f in filas] == list(range(1, 24))
+    assert paginas == 5
+
+
+def test_asistencias_cada_fila_una_vez_y_en_orden(cliente, token_admin, app):
+    usuarios = [Usuario(id=u, nombre=f'Empleado {u}', email=f'e{u}@example.com', rol='empleado', cargo='mesero')
+                for u in (1, 2)]
+    for usuario in usuarios:
+        usuario.password_hash = 'x'
+    db.session.add_all(usuarios)
+    hoy = datetime.utcnow().date()
+    db.session.add_all([Asistencia(usuario_id=u, fecha=hoy - timedelta(days=d)) for d in range(5) for u in (1, 2)])
+    db.session.commit()
+    filas, paginas = recorrer(cliente, '/api/asistencia/todas', token_admin, limit=3)
+    claves = [(f['fecha'], f['id']) for f in filas]
+    assert len(set(claves)) == 10
+    assert claves == sorted(claves, reverse=True)
+    assert paginas == 4
+
+
+@pytest.mark.parametrize('parametros', [
+    {'cursor': 'no-es-un-cursor'},
+    {'cursor': cursor(5)},
+    {'cursor': cursor(['2030-01-01T12:00:00'])},
+    {'cursor': cursor(['ayer', 3])},
+    {'cursor': cursor(['2030-01-01T12:00:00', 'tres'])},
+    {'limit': 0},
+    {'limit': -1},
+    {'limit': 'diez'},
+    {'desde': 'ayer'},
+    {'fields': 'id,inexistente'},
+    {'fields': ''},
+])
+def test_parametros_invalidos_responden_400(cliente, datos, parametros):
+    respuesta = cliente.get('/api/reservas', query_string=parametros)
+    assert respuesta.status_code == 400, respuesta.get_json()
+
+
+@pytest.mark.parametrize('ruta,parametros', [
+    ('/api/clientes', {'cursor': cursor(['uno'])}),
+    ('/api/clientes', {'cursor': cursor({'id': 1})}),
+    ('/api/asistencia/todas', {'cursor': cursor([date(2030, 1, 1).isoformat()])}),
+])
+def test_cursor_invalido_en_otros_listados(cliente, token_admin, datos, ruta, parametros):
+    assert cliente.get(ruta, query_string=parametros, headers=token_admin).status_code == 400
+
+
+def test_filtros_desde_hasta(cliente, datos):
+    desde, hasta = HORA + timedelta(hours=3), HORA + timedelta(hours=6)
+    filas, _ = recorrer(cliente, '/api/reservas', limit=2, desde=desde.isoformat(), hasta=hasta.isoformat())
+    esperadas = [n for n in range(1, 24) if desde <= HORA + timedelta(hours=n // 2) < hasta]
+    assert sorted(f['id'] for f in filas) == esperadas
+
+
+def test_filtros_estado_y_mesa(cliente, datos):
+    filas, _ = recorrer(cliente, '/api/reservas', limit=3, estado='cancelada', mesa_id=2)
+    assert sorted(f['id'] for f in filas) == [n for n in range(1, 24) if n % 5 == 0 and n % 2 == 1]
+
+
+def test_fields_recorta_el_json(cliente, token_admin, datos):
+    respuesta = cliente.get('/api/reservas', query_string={'limit': 2, 'fields': 'id,cliente.nombre'},
+                            headers=token_admin)
+    assert respuesta.get_json() == [{'id': 23, 'cliente': {'nombre': 'Cliente 23'}},
+                                    {'id': 22, 'cliente': {'nombre': 'Cliente 22'}}]
+    # el cursor se sigue leyendo aunque fecha_hora no esté entre los campos
+    siguiente = cliente.get('/api/reservas', headers=token_admin, query_string={
+        'limit': 2, 'fields': 'id', 'cursor': respuesta.headers['X-Next-Cursor']})
+    assert siguiente.get_json() == [{'id': 21}, {'id': 20}]
+
+
+def test_fields_sin_token_no_expone_al_cliente(cliente, datos):
+    assert cliente.get('/api/reservas', query_string={'fields': 'cliente.nombre'}).status_code == 400
@@ -0,0 +1,56 @@
+"""Nombres y rangos de las particiones mensuales y qué meses toca archivar"""
+from datetime import date, datetime
+
+import pytest
+
+from particiones import (_rango, mes_de, mes_de_particion, meses_por_archivar, meses_siguientes, nombre_particion,
+                         rango, sumar_meses)
+
+
+@pytest.mark.parametrize('mes,meses,esperado', [
+    (date(2030, 12, 1), 1, date(2031, 1, 1)),
+    (date(2031, 1, 1), -1, date(2030, 12, 1)),
+    (date(2030, 11, 1), 14, date(2032, 1, 1)),
+    (date(2030, 1, 1), -13, date(2028, 12, 1)),
+    (date(2030, 6, 1), 0, date(2030, 6, 1)),
+])
+def test_sumar_meses_cruza_el_año(mes, meses, esperado):
+    assert sumar_meses(mes, meses) == esperado
+
+
+def test_mes_de_acepta_fechas_y_fechas_con_hora():
+    assert mes_de(date(2030, 12, 31)) == date(2030, 12, 1)
+    assert mes_de(datetime(2030, 12, 31, 23, 59)) == date(2030, 12, 1)
+
+
+def test_diciembre_a_enero():
+    diciembre = date(2030, 12, 1)
+    assert nombre_particion('reservas', diciembre) == 'reservas_p2030_12'
+    assert rango(diciembre) == (date(2030, 12, 1), date(2031, 1, 1))
+    assert _rango(diciembre) == "FROM ('2030-12-01') TO ('2031-01-01')"
+    assert meses_siguientes(date(2030, 12, 15), 2) == [date(2030, 12, 1), date(2031, 1, 1), date(2031, 2, 1)]
+
+
+def test_rangos_consecutivos_sin_huecos():
+    meses = meses_siguientes(date(2030, 10, 31), 5)
+    assert all(rango(a)[1] == rango(b)[0] for a, b in zip(meses, meses[1:]))
+
+
+@pytest.mark.parametrize('nombre,esperado', [
+    ('reservas_p2031_01', date(2031, 1, 1)),
+    ('reservas_pdefecto', None),
+    ('reservas_viejas_p2031_01', None),  # de otra tabla con el mismo prefijo
+    ('asistencias_p2031_01', None),
+])
+def test_mes_de_particion(nombre, esperado):
+    assert mes_de_particion('reservas', nombre) == esperado
+    if esperado:
+        assert nombre_particion('reservas', esperado) == nombre
+
+
+def test_meses_por_archivar_en_enero():
+    meses = [date(2030, m, 1) for m in range(9, 13)] + [date(2031, 1, 1), date(2031, 2, 1)]
+    # en enero, conservando 2 meses, quedan noviembre, diciembre, enero y los futuros
+    assert meses_por_archivar(meses, date(2031, 1, 20), 2) == [date(2030, 9, 1), date(2030, 10, 1)]
+    assert meses_por_archivar(meses, date(2031, 1, 1), 0) == [date(2030, m, 1) for m in range(9, 13)]
+    assert meses_por_archivar(meses, date(2031, 1, 31), 12) == []
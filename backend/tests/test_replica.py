@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine, select
+
+import app as modulo_app
+from app import Mesa, db
+from asgi import ProxyConfiable
+from replica import MarcasEscritura, Replica, identidad, leer_de
+
+
+def cliente_visto(proxies, reenviado, socket=('10.1.1.1', 4000)):
+    vistos = []
+
+    async def aplicacion(scope, receive, send):
+        vistos.append(scope['client'][0])
+
+    cabeceras = [(b'x-forwarded-for', valor.encode()) for valor in reenviado]
+    asyncio.run(ProxyConfiable(aplicacion, proxies)({'type': 'http', 'headers': cabeceras, 'client': socket},
+                                                     None, None))
+    return vistos[0]
+
+
+def test_la_ip_sale_del_ultimo_proxy_propio():
+    # El cliente puede anteponer lo que quiera; el balanceador agrega la IP real al final
+    assert cliente_visto(1, ['1.2.3.4, 203.0.113.7']) == '203.0.113.7'
+    assert cliente_visto(1, ['1.2.3.4', '203.0.113.7']) == '203.0.113.7'
+    assert cliente_visto(2, ['1.2.3.4, 203.0.113.7, 10.0.0.2']) == '203.0.113.7'
+
+
+def test_sin_suficientes_entradas_queda_el_socket():
+    assert cliente_visto(2, ['203.0.113.7']) == '10.1.1.1'
+    assert cliente_visto(1, []) == '10.1.1.1'
+    assert cliente_visto(0, ['1.2.3.4']) == '10.1.1.1'
+
+
+def test_identidad_no_lee_cabeceras():
+    assert identidad('Bearer abc', '203.0.113.7') == 'Bearer abc'
+    assert identidad(None, '203.0.113.7') == '203.0.113.7'
+    assert identidad(None, None) == ''
+
+
+@pytest.fixture
+def con_replica(app, tmp_path, monkeypatch):
+    """Una réplica (otra SQLite) con la mesa 99; la primaria tiene la mesa 1"""
+    db.session.add(Mesa(id=1, numero=1, capacidad=4))
+    db.session.commit()
+    motor = create_engine(f'sqlite:///{tmp_path / "replica.db"}')
+    db.metadata.create_all(motor)
+    with motor.begin() as conexion:
+        conexion.execute(Mesa.__table__.insert(), {'id': 99, 'numero': 99, 'capacidad': 4})
+    return activar(Replica(motor, MarcasEscritura(str(tmp_path / 'marcas'), ventana=10),
+                           retraso_maximo=5, intervalo=60), monkeypatch)
+
+
+def activar(replica, monkeypatch):
+    replica._pid = os.getpid()  # sin hilo de fondo: el estado lo fija la prueba
+    replica.estado = {'status': 'ok', 'verificado_en': time.time()}
+    monkeypatch.setattr(modulo_app, 'replica', replica)
+    return replica
+
+
+def numeros_de_mesa():
+    return sorted(db.session.execute(select(Mesa.numero)).scalars())
+
+
+def test_select_va_a_la_replica_y_la_escritura_a_la_primaria(con_replica):
+    leer_de(db.session, con_replica)
+    assert numeros_de_mesa() == [99]
+    db.session.add(Mesa(id=2, numero=2, capacidad=2))
+    db.session.commit()
+    with db.engine.connect() as conexion:
+        assert sorted(conexion.execute(select(Mesa.numero)).scalars()) == [1, 2]
+    with con_replica.motor.connect() as conexion:
+        assert sorted(conexion.execute(select(Mesa.numero)).scalars()) == [99]
+
+
+def test_replica_caida_repite_en_la_primaria(app, tmp_path, monkeypatch):
+    db.session.add(Mesa(id=1, numero=1, capacidad=4))
+    db.session.commit()
+    caida = activar(Replica(create_engine(f'sqlite:///{tmp_path / "no-existe" / "replica.db"}'),
+                            MarcasEscritura(str(tmp_path / 'marcas'), ventana=10),
+                            retraso_maximo=5, intervalo=60), monkeypatch)
+    leer_de(db.session, caida)
+    assert numeros_de_mesa() == [1]
+    assert caida.estado['status'] == 'error'
+    assert not caida.usar('cualquiera')  # fuera de servicio hasta el siguiente chequeo
+
+
+def test_quien_acaba_de_escribir_lee_de_la_primaria(cliente, token_admin, con_replica):
+    def numeros(cabeceras=None):
+        return sorted(m['numero'] for m in cliente.get('/api/mesas', headers=cabeceras).get_json())
+
+    assert numeros(token_admin) == [99]
+    assert cliente.post('/api/mesas', json={'numero': 2, 'capacidad': 2}, headers=token_admin).status_code == 201
+    assert numeros(token_admin) == [1, 2]  # su escritura marcó la ventana
+    assert numeros() == [99]               # otro cliente sigue en la réplica
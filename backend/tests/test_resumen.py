@@ -0,0 +1,79 @@
+"""El resumen que se suma en cada salida coincide con el que reconstruye reconstruir-resumen"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import app as modulo_app
+from app import Asistencia, ResumenAsistencia, Usuario, db, minutos_trabajados, sumar_a_resumen
+
+
+@pytest.fixture
+def empleados(app):
+    for u in (1, 2):
+        usuario = Usuario(id=u, nombre=f'Empleado {u}', email=f'e{u}@example.com', rol='empleado', cargo='mesero')
+        usuario.password_hash = 'x'
+        db.session.add(usuario)
+    db.session.commit()
+
+
+def resumen():
+    db.session.expire_all()
+    return sorted(
+        (f.usuario_id, f.periodo, f.inicio, f.minutos, f.turnos)
+        for f in db.session.execute(db.select(ResumenAsistencia)).scalars()
+    )
+
+
+def fichar(usuario_id, fecha, minutos):
+    """Registra un turno y lo suma al resumen como registrar_salida; minutos=None
+    deja la asistencia abierta (sin salida)"""
+    entrada = datetime.combine(fecha, datetime.min.time()) + timedelta(hours=8)
+    salida = entrada + timedelta(minutes=minutos) if minutos is not None else None
+    db.session.add(Asistencia(usuario_id=usuario_id, fecha=fecha, hora_entrada=entrada, hora_salida=salida))
+    if salida is not None:
+        sumar_a_resumen(usuario_id, fecha, minutos_trabajados(entrada, salida))
+    db.session.commit()
+
+
+def reconstruir(*argumentos):
+    resultado = modulo_app.app.test_cli_runner().invoke(args=['reconstruir-resumen', *argumentos])
+    assert resultado.exit_code == 0, resultado.output
+
+
+def test_incremental_coincide_con_reconstruir(empleados):
+    # cruza semana (lunes 2030-12-30) y mes y año (2031-01-01)
+    inicio = date(2030, 12, 26)
+    for dia in range(10):
+        fichar(1, inicio + timedelta(days=dia), 480 + dia)
+        if dia % 3:
+            fichar(2, inicio + timedelta(days=dia), 300 + 7 * dia)
+    fichar(2, inicio + timedelta(days=10), None)  # sin salida: no cuenta
+    incremental = resumen()
+    meses = [(inicio_mes, turnos) for u, periodo, inicio_mes, _, turnos in incremental if u == 1 and periodo == 'mes']
+    assert meses == [(date(2030, 12, 1), 6), (date(2031, 1, 1), 4)]
+
+    db.session.execute(db.delete(ResumenAsistencia))
+    db.session.commit()
+    reconstruir()
+    assert resumen() == incremental
+
+    # --desde solo recalcula los periodos que empiezan desde esa fecha
+    db.session.execute(db.update(ResumenAsistencia).where(ResumenAsistencia.inicio >= date(2031, 1, 1))
+                       .values(minutos=0))
+    db.session.commit()
+    reconstruir('--desde', '2031-01-01')
+    assert resumen() == incremental
+
+
+def test_salida_por_la_api_coincide_con_reconstruir(cliente, empleados):
+    token = {'Authorization': 'Bearer ' + modulo_app.emitir_tokens({'id': 1, 'rol': 'empleado'})['token']}
+    fichar(1, datetime.utcnow().date() - timedelta(days=1), 420)
+    assert cliente.post('/api/asistencia/entrada', json={}, headers=token).status_code == 201
+    assert cliente.post('/api/asistencia/salida', json={}, headers=token).status_code == 200
+    incremental = resumen()
+    assert [turnos for _, periodo, _, _, turnos in incremental if periodo == 'dia'] == [1, 1]
+
+    db.session.execute(db.delete(ResumenAsistencia))
+    db.session.commit()
+    reconstruir()
+    assert resumen() == incremental
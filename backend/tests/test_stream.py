@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import app as api
+from app import Cliente, Mesa, Reserva, db
+
+
+@pytest.fixture
+def eventos(app):
+    """Mensajes SSE que reparte el feed al crear una reserva, por filtro"""
+    db.session.add(Cliente(id=1, nombre='Ana', email='ana@example.com', telefono='300'))
+    db.session.add(Mesa(id=1, numero=1, capacidad=4))
+    db.session.add(Reserva(id=1, cliente_id=1, mesa_id=1, fecha_hora=datetime(2030, 1, 1, 20), num_personas=2))
+    db.session.flush()
+    recibidos = []
+    clave = api.feed_cambios.suscribir(lambda evento, carga: recibidos.append((evento, carga)))
+    try:
+        api.publicar_cambio('reserva', 'creada', [1])
+        db.session.commit()
+    finally:
+        api.feed_cambios.desuscribir(clave)
+    return recibidos
+
+
+def datos_sse(mensaje):
+    return json.loads(mensaje.split('data: ', 1)[1])
+
+
+def test_canal_publico_sin_datos_del_cliente(eventos):
+    preparar = api.filtro_stream({})
+    aviso = datos_sse(preparar(*eventos[0]))
+    assert set(aviso) == {'entidad', 'accion', 'id', 'ts'}
+    assert 'ana@example.com' not in preparar(*eventos[0])
+
+
+def test_ticket_de_admin_recibe_la_fila(cliente, token_admin, eventos):
+    ticket = cliente.post('/api/stream/ticket', headers=token_admin).get_json()['ticket']
+    preparar = api.filtro_stream({'ticket': ticket})
+    assert datos_sse(preparar(*eventos[0]))['datos']['cliente']['email'] == 'ana@example.com'
+
+
+def test_ticket_exige_token(cliente):
+    assert cliente.post('/api/stream/ticket').status_code == 401
+
+
+def test_asistencias_exigen_ticket(cliente, token_admin):
+    assert cliente.get('/api/stream?entidades=asistencia').status_code == 401
+    token = token_admin['Authorization'][7:]
+    assert cliente.get(f'/api/stream?entidades=asistencia&ticket={token}').status_code == 401
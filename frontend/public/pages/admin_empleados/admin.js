@@ -1,5 +1,43 @@
 const API_URL = "https://restaurante-backend-s93j.onrender.com";
 let usuario = null;
+let asistencias = [];
+let streamAsistencias = null;
+let claveEmpleado = null;  // Idempotency-Key del alta en curso (se repite en los reintentos)
+
+// Renueva el token de sesión con el refresh_token; si no se puede, vuelve al login
+async function renovarToken() {
+    const refresh = await fetch(`${API_URL}/api/token/refresh`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ refresh_token: localStorage.getItem("refresh_token") })
+    });
+    if (!refresh.ok) {
+        localStorage.removeItem("usuario");
+        localStorage.removeItem("token");
+        localStorage.removeItem("refresh_token");
+        window.location.href = "/login.html";
+        return false;
+    }
+    
+    const tokens = await refresh.json();
+    localStorage.setItem("token", tokens.token);
+    localStorage.setItem("refresh_token", tokens.refresh_token);
+    return true;
+}
+
+// Hace fetch con el token de sesión; si expiró, lo renueva una vez con el refresh_token
+async function fetchConToken(url, opciones = {}) {
+    const conToken = () => fetch(url, {
+        ...opciones,
+        headers: { ...(opciones.headers || {}), "Authorization": `Bearer ${localStorage.getItem("token")}` }
+    });
+    
+    let res = await conToken();
+    if (res.status !== 401) return res;
+    
+    if (!await renovarToken()) return res;
+    return conToken();
+}
 
 // Verificar si está logueado como admin
 function verificarSesion() {
@@ -27,7 +65,7 @@ async function cargarEmpleados() {
         // Mostrar estado de carga
         tbody.innerHTML = '<tr><td colspan="5" style="text-align: center;">⏳ Cargando empleados...</td></tr>';
         
-        const res = await fetch(`${API_URL}/api/empleados`, {
+        const res = await fetchConToken(`${API_URL}/api/empleados`, {
             method: 'GET',
             headers: {
                 'Content-Type': 'application/json'
@@ -90,6 +128,7 @@ function mostrarFormulario() {
     document.getElementById("titulo-modal").textContent = "Nuevo Empleado";
     document.getElementById("password").required = true;
     document.getElementById("mensaje-form").style.display = "none";
+    claveEmpleado = null;  // un formulario nuevo es otra alta
 }
 
 function cerrarFormulario() {
@@ -100,7 +139,7 @@ function cerrarFormulario() {
 async function editarEmpleado(id) {
     try {
         // Buscar el empleado en la tabla actual
-        const res = await fetch(`${API_URL}/api/empleados`);
+        const res = await fetchConToken(`${API_URL}/api/empleados`);
         
         if (!res.ok) {
             throw new Error(`Error HTTP: ${res.status}`);
@@ -139,7 +178,7 @@ async function eliminarEmpleado(id) {
     }
     
     try {
-        const res = await fetch(`${API_URL}/api/empleados/${id}`, {
+        const res = await fetchConToken(`${API_URL}/api/empleados/${id}`, {
             method: "DELETE"
         });
         
@@ -177,7 +216,7 @@ document.getElementById("form-empleado").addEventListener("submit", async (e) =>
         
         if (empleadoId) {
             // Actualizar
-            res = await fetch(`${API_URL}/api/empleados/${empleadoId}`, {
+            res = await fetchConToken(`${API_URL}/api/empleados/${empleadoId}`, {
                 method: "PUT",
                 headers: {
                     "Content-Type": "application/json"
@@ -185,14 +224,17 @@ document.getElementById("form-empleado").addEventListener("submit", async (e) =>
                 body: JSON.stringify(data)
             });
         } else {
-            // Crear nuevo
-            res = await fetch(`${API_URL}/api/empleados`, {
+            // Crear nuevo (la clave se repite en los reintentos: no duplica al empleado)
+            claveEmpleado = claveEmpleado || crypto.randomUUID();
+            res = await fetchConToken(`${API_URL}/api/empleados`, {
                 method: "POST",
                 headers: {
-                    "Content-Type": "application/json"
+                    "Content-Type": "application/json",
+                    "Idempotency-Key": claveEmpleado
                 },
                 body: JSON.stringify(data)
             });
+            if (res.status !== 409) claveEmpleado = null;
         }
         
         const result = await res.json();
@@ -224,21 +266,51 @@ async function cargarAsistencias() {
     
     try {
         tbody.innerHTML = '<tr><td colspan="5" style="text-align: center;">⏳ Cargando asistencias...</td></tr>';
+        // Conectar antes de cargar para no perder cambios ocurridos durante la carga
+        conectarStreamAsistencias();
         
-        const res = await fetch(`${API_URL}/api/asistencia/todas`);
-        
-        if (!res.ok) {
-            throw new Error(`Error HTTP: ${res.status}`);
-        }
+        // Seguir el cursor de paginación hasta cubrir los últimos 30 días
+        const pagina = [];
+        let cursor = null;
+        do {
+            const url = `${API_URL}/api/asistencia/todas?limit=500` +
+                (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+            const res = await fetchConToken(url);
+            
+            if (!res.ok) {
+                throw new Error(`Error HTTP: ${res.status}`);
+            }
+            
+            pagina.push(...await res.json());
+            cursor = res.headers.get('X-Next-Cursor');
+        } while (cursor);
         
-        const asistencias = await res.json();
+        asistencias = pagina;
+        renderizarAsistencias();
         
-        if (asistencias.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="5" style="text-align: center;">📋 No hay registros de asistencia</td></tr>';
-            return;
-        }
+        console.log(`✅ ${asistencias.length} asistencias cargadas`);
         
-        tbody.innerHTML = asistencias.map(a => {
+    } catch (error) {
+        console.error("❌ Error cargando asistencias:", error);
+        tbody.innerHTML = `
+            <tr>
+                <td colspan="5" style="text-align: center; color: red; padding: 20px;">
+                    ❌ Error al cargar asistencias: ${error.message}
+                </td>
+            </tr>
+        `;
+    }
+}
+
+function renderizarAsistencias() {
+    const tbody = document.getElementById("tabla-asistencias");
+    
+    if (asistencias.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="5" style="text-align: center;">📋 No hay registros de asistencia</td></tr>';
+        return;
+    }
+    
+    tbody.innerHTML = asistencias.map(a => {
             const fecha = new Date(a.fecha);
             const fechaFormateada = fecha.toLocaleDateString('es-CO', {
                 year: 'numeric',
@@ -263,24 +335,67 @@ async function cargarAsistencias() {
                 </tr>
             `;
         }).join('');
-        
-        console.log(`✅ ${asistencias.length} asistencias cargadas`);
-        
+}
+
+// Entradas y salidas en tiempo real (Server-Sent Events): cada cambio se aplica
+// sobre la tabla en lugar de volver a pedir los últimos 30 días
+async function conectarStreamAsistencias(recargarAlConectar = false) {
+    if (streamAsistencias || typeof EventSource === 'undefined') return;
+    streamAsistencias = 'conectando';
+    
+    // EventSource no envía cabeceras: en la URL va un ticket de pocos segundos
+    // que solo abre el stream, nunca el token de sesión
+    let ticket = null;
+    try {
+        const res = await fetchConToken(`${API_URL}/api/stream/ticket`, { method: "POST" });
+        if (res.ok) ticket = (await res.json()).ticket;
     } catch (error) {
-        console.error("❌ Error cargando asistencias:", error);
-        tbody.innerHTML = `
-            <tr>
-                <td colspan="5" style="text-align: center; color: red; padding: 20px;">
-                    ❌ Error al cargar asistencias: ${error.message}
-                </td>
-            </tr>
-        `;
+        console.error("Error al pedir el ticket del stream:", error);
     }
+    if (!ticket) {
+        streamAsistencias = null;
+        setTimeout(() => conectarStreamAsistencias(true), 10000);
+        return;
+    }
+    
+    streamAsistencias = new EventSource(`${API_URL}/api/stream?entidades=asistencia&ticket=${encodeURIComponent(ticket)}`);
+    let recargar = recargarAlConectar;
+    
+    // 'listo' llega al (re)conectar: lo ocurrido mientras no había conexión se recarga
+    streamAsistencias.addEventListener('listo', () => {
+        if (recargar) cargarAsistencias();
+        recargar = true;
+    });
+    
+    streamAsistencias.addEventListener('cambio', (e) => {
+        const evento = JSON.parse(e.data);
+        if (!evento.datos) {
+            cargarAsistencias();
+            return;
+        }
+        const i = asistencias.findIndex(a => a.id === evento.id);
+        if (i >= 0) {
+            asistencias[i] = evento.datos;
+        } else {
+            asistencias.unshift(evento.datos);
+        }
+        renderizarAsistencias();
+    });
+    
+    // EventSource reintenta solo con el mismo ticket; si ya venció el servidor
+    // rechaza la conexión y se pide uno nuevo
+    streamAsistencias.onerror = () => {
+        if (streamAsistencias.readyState !== EventSource.CLOSED) return;
+        streamAsistencias = null;
+        setTimeout(() => conectarStreamAsistencias(true), 3000);
+    };
 }
 
 function cerrarSesion() {
     if (confirm("¿Estás seguro de cerrar sesión?")) {
         localStorage.removeItem("usuario");
+        localStorage.removeItem("token");
+        localStorage.removeItem("refresh_token");
         window.location.href = "/login.html";
     }
 }
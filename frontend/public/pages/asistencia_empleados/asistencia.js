@@ -1,6 +1,35 @@
 const API_URL = "https://restaurante-backend-s93j.onrender.com";
 let usuario = null;
 
+// Hace fetch con el token de sesión; si expiró, lo renueva una vez con el refresh_token
+async function fetchConToken(url, opciones = {}) {
+    const conToken = () => fetch(url, {
+        ...opciones,
+        headers: { ...(opciones.headers || {}), "Authorization": `Bearer ${localStorage.getItem("token")}` }
+    });
+    
+    let res = await conToken();
+    if (res.status !== 401) return res;
+    
+    const refresh = await fetch(`${API_URL}/api/token/refresh`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ refresh_token: localStorage.getItem("refresh_token") })
+    });
+    if (!refresh.ok) {
+        localStorage.removeItem("usuario");
+        localStorage.removeItem("token");
+        localStorage.removeItem("refresh_token");
+        window.location.href = "/login.html";
+        return res;
+    }
+    
+    const tokens = await refresh.json();
+    localStorage.setItem("token", tokens.token);
+    localStorage.setItem("refresh_token", tokens.refresh_token);
+    return conToken();
+}
+
 // Verificar si está logueado
 function verificarSesion() {
     const usuarioStr = localStorage.getItem("usuario");
@@ -24,6 +53,11 @@ function verificarSesion() {
     cargarRegistros();
 }
 
+// Idempotency-Key de cada marcación: se repite en los reintentos y se
+// renueva al recibir respuesta (409 = la primera aún se está procesando)
+let claveEntrada = null;
+let claveSalida = null;
+
 async function registrarEntrada() {
     const mensaje = document.getElementById("mensaje");
     const btnEntrada = document.querySelector('.btn-entrada');
@@ -32,13 +66,16 @@ async function registrarEntrada() {
     btnEntrada.textContent = "⏳ Registrando...";
     
     try {
-        const res = await fetch(`${API_URL}/api/asistencia/entrada`, {
+        claveEntrada = claveEntrada || crypto.randomUUID();
+        const res = await fetchConToken(`${API_URL}/api/asistencia/entrada`, {
             method: "POST",
             headers: {
-                "Content-Type": "application/json"
+                "Content-Type": "application/json",
+                "Idempotency-Key": claveEntrada
             },
             body: JSON.stringify({ usuario_id: usuario.id })
         });
+        if (res.status !== 409) claveEntrada = null;
         
         const data = await res.json();
         
@@ -73,13 +110,16 @@ async function registrarSalida() {
     btnSalida.textContent = "⏳ Registrando...";
     
     try {
-        const res = await fetch(`${API_URL}/api/asistencia/salida`, {
+        claveSalida = claveSalida || crypto.randomUUID();
+        const res = await fetchConToken(`${API_URL}/api/asistencia/salida`, {
             method: "POST",
             headers: {
-                "Content-Type": "application/json"
+                "Content-Type": "application/json",
+                "Idempotency-Key": claveSalida
             },
             body: JSON.stringify({ usuario_id: usuario.id })
         });
+        if (res.status !== 409) claveSalida = null;
         
         const data = await res.json();
         
@@ -108,7 +148,7 @@ async function registrarSalida() {
 
 async function cargarRegistros() {
     try {
-        const res = await fetch(`${API_URL}/api/asistencia/mis-registros/${usuario.id}`);
+        const res = await fetchConToken(`${API_URL}/api/asistencia/mis-registros/${usuario.id}`);
         const registros = await res.json();
         
         const tbody = document.getElementById("tabla-registros");
@@ -149,6 +189,8 @@ async function cargarRegistros() {
 function cerrarSesion() {
     if (confirm("¿Estás seguro de cerrar sesión?")) {
         localStorage.removeItem("usuario");
+        localStorage.removeItem("token");
+        localStorage.removeItem("refresh_token");
         window.location.href = "/login.html";
     }
 }
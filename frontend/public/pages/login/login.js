@@ -42,8 +42,10 @@ form.addEventListener("submit", async (e) => {
             throw new Error(data.error || "Error al iniciar sesión");
         }
         
-        // Guardar usuario en localStorage
+        // Guardar usuario y tokens de sesión en localStorage
         localStorage.setItem("usuario", JSON.stringify(data.usuario));
+        localStorage.setItem("token", data.token);
+        localStorage.setItem("refresh_token", data.refresh_token);
         
         // Mostrar mensaje de éxito
         mensaje.textContent = "✅ Login exitoso. Redirigiendo...";
@@ -5,15 +5,29 @@ let fechaActual = new Date();
 let fechaSeleccionada = null;
 let horarioSeleccionado = null;
 let todasReservas = [];
+let streamConectado = false;
 
 const HORARIOS = ["12:00", "13:00", "14:00", "18:00", "19:00", "20:00", "21:00"];
 const DIAS_SEMANA = ["Dom", "Lun", "Mar", "Mié", "Jue", "Vie", "Sáb"];
 const MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", 
                "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"];
 
+// Con sesión de administrador el listado trae los datos del cliente y se pueden
+// cancelar reservas; sin ella solo se ve la ocupación
+function cabecerasAdmin() {
+    const usuario = JSON.parse(localStorage.getItem('usuario') || 'null');
+    const token = localStorage.getItem('token');
+    return usuario && usuario.rol === 'admin' && token ? { 'Authorization': `Bearer ${token}` } : {};
+}
+
+function esAdmin() {
+    return 'Authorization' in cabecerasAdmin();
+}
+
 // ========== INICIALIZACIÓN ==========
 
 document.addEventListener('DOMContentLoaded', () => {
+    conectarStream();
     cargarReservas();
     renderizarCalendario();
     
@@ -166,26 +180,16 @@ async function actualizarMesas() {
     }
     
     try {
-        const res = await fetch(`${API_URL}/api/mesas`);
-        const mesas = await res.json();
-        
-        // Obtener mesas ocupadas en este horario
         const fechaHora = new Date(fechaSeleccionada);
         const [h, m] = horarioSeleccionado.split(':');
         fechaHora.setHours(parseInt(h), parseInt(m), 0, 0);
         
-        const mesasOcupadas = todasReservas
-            .filter(r => {
-                const fr = new Date(r.fecha_hora);
-                return fr.getTime() === fechaHora.getTime() && r.estado !== 'cancelada';
-            })
-            .map(r => r.mesa.id);
-        
-        // Filtrar mesas disponibles
-        const mesasDisponibles = mesas.filter(m => 
-            m.capacidad >= personas && 
-            !mesasOcupadas.includes(m.id)
+        // El backend calcula las mesas libres para el horario y número de personas
+        const res = await fetch(
+            `${API_URL}/api/mesas/disponibilidad?fecha_hora=${encodeURIComponent(fechaHora.toISOString())}&personas=${personas}`
         );
+        if (!res.ok) throw new Error(`Error HTTP: ${res.status}`);
+        const mesasDisponibles = await res.json();
         
         mesaSelect.innerHTML = '<option value="">Seleccione una mesa</option>';
         
@@ -209,6 +213,11 @@ async function actualizarMesas() {
 
 // ========== CREAR RESERVA ==========
 
+// Idempotency-Key del envío en curso: se repite si el usuario reintenta (doble
+// clic, timeout) para que el servidor no cree dos reservas, y se renueva al
+// recibir una respuesta definitiva (409 = la primera aún se está procesando)
+let claveReserva = null;
+
 async function crearReserva(e) {
     e.preventDefault();
     
@@ -234,11 +243,13 @@ async function crearReserva(e) {
     };
     
     try {
+        claveReserva = claveReserva || crypto.randomUUID();
         const res = await fetch(`${API_URL}/api/reservas`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': claveReserva },
             body: JSON.stringify(datos)
         });
+        if (res.status !== 409) claveReserva = null;
         
         const result = await res.json();
         
@@ -247,9 +258,11 @@ async function crearReserva(e) {
         mostrarMensaje('✅ Reserva creada exitosamente', 'exito');
         document.getElementById('form-reserva').reset();
         
-        // Recargar datos
-        await cargarReservas();
-        renderizarCalendario();
+        // Sin conexión al stream se recarga el mes; con ella llega el evento de la reserva
+        if (!streamConectado) {
+            await cargarReservas();
+            renderizarCalendario();
+        }
         
         setTimeout(() => {
             document.getElementById('form-container').style.display = 'none';
@@ -264,12 +277,32 @@ async function crearReserva(e) {
 
 // ========== LISTA DE RESERVAS ==========
 
+// Recorre todas las páginas de un listado siguiendo el header X-Next-Cursor
+async function obtenerTodasLasPaginas(url) {
+    const resultados = [];
+    let cursor = null;
+    do {
+        const separador = url.includes('?') ? '&' : '?';
+        const res = await fetch(cursor ? `${url}${separador}cursor=${encodeURIComponent(cursor)}` : url,
+                                { headers: cabecerasAdmin() });
+        if (!res.ok) throw new Error(`Error HTTP: ${res.status}`);
+        resultados.push(...await res.json());
+        cursor = res.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return resultados;
+}
+
 async function cargarReservas() {
     try {
-        const res = await fetch(`${API_URL}/api/reservas`);
-        todasReservas = await res.json();
+        // Solo las reservas del mes visible en el calendario
+        const desde = new Date(fechaActual.getFullYear(), fechaActual.getMonth(), 1);
+        const hasta = new Date(fechaActual.getFullYear(), fechaActual.getMonth() + 1, 1);
+        todasReservas = await obtenerTodasLasPaginas(
+            `${API_URL}/api/reservas?desde=${desde.toISOString()}&hasta=${hasta.toISOString()}&limit=500`
+        );
         
         renderizarTablaReservas();
+        renderizarCalendario();
     } catch (error) {
         console.error('Error cargando reservas:', error);
     }
@@ -292,15 +325,14 @@ function renderizarTablaReservas() {
             return `
                 <tr>
                     <td>
-                        <strong>${r.cliente.nombre}</strong><br>
-                        <small>${r.cliente.email}</small>
+                        ${r.cliente ? `<strong>${r.cliente.nombre}</strong><br><small>${r.cliente.email}</small>` : 'Reservada'}
                     </td>
                     <td>${fecha.toLocaleString('es-ES')}</td>
                     <td>Mesa ${r.mesa.numero}</td>
                     <td>${r.num_personas}</td>
                     <td><span class="badge ${estadoClass}">${r.estado}</span></td>
                     <td>
-                        ${r.estado !== 'cancelada' ? 
+                        ${r.estado !== 'cancelada' && esAdmin() ? 
                             `<button class="btn-cancelar" onclick="cancelarReserva(${r.id})">Cancelar</button>` : 
                             '-'}
                     </td>
@@ -315,21 +347,73 @@ async function cancelarReserva(id) {
     try {
         const res = await fetch(`${API_URL}/api/reservas/${id}`, {
             method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', ...cabecerasAdmin() },
             body: JSON.stringify({ estado: 'cancelada' })
         });
         
+        if (res.status === 401) throw new Error('Sesión expirada, inicia sesión de nuevo como administrador');
         if (!res.ok) throw new Error('Error al cancelar');
         
         alert('✅ Reserva cancelada exitosamente');
-        await cargarReservas();
-        renderizarCalendario();
+        if (!streamConectado) {
+            await cargarReservas();
+            renderizarCalendario();
+        }
         
     } catch (error) {
         alert('❌ ' + error.message);
     }
 }
 
+// ========== CAMBIOS EN TIEMPO REAL ==========
+
+// El servidor envía por Server-Sent Events cada reserva o mesa creada, actualizada
+// o eliminada; se aplica sobre todasReservas en lugar de volver a pedir el mes
+function conectarStream() {
+    if (typeof EventSource === 'undefined') return;
+    
+    const fuente = new EventSource(`${API_URL}/api/stream?entidades=reserva,mesa`);
+    let primeraConexion = true;
+    
+    // 'listo' llega al conectar y cada vez que el servidor pudo perder eventos:
+    // desde la segunda vez se recarga el mes
+    fuente.addEventListener('listo', () => {
+        streamConectado = true;
+        if (!primeraConexion) cargarReservas();
+        primeraConexion = false;
+    });
+    fuente.addEventListener('cambio', (e) => aplicarCambio(JSON.parse(e.data)));
+    fuente.onerror = () => {
+        streamConectado = false;  // EventSource reintenta solo
+    };
+}
+
+// El canal público solo dice qué reserva cambió (sin datos del cliente): se
+// recarga el mes con las credenciales de la página, una vez por ráfaga de cambios
+let recargaPendiente = null;
+
+function aplicarCambio(evento) {
+    if (evento.entidad === 'mesa') {
+        // Puede cambiar qué mesas están libres en el horario elegido
+        if (horarioSeleccionado) actualizarMesas();
+        return;
+    }
+    
+    if (evento.accion === 'eliminada') {
+        todasReservas = todasReservas.filter(r => r.id !== evento.id);
+        renderizarTablaReservas();
+        renderizarCalendario();
+        if (horarioSeleccionado) actualizarMesas();
+        return;
+    }
+    
+    clearTimeout(recargaPendiente);
+    recargaPendiente = setTimeout(async () => {
+        await cargarReservas();
+        if (horarioSeleccionado) actualizarMesas();
+    }, 500);
+}
+
 // ========== UTILIDADES ==========
 
 function cambiarTab(tab) {
@@ -347,16 +431,19 @@ function cambiarTab(tab) {
 function mesAnterior() {
     fechaActual.setMonth(fechaActual.getMonth() - 1);
     renderizarCalendario();
+    cargarReservas();
 }
 
 function mesSiguiente() {
     fechaActual.setMonth(fechaActual.getMonth() + 1);
     renderizarCalendario();
+    cargarReservas();
 }
 
 function hoy() {
     fechaActual = new Date();
     renderizarCalendario();
+    cargarReservas();
 }
 
 function mostrarMensaje(texto, tipo) {
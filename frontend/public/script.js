@@ -44,8 +44,9 @@ function comprarElemento(e) {
 }
 
 function leerDatosElemento(elemento) {
+    const img = elemento.querySelector('img');
     const infoElemento = {
-        imagen: elemento.querySelector('img').src,
+        imagen: img.currentSrc || img.src,  // el derivado que ya descargó el <picture>
         titulo: elemento.querySelector('h3').textContent,
         precio: elemento.querySelector('.precio').textContent,
         id: elemento.querySelector('a').getAttribute('data-id')